@@ -0,0 +1,256 @@
+# Vectorized bulk adjudication over DECISION_RULES using NumPy categorical columns
+import json
+
+import numpy as np
+
+from decision_nodes import DECISION_NODES
+from decision_brute_force import FIELD_PRIORITY_ORDER, get_decision_outcomes
+from fact_store import Fact
+from rule_loader import get_rule_registry
+
+# Column codes 0 and 1 are reserved in every field's codebook
+MISSING_CODE = 0   # field not provided for this case
+OTHER_CODE = 1     # provided, but not a value any rule or node knows about
+
+_UNHASHABLE = object()  # stands in for values no codebook can hold (lists, ...)
+
+DECISION_CODES = get_decision_outcomes()
+NEED_INFO_CODE = DECISION_CODES.index("NEED_INFO")
+
+# Order find_next_needed_field walks; the final entry is its fallback
+NEEDED_FIELDS = FIELD_PRIORITY_ORDER + [
+    f for f in DECISION_NODES if f not in FIELD_PRIORITY_ORDER
+] + ["unknown_field"]
+
+def build_codebooks(rules):
+    """
+    Map every field value seen in DECISION_NODES or the rules to a small int
+    """
+    codebooks = {}
+    for field, node_info in DECISION_NODES.items():
+        codebooks[field] = {}
+        for value in node_info["values"]:
+            codebooks[field].setdefault(value, len(codebooks[field]) + 2)
+
+    for rule in rules:
+        for field, required_value in rule["conditions"].items():
+            book = codebooks.setdefault(field, {})
+            values = required_value if isinstance(required_value, list) else [required_value]
+            for value in values:
+                book.setdefault(value, len(book) + 2)
+    return codebooks
+
+def build_rule_tables(rules, codebooks):
+    """
+    For each rule, a per-field boolean lookup table over column codes
+    """
+    tables = []
+    for rule in rules:
+        conditions = []
+        for field, required_value in rule["conditions"].items():
+            book = codebooks[field]
+            table = np.zeros(len(book) + 2, dtype=bool)
+            values = required_value if isinstance(required_value, list) else [required_value]
+            for value in values:
+                table[book[value]] = True
+            conditions.append((field, table))
+        tables.append(conditions)
+    return tables
+
+class BatchTables:
+    """
+    Codebooks and per-rule lookup tables compiled from one RuleSet
+    """
+
+    def __init__(self, rule_set):
+        rules = rule_set.index.rules
+        self.checksum = rule_set.checksum
+        self.rule_ids = [rule["id"] for rule in rules]
+        self.codebooks = build_codebooks(rules)
+        self.rule_tables = build_rule_tables(rules, self.codebooks)
+        self.rule_decision_codes = np.array(
+            [DECISION_CODES.index(rule["decision"]) for rule in rules],
+            dtype=np.uint8
+        )
+
+    def encode_value(self, field, value):
+        """
+        Column code for a single value (raw or {"value": ...} format)
+        """
+        if isinstance(value, (dict, Fact)) and "value" in value:
+            value = value["value"]
+        try:
+            return self.codebooks[field].get(value, OTHER_CODE)
+        except TypeError:
+            return OTHER_CODE
+
+    def encode_column(self, field, column):
+        """
+        Encode a column of values as uint8 codes; None marks a missing field.
+        Integer arrays are taken as codes already and must fit the codebook.
+        Anything else is reduced to its distinct values first (np.unique,
+        or hashing for Python objects), so the codebook is consulted once
+        per distinct value, not once per row.
+        """
+        if isinstance(column, np.ndarray) and column.dtype.kind in "iu":
+            limit = len(self.codebooks[field]) + 2
+            if len(column) and (column.min() < 0 or column.max() >= limit):
+                raise ValueError(f"Codes for '{field}' must be in [0, {limit}), "
+                                 f"got {column.min()}..{column.max()}")
+            return column.astype(np.uint8, copy=False)
+
+        values = column if isinstance(column, np.ndarray) else np.asarray(column, dtype=object)
+        if values.dtype == object:
+            # Python objects sort slowly (None and dicts not at all), so hash them
+            uniques, inverse = _factorize(values)
+        else:
+            uniques, inverse = np.unique(values, return_inverse=True)
+        lookup = np.fromiter(
+            (MISSING_CODE if value is None else self.encode_value(field, value) for value in uniques),
+            dtype=np.uint8,
+            count=len(uniques)
+        )
+        return lookup[inverse]
+
+def _factorize(values):
+    """(distinct values, index of each row's value), like np.unique without sorting"""
+    index = {}
+    try:
+        inverse = np.fromiter((index.setdefault(value, len(index)) for value in values),
+                              dtype=np.intp, count=len(values))
+    except TypeError:
+        # {"value": ...} dicts (or other unhashable values): unwrap them row by row
+        index = {}
+        inverse = np.fromiter((index.setdefault(_hashable(value), len(index)) for value in values),
+                              dtype=np.intp, count=len(values))
+    return list(index), inverse
+
+def _hashable(value):
+    if isinstance(value, (dict, Fact)) and "value" in value:
+        value = value["value"]
+    try:
+        hash(value)
+    except TypeError:
+        return _UNHASHABLE
+    return value
+
+_tables = None
+
+def get_batch_tables(rule_set=None):
+    """Tables for rule_set, or for the registry's active RuleSet"""
+    global _tables
+    rule_set = rule_set or get_rule_registry().current()
+    tables = _tables
+    if tables is None or tables.checksum != rule_set.checksum:
+        tables = BatchTables(rule_set)
+        _tables = tables
+    return tables
+
+def encode_value(field, value):
+    """Column code for a single value under the active rules"""
+    return get_batch_tables().encode_value(field, value)
+
+def encode_column(field, column):
+    """Encode a column under the active rules (see BatchTables.encode_column)"""
+    return get_batch_tables().encode_column(field, column)
+
+def make_refund_decisions(cases, rule_set=None):
+    """
+    Adjudicate a batch of cases given as {field: column} arrays.
+    Fields absent from cases are treated as missing for every row.
+    Uses rule_set, or the registry's active RuleSet when not given.
+
+    Returns parallel arrays: "decision" (index into DECISION_CODES),
+    "rule" (index into "rule_ids", -1 if none) and "field_needed"
+    (index into NEEDED_FIELDS, -1 when a decision was reached).
+    """
+    return _decide(get_batch_tables(rule_set), cases)
+
+def _decide(tables, cases):
+    codes = {
+        field: tables.encode_column(field, column)
+        for field, column in cases.items() if field in tables.codebooks
+    }
+    lengths = {len(column) for column in codes.values()}
+    if len(lengths) > 1:
+        raise ValueError(f"All case columns must have the same length, got {sorted(lengths)}")
+    rows = lengths.pop() if lengths else 0
+    missing = np.zeros(rows, dtype=np.uint8)
+
+    # Evaluate rules as masks in priority order; first match wins
+    rule_index = np.full(rows, -1, dtype=np.int16)
+    undecided = np.ones(rows, dtype=bool)
+    for i, conditions in enumerate(tables.rule_tables):
+        matched = undecided.copy()
+        for field, table in conditions:
+            matched &= table[codes.get(field, missing)]
+        rule_index[matched] = i
+        undecided &= ~matched
+
+    decision = np.full(rows, NEED_INFO_CODE, dtype=np.uint8)
+    decided = ~undecided
+    decision[decided] = tables.rule_decision_codes[rule_index[decided]]
+
+    # Walk the priority order backwards so the earliest missing field wins
+    field_needed = np.full(rows, -1, dtype=np.int16)
+    field_needed[undecided] = len(NEEDED_FIELDS) - 1
+    for j in range(len(NEEDED_FIELDS) - 2, -1, -1):
+        column = codes.get(NEEDED_FIELDS[j], missing)
+        field_needed[undecided & (column == MISSING_CODE)] = j
+
+    return {
+        "decision": decision,
+        "rule": rule_index,
+        "field_needed": field_needed,
+        "rule_ids": tables.rule_ids
+    }
+
+def make_refund_decisions_jsonl(source, chunk_size=100000, rule_set=None):
+    """
+    Stream cases from a JSONL file (path or open file), one case dict per
+    line, and yield (first_row, results) per chunk so memory stays bounded.
+    The whole file is adjudicated under one RuleSet, even across a reload.
+    """
+    tables = get_batch_tables(rule_set)
+    handle = open(source, "r") if isinstance(source, str) else source
+    try:
+        first_row = 0
+        chunk = _new_chunk(tables, chunk_size)
+        rows = 0
+        for line in handle:
+            line = line.strip()
+            if not line:
+                continue
+            case = json.loads(line)
+            for field, value in case.items():
+                if field in chunk:
+                    chunk[field][rows] = value
+            rows += 1
+
+            if rows == chunk_size:
+                yield first_row, _decide(tables, chunk)
+                first_row += rows
+                chunk = _new_chunk(tables, chunk_size)
+                rows = 0
+
+        if rows:
+            yield first_row, _decide(tables, {f: c[:rows] for f, c in chunk.items()})
+    finally:
+        if handle is not source:
+            handle.close()
+
+def _new_chunk(tables, chunk_size):
+    """Raw value buffers for one JSONL chunk (everything missing), encoded per column by _decide"""
+    return {field: np.full(chunk_size, None, dtype=object) for field in tables.codebooks}
+
+def decode_results(results):
+    """
+    Yield one readable dict per row from make_refund_decisions output
+    """
+    rule_ids = results["rule_ids"]
+    for decision, rule, field in zip(results["decision"], results["rule"], results["field_needed"]):
+        yield {
+            "decision": DECISION_CODES[decision],
+            "rule_id": rule_ids[rule] if rule >= 0 else None,
+            "field_needed": NEEDED_FIELDS[field] if field >= 0 else None
+        }
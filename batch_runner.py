@@ -0,0 +1,185 @@
+# Non-interactive batch adjudication: stream refund requests from JSONL, write decisions as JSONL
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from conversation_manager import ConversationManager, quiet_log
+from llm_backends import create_backend, set_llm_backend
+from llm_metering import LLM_METER
+from config import BATCH_WORKERS, BATCH_CHECKPOINT_EVERY
+
+def adjudicate(item, account_file="account_data.json"):
+    """
+    Run one request through a fresh conversation. `item` is a dict with
+    "request" (the opening message), optional "answers" (replies to the
+    bot's questions, used in order) and optional "account" (account data
+    used instead of account_file). Returns the output record.
+    Nobody reads along, so nothing is printed, streamed or prefetched.
+    """
+    conversation = ConversationManager(account_file, log=quiet_log, prefetch=False, stream_questions=False)
+    if "account" in item:
+        conversation.extractor.account_data = item["account"]
+
+    result = conversation.start_conversation(item["request"])
+    conversation.current_state = "IN_PROGRESS"
+    answers = list(item.get("answers", []))
+    turns = 0
+    while result["status"] == "NEED_INPUT" and turns < len(answers):
+        result = conversation.process_user_response(answers[turns])
+        turns += 1
+
+    record = {"id": item.get("id"), "status": result["status"], "turns": turns}
+    if result["status"] == "COMPLETE":
+        record["decision"] = result["decision"]
+        record["reason"] = result["reason"]
+    else:
+        # Ran out of scripted answers before a decision
+        record["question"] = result.get("question")
+        record["field_needed"] = result.get("field_needed")
+    return record
+
+def _process_line(line_number, raw, account_file):
+    item = None
+    try:
+        item = json.loads(raw)
+        record = adjudicate(item, account_file)
+    except Exception as e:
+        item_id = item.get("id") if isinstance(item, dict) else None
+        record = {"id": item_id, "status": "ERROR", "error": f"{type(e).__name__}: {e}"}
+    record["line"] = line_number
+    return record
+
+def read_checkpoint(path):
+    """
+    {"input_offset", "input_lines", "output_size", "lines"} from a
+    previous run, or zeros for a fresh one
+    """
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"input_offset": 0, "input_lines": 0, "output_size": 0, "lines": 0}
+
+def write_checkpoint(path, checkpoint):
+    """Atomic replace so a crash never leaves a half-written checkpoint"""
+    temp_path = path + ".tmp"
+    with open(temp_path, "w") as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+def run_batch(input_path, output_path, checkpoint_path=None, workers=BATCH_WORKERS,
+              checkpoint_every=BATCH_CHECKPOINT_EVERY, account_file="account_data.json", log=sys.stderr):
+    """
+    Stream input_path line by line through `workers` threads, writing one
+    JSON record per input line to output_path in input order. At most
+    2 * workers lines are in flight, so memory stays flat however long
+    the input is.
+
+    Every checkpoint_every lines the output is fsynced and the checkpoint
+    records the input byte offset and output size reached. A rerun with
+    the same paths truncates output written after the last checkpoint and
+    carries on from the recorded offset.
+    """
+    checkpoint_path = checkpoint_path or output_path + ".checkpoint"
+    checkpoint = read_checkpoint(checkpoint_path)
+    if checkpoint["lines"]:
+        print(f"Resuming after {checkpoint['lines']} lines", file=log)
+
+    started = time.perf_counter()
+    done_this_run = 0
+    window = deque()
+
+    with open(input_path, "rb") as source, open(output_path, "ab") as sink, \
+            ThreadPoolExecutor(max_workers=workers) as pool:
+        # Drop anything written after the last checkpoint
+        sink.truncate(checkpoint["output_size"])
+        sink.seek(checkpoint["output_size"])
+        source.seek(checkpoint["input_offset"])
+        offset = checkpoint["input_offset"]
+        line_number = checkpoint["input_lines"]
+
+        def write_oldest():
+            nonlocal done_this_run
+            end_offset, end_line, future = window.popleft()
+            sink.write(json.dumps(future.result()).encode("utf-8") + b"\n")
+            checkpoint["lines"] += 1
+            checkpoint["input_offset"] = end_offset
+            checkpoint["input_lines"] = end_line
+            done_this_run += 1
+            if checkpoint["lines"] % checkpoint_every == 0:
+                sink.flush()
+                os.fsync(sink.fileno())
+                checkpoint["output_size"] = sink.tell()
+                write_checkpoint(checkpoint_path, checkpoint)
+                rate = done_this_run / (time.perf_counter() - started)
+                print(f"{checkpoint['lines']} lines done ({rate:.1f}/s)", file=log)
+
+        for raw in iter(source.readline, b""):
+            offset += len(raw)
+            line_number += 1
+            if not raw.strip():
+                continue  # no output; the next record's offset moves past it
+            window.append((offset, line_number, pool.submit(_process_line, line_number, raw, account_file)))
+            if len(window) >= 2 * workers:
+                write_oldest()
+
+        while window:
+            write_oldest()
+
+        sink.flush()
+        os.fsync(sink.fileno())
+        checkpoint["input_offset"] = offset
+        checkpoint["input_lines"] = line_number
+        checkpoint["output_size"] = sink.tell()
+        write_checkpoint(checkpoint_path, checkpoint)
+
+    elapsed = time.perf_counter() - started
+    print(f"Finished: {checkpoint['lines']} lines total, {done_this_run} this run in {elapsed:.1f}s", file=log)
+    return checkpoint
+
+def _option(argv, name, default):
+    if name in argv:
+        return argv[argv.index(name) + 1]
+    return default
+
+def main(argv=None):
+    """python batch_runner.py INPUT.jsonl OUTPUT.jsonl [--workers N] [--checkpoint PATH]
+    [--checkpoint-every N] [--account FILE] [--backend openai|stub|record|replay] [--metrics PATH]"""
+    argv = sys.argv[1:] if argv is None else argv
+    paths = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg.startswith("--"):
+            skip = True
+        else:
+            paths.append(arg)
+    if len(paths) != 2:
+        print(main.__doc__)
+        return 2
+
+    backend = _option(argv, "--backend", None)
+    if backend is not None:
+        set_llm_backend(create_backend(backend))
+
+    run_batch(
+        paths[0], paths[1],
+        checkpoint_path=_option(argv, "--checkpoint", None),
+        workers=int(_option(argv, "--workers", BATCH_WORKERS)),
+        checkpoint_every=int(_option(argv, "--checkpoint-every", BATCH_CHECKPOINT_EVERY)),
+        account_file=_option(argv, "--account", "account_data.json")
+    )
+    metrics_path = _option(argv, "--metrics", None)
+    if metrics_path is not None:
+        # LLM tokens, cost and latency for the run, Prometheus text format
+        LLM_METER.write_prometheus(metrics_path)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
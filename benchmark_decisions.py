@@ -0,0 +1,164 @@
+# Equivalence checks and benchmark: brute-force scan vs RULE_INDEX vs batch API
+import itertools
+import sys
+import time
+
+import numpy as np
+
+from decision_nodes import DECISION_NODES
+from decision_brute_force import (
+    make_refund_decision, make_refund_decision_brute_force, get_critical_fields
+)
+from batch_decisions import make_refund_decisions, decode_results
+from outcome_table import load_outcome_table
+from rule_agenda import RuleAgenda
+
+def iter_all_combinations(fields=None):
+    """
+    Yield every combination of DECISION_NODES values for the given fields,
+    with each field also allowed to be missing
+    """
+    fields = fields or get_critical_fields()
+    domains = [DECISION_NODES[field]["values"] + [None] for field in fields]
+
+    for values in itertools.product(*domains):
+        data = {}
+        for field, value in zip(fields, values):
+            if value is not None:
+                data[field] = {"value": value, "confidence": 1.0}
+        yield data
+
+def check_equivalence():
+    """
+    Compare both decision paths on every combination; returns mismatches
+    """
+    mismatches = []
+    checked = 0
+    for data in iter_all_combinations():
+        expected = make_refund_decision_brute_force(data)
+        actual = make_refund_decision(data)
+        if expected != actual:
+            mismatches.append((data, expected, actual))
+        checked += 1
+
+    print(f"Checked {checked} combinations: {len(mismatches)} mismatches")
+    return mismatches
+
+def to_columns(cases):
+    """
+    Turn a list of case dicts into {field: column} with None for missing
+    """
+    return {
+        field: [case[field]["value"] if field in case else None for case in cases]
+        for field in get_critical_fields()
+    }
+
+def check_batch_equivalence():
+    """
+    Compare the vectorized batch API against make_refund_decision row by row
+    """
+    cases = list(iter_all_combinations())
+    results = decode_results(make_refund_decisions(to_columns(cases)))
+
+    mismatches = []
+    for data, row in zip(cases, results):
+        expected = make_refund_decision(data)
+        if (row["decision"] != expected["decision"] or
+                row["rule_id"] != expected.get("rule_id") or
+                row["field_needed"] != expected.get("field_needed")):
+            mismatches.append((data, expected, row))
+
+    # Integer columns are taken as codes and must fit the field's codebook
+    field = get_critical_fields()[0]
+    try:
+        make_refund_decisions({field: np.array([200], dtype=np.int64)})
+        mismatches.append(({field: 200}, "ValueError", "accepted"))
+    except ValueError:
+        pass
+
+    print(f"Checked {len(cases)} batch rows: {len(mismatches)} mismatches")
+    return mismatches
+
+def check_table_equivalence(table):
+    """
+    Compare outcome-table lookups against make_refund_decision
+    """
+    mismatches = []
+    checked = 0
+    for data in iter_all_combinations():
+        expected = make_refund_decision(data)
+        actual = table.make_refund_decision(data)
+        if expected != actual:
+            mismatches.append((data, expected, actual))
+        checked += 1
+
+    print(f"Checked {checked} table lookups: {len(mismatches)} mismatches")
+    return mismatches
+
+def check_agenda_equivalence():
+    """
+    Feed every combination through one RuleAgenda in sequence, so each step
+    is an incremental update of the few fields that changed
+    """
+    agenda = RuleAgenda()
+    mismatches = []
+    checked = 0
+    for data in iter_all_combinations():
+        agenda.sync(data)
+        expected = make_refund_decision(data)
+        actual = make_refund_decision(data, agenda)
+        if expected != actual:
+            mismatches.append((data, expected, actual))
+        checked += 1
+
+    print(f"Checked {checked} agenda updates: {len(mismatches)} mismatches")
+    return mismatches
+
+def run_benchmark(table, repeat=3):
+    """
+    Time each decision path over the full combination space
+    """
+    cases = list(iter_all_combinations())
+
+    for name, decide in [("brute force", make_refund_decision_brute_force),
+                         ("rule index", make_refund_decision),
+                         ("table", table.make_refund_decision)]:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for data in cases:
+                decide(data)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{name:12s}: {best:.3f}s for {len(cases)} cases "
+              f"({best / len(cases) * 1e6:.2f} us/decision)")
+
+    # The conversation path: one agenda, synced to each case in turn
+    agenda = RuleAgenda()
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for data in cases:
+            agenda.sync(data)
+            make_refund_decision(data, agenda)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{'agenda':12s}: {best:.3f}s for {len(cases)} cases "
+          f"({best / len(cases) * 1e6:.2f} us/decision, sync included)")
+
+    columns = to_columns(cases)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        make_refund_decisions(columns)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{'batch':12s}: {best:.3f}s for {len(cases)} cases "
+          f"({best / len(cases) * 1e6:.2f} us/decision)")
+
+if __name__ == "__main__":
+    table = load_outcome_table()
+    if (check_equivalence() or check_batch_equivalence() or
+            check_table_equivalence(table) or check_agenda_equivalence()):
+        sys.exit(1)
+    run_benchmark(table)
@@ -4,7 +4,76 @@ from dotenv import load_dotenv
 load_dotenv()
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # e.g. a local OpenAI-compatible server; None = api.openai.com
 MODEL_NAME = "gpt-4o-mini"  
 CONFIDENCE_THRESHOLD = 0.7
 MAX_TOKENS = 1000  
-TEMPERATURE = 0.1  
\ No newline at end of file
+TEMPERATURE = 0.1
+USE_QUESTION_PLANNER = True  # ask the field that minimizes expected turns
+RULES_FILE = os.getenv("REFUND_RULES_FILE")  # JSON/YAML rules; built-in DECISION_RULES if unset
+RULES_POLL_INTERVAL = 2.0  # seconds between rules file change checks
+# Answer agenda-less decisions (planner precompute, prefetch speculation, scripts) from a precomputed,
+# memory-mapped table; conversations keep their incremental rule agenda, which is faster per turn
+OUTCOME_TABLE = os.getenv("OUTCOME_TABLE", "false").lower() == "true"
+OUTCOME_TABLE_DIR = os.getenv("OUTCOME_TABLE_DIR") or os.path.dirname(os.path.abspath(__file__))  # where table files live
+DECISION_METRICS = os.getenv("DECISION_METRICS", "false").lower() == "true"  # per-rule counters and latency
+FAST_PATH_CONFIDENCE = 0.85  # keyword fast-path extractions at or above this skip the LLM
+EXTRACTION_CACHE_ENABLED = os.getenv("EXTRACTION_CACHE", "true").lower() == "true"
+EXTRACTION_CACHE_FILE = "extraction_cache.sqlite3"  # on-disk tier; None keeps it in memory only
+EXTRACTION_CACHE_MEMORY_ENTRIES = 10000
+EXTRACTION_CACHE_DISK_ENTRIES = 500000
+EXTRACTION_CACHE_TTL = 7 * 24 * 3600  # seconds
+SIMILARITY_CACHE_ENABLED = os.getenv("SIMILARITY_CACHE", "true").lower() == "true"
+SIMILARITY_CACHE_THRESHOLD = 0.85  # estimated n-gram Jaccard needed to reuse an extraction
+SIMILARITY_CACHE_MAX_ENTRIES = 200000
+LLM_TIMEOUT = 30.0  # seconds per async LLM attempt
+LLM_MAX_RETRIES = 3  # async retries on 429/5xx, timeouts and connection errors
+LLM_BACKOFF_BASE = 0.5  # seconds; full-jitter exponential backoff
+LLM_BACKOFF_MAX = 8.0
+BATCH_WORKERS = 8  # requests adjudicated concurrently in batch mode
+BATCH_CHECKPOINT_EVERY = 1000  # output lines between batch checkpoints
+COMBINED_TURN_MODE = os.getenv("COMBINED_TURN", "true").lower() == "true"  # extraction call also drafts next questions
+COMBINED_QUESTION_FIELDS = 3  # candidate fields to draft questions for per turn
+# Generate likely next questions while the customer types. Off by default: it costs up to
+# PREFETCH_BUDGET extra LLM calls per turn, and at most one of them is ever served
+PREFETCH_ENABLED = os.getenv("PREFETCH", "false").lower() == "true"
+PREFETCH_BUDGET = 3  # speculative question generations per turn
+PREFETCH_WORKERS = 4  # shared background threads for prefetching
+PROMPT_TOKEN_BUDGET = 400  # estimated tokens for the per-turn part of an extraction prompt
+PROMPT_SAVINGS_LOG = os.getenv("PROMPT_SAVINGS_LOG", "false").lower() == "true"  # also size the legacy prompt per call to report token savings (benchmarking)
+PROMPT_CACHE_MIN_TOKENS = 1024  # providers only cache prompt prefixes at least this long
+STREAM_QUESTIONS = os.getenv("STREAM_QUESTIONS", "true").lower() == "true"  # show generated questions token by token
+STREAM_STALL_TIMEOUT = 5.0  # seconds without a token before falling back to the template question
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")  # openai, stub (offline), record or replay
+LLM_RECORD_FILE = os.getenv("LLM_RECORD_FILE", "llm_recordings.jsonl")  # record/replay storage
+STUB_LATENCY = float(os.getenv("STUB_LATENCY", "0"))  # seconds added to each stub call
+STUB_TOKEN_DELAY = float(os.getenv("STUB_TOKEN_DELAY", "0"))  # seconds between streamed stub words
+FACT_INTERN_LIMIT = 100000  # distinct shared fact records before new ones stop being interned
+FIELD_CLASSIFIER_MODEL = os.getenv("FIELD_CLASSIFIER_MODEL", "field_classifier.npz")  # local per-field classifier; skipped if the file is missing
+TRANSCRIPT_LOG = os.getenv("TRANSCRIPT_LOG", "")  # JSONL of finished conversations for classifier training; empty = off
+LLM_GUARD = os.getenv("LLM_GUARD", "true").lower() == "true"  # latency budgets, hedging and circuit breaker around the LLM backend
+LLM_EXTRACTION_BUDGET = 6.0  # seconds an extraction call may take, hedges and retries included
+LLM_QUESTION_BUDGET = 3.0  # seconds for a question-generation call
+LLM_HEDGE_DELAY = 1.5  # seconds before a duplicate request is sent, until enough latencies are seen
+LLM_HEDGE_QUANTILE = 0.95  # then hedge at this quantile of recent successful latencies
+LLM_MAX_ATTEMPTS = 2  # requests per call, counting hedges and retries
+LLM_GUARD_WORKERS = 32  # threads running sync attempts so they can be raced
+BREAKER_WINDOW = 20  # recent calls the failure rate is measured over
+BREAKER_MIN_CALLS = 5  # calls needed in the window before the breaker may trip
+BREAKER_FAILURE_RATE = 0.5  # failed or slow share of the window that trips the breaker
+BREAKER_SLOW_CALL = 2.5  # seconds after which a successful call still counts against the LLM
+BREAKER_COOLDOWN = 30.0  # seconds open before a half-open probe is let through
+# USD per million tokens (prompt, cached prompt, completion) for LLM cost metering
+LLM_PRICES = {
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-3.5-turbo": (0.50, 0.50, 1.50),
+}
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")  # conversation_service.py listen address
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8080"))
+SERVICE_MAX_SESSIONS = 10000  # live conversations per process; the least recently used is dropped when full
+SERVICE_IDLE_TIMEOUT = 1800.0  # seconds without a turn before a conversation is dropped
+SERVICE_MAX_BODY = 64 * 1024  # bytes per HTTP request body or WebSocket message
+SESSION_STORE = os.getenv("SESSION_STORE", "")  # memory, sqlite or files: where the service keeps conversation snapshots; empty = in-process only
+SESSION_STORE_PATH = os.getenv("SESSION_STORE_PATH", "")  # SQLite file or directory for the store
+SESSION_STORE_MEMORY_ENTRIES = 100000  # snapshots a memory store keeps before dropping the oldest
+SESSION_STORE_BUSY_TIMEOUT = 1.0  # seconds a SQLite store waits on another worker's write lock before giving up
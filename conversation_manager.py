@@ -1,117 +1,208 @@
 # Updated conversation_manager.py with keyword extraction fix
 from extractor import InformationExtractor
-from decision_brute_force import traverse_decision_tree, build_question_context, get_critical_fields
-from decision_nodes import DECISION_NODES
+from decision_brute_force import (
+    traverse_decision_tree, build_question_context, get_critical_fields, FIELD_PRIORITY_ORDER
+)
+from decision_nodes import DECISION_NODES, ITEM_CATEGORY_KEYWORDS, KEYWORD_MAPPINGS
+from rule_agenda import RuleAgenda
+from rule_loader import get_rule_registry
+from question_prefetch import QuestionPrefetcher
+from fact_store import make_fact, REASON_KEYWORD, REASON_CATEGORY
+from field_classifier import get_transcript_log
+from llm_metering import SessionMeter, LLM_METER, metered_call
+from question_stream import stream_question, stdout_sink
+from config import (
+    USE_QUESTION_PLANNER, LLM_TIMEOUT, COMBINED_TURN_MODE, COMBINED_QUESTION_FIELDS, PREFETCH_ENABLED,
+    STREAM_QUESTIONS, STREAM_STALL_TIMEOUT
+)
+import asyncio
 import json
 
+UNCERTAIN_RESPONSES = ['i dont know', "don't know", 'not sure', 'unsure', 'idk']
+SKIP_RESPONSES = ['skip', 'next', 'pass']
+
+def quiet_log(*args, **kwargs):
+    """Log sink for unattended runs: drops the conversation's console output"""
+
 class ConversationManager:
     """
     Manages the conversational flow for refund requests
     """
     
-    def __init__(self, account_data_file="account_data.json"):
-        self.extractor = InformationExtractor(account_data_file)
+    def __init__(self, account_data_file="account_data.json", log=print,
+                 prefetch=PREFETCH_ENABLED, stream_questions=STREAM_QUESTIONS):
+        # Where progress and questions are printed (print-compatible callable)
+        self.log = log
+        self.extractor = InformationExtractor(account_data_file, log=log)
         self.conversation_history = []
         self.current_state = "INITIAL"
         self.current_field_needed = None  # Track what field we're asking about
+        # Rule version is pinned for the whole conversation, even across reloads
+        self.rule_set = get_rule_registry().current()
+        # Picks questions that can still change the outcome (None = static order)
+        self.question_planner = self.rule_set.get_planner() if USE_QUESTION_PLANNER else None
+        # Rule states kept across turns; only rules on changed facts are re-checked
+        self.rule_agenda = RuleAgenda(self.rule_set.index)
+        self.agenda_version = None  # fact store version the agenda last saw
+        self.extractor.use_rule_set(self.rule_set)
+        # Questions drafted alongside this turn's extraction (combined turn mode)
+        self.pending_questions = {}
+        # Generates likely next questions while the customer types (None = off)
+        self.prefetcher = None
+        if prefetch:
+            self.prefetcher = QuestionPrefetcher(
+                self._prefetch_question, self.question_planner, self.rule_set.index
+            )
+        # Where streamed questions are written as they arrive (None = no streaming)
+        self.question_sink = stdout_sink if stream_questions else None
+        # Customer turns and what each yielded, logged for classifier training
+        self.transcript = []
+        # Tokens, cost and latency of this conversation's LLM calls
+        self.meter = SessionMeter()
         
     def start_conversation(self, initial_request):
         """
         Start a new refund conversation with initial request
         """
-        print("REFUND REQUEST ANALYSIS")
-        print("=" * 50)
-        print(f"Processing: '{initial_request}'")
+        token = self.meter.start_turn()
+        try:
+            return self._start_conversation(initial_request)
+        finally:
+            self.meter.end_turn(token)
+    
+    def _start_conversation(self, initial_request):
+        self.announce_request(initial_request)
         
         # Enhanced initial extraction with item category detection
         extracted = self.enhance_initial_extraction(initial_request)
+        self.report_initial_extraction(initial_request, extracted)
+        
+        # Try to traverse decision tree
+        return self.continue_conversation()
+    
+    async def start_conversation_async(self, initial_request, question_sink=None):
+        """
+        start_conversation with the LLM calls awaited, so one event loop
+        can serve many conversations. With question_sink the next question
+        is streamed into it; otherwise it is generated in one call.
+        """
+        token = self.meter.start_turn()
+        try:
+            self.announce_request(initial_request)
+            extracted = await self.enhance_initial_extraction_async(initial_request)
+            self.report_initial_extraction(initial_request, extracted)
+            return await self.continue_conversation_async(question_sink)
+        finally:
+            self.meter.end_turn(token)
+    
+    def announce_request(self, initial_request):
+        self.log("REFUND REQUEST ANALYSIS")
+        self.log("=" * 50)
+        self.log(f"Processing: '{initial_request}'")
+    
+    def report_initial_extraction(self, initial_request, extracted):
+        """Log the opening turn and show what it yielded"""
+        self.record_turn(initial_request, None, extracted)
         
         if extracted:
-            print(f"\nFound {len(extracted)} pieces of information:")
+            self.log(f"\nFound {len(extracted)} pieces of information:")
             for field, data in extracted.items():
                 confidence_level = self.get_confidence_level(data['confidence'])
-                print(f"  [{confidence_level}] {field}: {data['value']}")
-        
-        # Try to traverse decision tree
-        return self.continue_conversation()
+                self.log(f"  [{confidence_level}] {field}: {data['value']}")
     
     def enhance_initial_extraction(self, initial_request):
         """
         Better extraction of item category and other details from initial request
         """
         # First do normal extraction
-        extracted = self.extractor.extract_info(initial_request)
+        extracted = self.extractor.extract_info(initial_request, question_fields=self.question_candidates())
+        return self.detect_item_category(initial_request, extracted)
+    
+    async def enhance_initial_extraction_async(self, initial_request):
+        extracted = await self.extractor.extract_info_async(
+            initial_request, question_fields=self.question_candidates()
+        )
+        return self.detect_item_category(initial_request, extracted)
+    
+    def detect_item_category(self, initial_request, extracted):
+        """Keep drafted questions and fill item_category from keywords when extraction missed it"""
+        self.pending_questions = dict(self.extractor.last_questions)
         
         # Add item category detection if not found
         if "item_category" not in extracted:
-            item_keywords = {
-                "laptop": "physical",
-                "computer": "physical", 
-                "phone": "physical",
-                "tablet": "physical",
-                "headphones": "physical",
-                "electronics": "physical",
-                "food": "perishable",
-                "pizza": "perishable",
-                "meal": "perishable",
-                "groceries": "perishable",
-                "software": "digital",
-                "app": "digital",
-                "course": "digital",
-                "ebook": "digital",
-                "download": "digital",
-                "jacket": "physical",
-                "shirt": "physical",
-                "shoes": "physical",
-                "clothing": "physical",
-                "furniture": "physical",
-                "appliance": "physical"
-            }
-            
             request_lower = initial_request.lower()
-            for keyword, category in item_keywords.items():
+            for keyword, category in ITEM_CATEGORY_KEYWORDS.items():
                 if keyword in request_lower:
                     # Add to extracted data manually
-                    self.extractor.extracted_data["item_category"] = {
-                        "value": category,
-                        "confidence": 0.80,
-                        "source": "user_input",
-                        "reasoning": f"Detected '{keyword}' indicates {category} item"
-                    }
+                    self.extractor.extracted_data["item_category"] = make_fact(
+                        "item_category", category, 0.80, reason=REASON_CATEGORY, detail=keyword
+                    )
                     extracted["item_category"] = self.extractor.extracted_data["item_category"]
                     break
         
         return extracted
     
+    def sync_agenda(self):
+        """
+        Complete data, with the rule agenda brought up to date; skipped
+        when the fact store has not changed since the last sync
+        """
+        complete_data = self.extractor.get_complete_data()
+        if self.extractor.facts.version != self.agenda_version:
+            self.rule_agenda.sync(complete_data)
+            self.agenda_version = self.extractor.facts.version
+        return complete_data
+    
     def continue_conversation(self):
         """
         Continue the conversation by traversing the decision tree
         """
-        complete_data = self.extractor.get_complete_data()
-        traversal_result = traverse_decision_tree(complete_data)
+        traversal_result = self.traverse()
         
         if traversal_result["status"] == "DECISION_REACHED":
             return self.handle_final_decision(traversal_result)
         else:
             return self.handle_need_more_info(traversal_result)
     
+    async def continue_conversation_async(self, question_sink=None):
+        traversal_result = self.traverse()
+        
+        if traversal_result["status"] == "DECISION_REACHED":
+            return self.handle_final_decision(traversal_result)
+        else:
+            return await self.handle_need_more_info_async(traversal_result, question_sink)
+    
+    def traverse(self):
+        """Decision tree traversal over the current data"""
+        complete_data = self.sync_agenda()
+        return traverse_decision_tree(
+            complete_data, self.question_planner, self.rule_agenda, self.rule_set.index
+        )
+    
     def handle_final_decision(self, result):
         """
         Handle when we've reached a final decision
         """
-        print(f"\nDECISION REACHED!")
-        print("=" * 30)
-        print(f"RESULT: {result['final_decision']}")
-        print(f"REASON: {result['reason']}")
-        print(f"CONFIDENCE: {result['confidence']:.2f}")
-        print(f"PATH: {result['path']}")
+        if self.prefetcher is not None:
+            self.prefetcher.cancel()
+        
+        self.log(f"\nDECISION REACHED!")
+        self.log("=" * 30)
+        self.log(f"RESULT: {result['final_decision']}")
+        self.log(f"REASON: {result['reason']}")
+        self.log(f"CONFIDENCE: {result['confidence']:.2f}")
+        self.log(f"PATH: {result['path']}")
         
         # Show what information was used
         complete_data = self.extractor.get_complete_data()
-        print(f"\nBased on the following information:")
+        LLM_METER.finish_session(self.meter)
+        transcript_log = get_transcript_log()
+        if transcript_log is not None:
+            transcript_log.write(self.transcript, complete_data, result['final_decision'])
+        self.log(f"\nBased on the following information:")
         for field, info in complete_data.items():
             source_label = {"account_data": "ACCOUNT", "user_input": "INPUT", "inferred": "INFERRED"}.get(info.get("source"), "UNKNOWN")
-            print(f"  [{source_label}] {field}: {info['value']}")
+            self.log(f"  [{source_label}] {field}: {info['value']}")
         
         return {
             "status": "COMPLETE",
@@ -123,28 +214,95 @@ class ConversationManager:
         """
         Handle when we need more information with progress indication
         """
-        # Show progress
+        self.report_progress(result)
+        
+        # Use the question drafted with this turn's extraction or prefetched
+        # while the customer typed, otherwise generate one using LLM
+        question = self.drafted_question(result["stopping_field"])
+        if question is None and self.prefetcher is not None:
+            question = self.prefetcher.take(result["stopping_field"], self.extractor.get_complete_data())
+        
+        if question is None and self.question_sink is not None:
+            # Show the question token by token as the LLM writes it
+            self.question_sink("\nQUESTION: ")
+            question = self.generate_smart_question_streaming(
+                result["stopping_field"],
+                result["context"],
+                result["question"]  # fallback question
+            )
+            self.question_sink("\n")
+        else:
+            if question is None:
+                question = self.generate_smart_question(
+                    result["stopping_field"], 
+                    result["context"],
+                    result["question"]  # fallback question
+                )
+            self.log(f"\nQUESTION: {question}")
+        
+        return self.ask(result, question)
+    
+    async def handle_need_more_info_async(self, result, question_sink=None):
+        """
+        handle_need_more_info for an event loop: prefetched questions are
+        awaited and new ones come from the backend's async path, or are
+        streamed into question_sink from a worker thread (backends stream
+        synchronously), so other conversations keep running meanwhile
+        """
+        self.report_progress(result)
+        
+        question = self.drafted_question(result["stopping_field"])
+        if question is None and self.prefetcher is not None:
+            question = await self.prefetcher.take_async(result["stopping_field"], self.extractor.get_complete_data())
+        
+        if question is None and question_sink is not None:
+            question = await asyncio.to_thread(
+                self.generate_smart_question_streaming,
+                result["stopping_field"],
+                result["context"],
+                result["question"],
+                question_sink
+            )
+        else:
+            if question is None:
+                question = await self.generate_smart_question_async(
+                    result["stopping_field"],
+                    result["context"],
+                    result["question"]
+                )
+            if question_sink is not None:
+                question_sink(question)
+        self.log(f"\nQUESTION: {question}")
+        
+        return self.ask(result, question)
+    
+    def report_progress(self, result):
+        """Show progress and remember which field is being asked about"""
         complete_data = self.extractor.get_complete_data()
         critical_fields = get_critical_fields()
         
         available_critical = len([f for f in critical_fields if f in complete_data])
         total_critical = len(critical_fields)
         
-        print(f"\nNeed more information to proceed...")
-        print(f"Progress: {available_critical}/{total_critical} critical fields collected")
-        print(f"Current decision path: {result['current_path']}")
+        self.log(f"\nNeed more information to proceed...")
+        self.log(f"Progress: {available_critical}/{total_critical} critical fields collected")
+        self.log(f"Current decision path: {result['current_path']}")
         
         # Store what field we're asking about
         self.current_field_needed = result["stopping_field"]
-        
-        # Generate contextual question using LLM
-        question = self.generate_smart_question(
-            result["stopping_field"], 
-            result["context"],
-            result["question"]  # fallback question
-        )
-        
-        print(f"\nQUESTION: {question}")
+    
+    def drafted_question(self, field):
+        """Question for `field` drafted with this turn's extraction, or None"""
+        question = self.pending_questions.get(field)
+        self.pending_questions = {}
+        if question is not None and self.prefetcher is not None:
+            self.prefetcher.cancel()
+        return question
+    
+    def ask(self, result, question):
+        """Start speculating on the answers while the customer types; the NEED_INPUT result"""
+        if self.prefetcher is not None:
+            self.prefetcher.start(result["stopping_field"], self.extractor.get_complete_data())
         
         return {
             "status": "NEED_INPUT",
@@ -156,43 +314,121 @@ class ConversationManager:
         """
         Process user's response with better error handling and keyword matching
         """
+        token = self.meter.start_turn()
+        try:
+            return self._process_user_response(user_response)
+        finally:
+            self.meter.end_turn(token)
+    
+    def _process_user_response(self, user_response):
         # Handle common uncertain responses
-        if user_response.lower() in ['i dont know', "don't know", 'not sure', 'unsure', 'idk']:
+        if user_response.lower() in UNCERTAIN_RESPONSES:
             return self.handle_uncertain_response()
         
-        if user_response.lower() in ['skip', 'next', 'pass']:
+        if user_response.lower() in SKIP_RESPONSES:
             return self.handle_skip_request()
         
-        print(f"\nProcessing response: '{user_response}'")
+        self.log(f"\nProcessing response: '{user_response}'")
         
         # First try direct keyword matching for the current field we're asking about
-        direct_match = self.try_direct_keyword_match(user_response, self.current_field_needed)
-        
-        if direct_match:
-            print("Direct keyword match found:")
-            print(f"  {direct_match['field']}: {direct_match['value']} (confidence: {direct_match['confidence']:.2f})")
-            
-            # Add to extractor data
-            self.extractor.extracted_data[direct_match['field']] = {
-                "value": direct_match['value'],
-                "confidence": direct_match['confidence'],
-                "source": "user_input",
-                "reasoning": f"Direct keyword match for {direct_match['field']}"
-            }
-        else:
+        if not self.apply_direct_match(user_response):
             # Try normal LLM extraction
-            extracted = self.extractor.extract_info(user_response)
-            
-            if extracted:
-                print("Extracted new information:")
-                for field, data in extracted.items():
-                    print(f"  {field}: {data['value']} (confidence: {data['confidence']:.2f})")
-            else:
+            extracted = self.extractor.extract_info(
+                user_response, question_fields=self.question_candidates(), field_asked=self.current_field_needed
+            )
+            if not self.report_extraction(user_response, extracted):
                 return self.handle_no_extraction(user_response)
         
         # Continue the conversation
         return self.continue_conversation()
     
+    async def process_user_response_async(self, user_response, question_sink=None):
+        """process_user_response with the LLM calls awaited (see start_conversation_async)"""
+        token = self.meter.start_turn()
+        try:
+            if user_response.lower() in UNCERTAIN_RESPONSES:
+                return self.handle_uncertain_response()
+            
+            if user_response.lower() in SKIP_RESPONSES:
+                response, traversal_result = self.skip_question()
+                if response is not None:
+                    return response
+                return await self.handle_need_more_info_async(traversal_result, question_sink)
+            
+            self.log(f"\nProcessing response: '{user_response}'")
+            
+            if not self.apply_direct_match(user_response):
+                extracted = await self.extractor.extract_info_async(
+                    user_response, question_fields=self.question_candidates(),
+                    field_asked=self.current_field_needed
+                )
+                if not self.report_extraction(user_response, extracted):
+                    return self.handle_no_extraction(user_response)
+            
+            return await self.continue_conversation_async(question_sink)
+        finally:
+            self.meter.end_turn(token)
+    
+    def apply_direct_match(self, user_response):
+        """Store a direct keyword match for the field being asked about; False if there is none"""
+        direct_match = self.try_direct_keyword_match(user_response, self.current_field_needed)
+        if not direct_match:
+            return False
+        
+        self.log("Direct keyword match found:")
+        self.log(f"  {direct_match['field']}: {direct_match['value']} (confidence: {direct_match['confidence']:.2f})")
+        
+        # Add to extractor data
+        self.extractor.extracted_data[direct_match['field']] = make_fact(
+            direct_match['field'], direct_match['value'], direct_match['confidence'], reason=REASON_KEYWORD
+        )
+        self.record_turn(user_response, self.current_field_needed, {direct_match['field']: direct_match})
+        return True
+    
+    def report_extraction(self, user_response, extracted):
+        """Keep drafted questions, log the turn and show what it yielded; False if nothing was extracted"""
+        self.pending_questions = dict(self.extractor.last_questions)
+        self.record_turn(user_response, self.current_field_needed, extracted)
+        
+        if not extracted:
+            return False
+        self.log("Extracted new information:")
+        for field, data in extracted.items():
+            self.log(f"  {field}: {data['value']} (confidence: {data['confidence']:.2f})")
+        return True
+    
+    def record_turn(self, message, field_asked, extracted):
+        """Keep a customer turn, the values it yielded and their reasoning for the transcript log"""
+        extracted = extracted or {}
+        self.transcript.append({
+            "message": message,
+            "field_asked": field_asked,
+            "extractions": {field: data["value"] for field, data in extracted.items()},
+            "reasoning": {field: data["reasoning"] for field, data in extracted.items() if data.get("reasoning")}
+        })
+    
+    def question_candidates(self):
+        """
+        Fields the decision engine is likely to ask about after this turn:
+        the planner's pick first, then the fields pending rules still need
+        in priority order. None unless combined turn mode is on.
+        """
+        if not COMBINED_TURN_MODE:
+            return None
+        
+        complete_data = self.sync_agenda()
+        pending = self.rule_agenda.pending_fields()
+        
+        candidates = []
+        if self.question_planner is not None:
+            planned = self.question_planner.next_field(complete_data)
+            if planned is not None:
+                candidates.append(planned)
+        for field in FIELD_PRIORITY_ORDER:
+            if field in pending and field not in candidates:
+                candidates.append(field)
+        return candidates[:COMBINED_QUESTION_FIELDS] or None
+    
     def try_direct_keyword_match(self, user_response, field_needed):
         """
         Try to match user response directly to field values
@@ -214,40 +450,9 @@ class ConversationManager:
                     "confidence": 0.95
                 }
         
-        # Partial matches and common variations
-        keyword_mappings = {
-            "seller_type": {
-                "direct": ["inhouse", "directly", "official", "your store", "your website"],
-                "third party": ["thirdparty", "third-party", "marketplace", "vendor", "seller", "partner"],
-                "unknown": ["unknown", "not sure", "don't know", "unsure"]
-            },
-            "payment_method": {
-                "credit_card": ["credit", "credit card", "visa", "mastercard", "amex"],
-                "debit_card": ["debit", "debit card"],
-                "paypal": ["paypal", "pay pal"],
-                "bnpl": ["afterpay", "klarna", "buy now pay later", "bnpl"],
-                "gift_card": ["gift card", "giftcard", "store credit"],
-                "prepaid_card": ["prepaid", "prepaid card"]
-            },
-            "return_window": {
-                "within": ["within", "recent", "recently", "last week", "few days", "yesterday"],
-                "expired": ["expired", "long time", "months ago", "old", "while ago"]
-            },
-            "item_condition": {
-                "damaged": ["damaged", "broken", "defective", "faulty"],
-                "wrong_item": ["wrong", "incorrect", "different"],
-                "not_as_described": ["not as described", "different than expected"],
-                "change_of_mind": ["changed mind", "don't want", "don't need"]
-            },
-            "delivery_status": {
-                "delivered": ["delivered", "received", "got it"],
-                "not_delivered": ["never arrived", "didn't arrive", "not delivered", "missing"],
-                "damaged_in_transit": ["damaged shipping", "broken in shipping", "arrived broken"]
-            }
-        }
-        
-        if field_needed in keyword_mappings:
-            for value, keywords in keyword_mappings[field_needed].items():
+        # Partial matches and common variations (KEYWORD_MAPPINGS)
+        if field_needed in KEYWORD_MAPPINGS:
+            for value, keywords in KEYWORD_MAPPINGS[field_needed].items():
                 for keyword in keywords:
                     if keyword in response_lower:
                         # Map common terms back to official values
@@ -269,7 +474,7 @@ class ConversationManager:
         """
         Handle when user is uncertain about information
         """
-        print("\nNo problem! Let me try a different approach.")
+        self.log("\nNo problem! Let me try a different approach.")
         
         # Get what we still need
         complete_data = self.extractor.get_complete_data()
@@ -283,12 +488,12 @@ class ConversationManager:
             options = field_info.get('values', [])
             
             if options:
-                print(f"Let me ask about something else. For {next_field}, the options are:")
+                self.log(f"Let me ask about something else. For {next_field}, the options are:")
                 for i, option in enumerate(options, 1):
-                    print(f"  {i}. {option}")
-                print("Which one best describes your situation?")
+                    self.log(f"  {i}. {option}")
+                self.log("Which one best describes your situation?")
             else:
-                print(f"Let me ask about {next_field} instead.")
+                self.log(f"Let me ask about {next_field} instead.")
         
         return {
             "status": "NEED_INPUT",
@@ -300,37 +505,47 @@ class ConversationManager:
         """
         Handle when user wants to skip a question
         """
-        print("\nSkipping this question and trying to proceed...")
+        response, traversal_result = self.skip_question()
+        if response is not None:
+            return response
+        return self.handle_need_more_info(traversal_result)
+    
+    def skip_question(self):
+        """
+        (response, None) when skipping settles the turn, or (None,
+        traversal_result) when the engine's own next question is needed
+        """
+        self.log("\nSkipping this question and trying to proceed...")
         
         # Try to make decision with current data
-        complete_data = self.extractor.get_complete_data()
-        traversal_result = traverse_decision_tree(complete_data)
+        traversal_result = self.traverse()
         
         if traversal_result["status"] == "DECISION_REACHED":
-            return self.handle_final_decision(traversal_result)
+            return self.handle_final_decision(traversal_result), None
         else:
             # Ask about next most important field
+            complete_data = self.extractor.get_complete_data()
             missing_fields = [f for f in get_critical_fields() if f not in complete_data]
             if missing_fields:
                 next_field = missing_fields[0]
                 self.current_field_needed = next_field
-                print(f"I'll ask about {next_field} instead, which is also important for your refund.")
+                self.log(f"I'll ask about {next_field} instead, which is also important for your refund.")
                 
                 return {
                     "status": "NEED_INPUT",
                     "question": f"Can you tell me about your {next_field}?",
                     "field_needed": next_field
-                }
+                }, None
             else:
-                print("Let me try to make a decision with what we have...")
-                return self.continue_conversation()
+                self.log("Let me try to make a decision with what we have...")
+                return None, traversal_result
     
     def handle_no_extraction(self, user_response):
         """
         Handle when no information could be extracted from user response
         """
-        print("I didn't catch any specific information from that response.")
-        print("Could you try being more specific?")
+        self.log("I didn't catch any specific information from that response.")
+        self.log("Could you try being more specific?")
         
         # Show options for current field
         if self.current_field_needed and self.current_field_needed in DECISION_NODES:
@@ -338,17 +553,17 @@ class ConversationManager:
             options = field_info.get('values', [])
             
             if options:
-                print(f"\nFor {self.current_field_needed}, I'm looking for one of these:")
+                self.log(f"\nFor {self.current_field_needed}, I'm looking for one of these:")
                 for option in options:
-                    print(f"  • {option}")
-                print("Which one matches your situation?")
+                    self.log(f"  • {option}")
+                self.log("Which one matches your situation?")
                 
                 # Also show common ways to say each option
                 if self.current_field_needed == "seller_type":
-                    print("\nOr you can say:")
-                    print("  • 'directly from you' or 'your website' for inhouse")
-                    print("  • 'marketplace seller' or 'third party' for thirdparty")
-                    print("  • 'not sure' for unknown")
+                    self.log("\nOr you can say:")
+                    self.log("  • 'directly from you' or 'your website' for inhouse")
+                    self.log("  • 'marketplace seller' or 'third party' for thirdparty")
+                    self.log("  • 'not sure' for unknown")
         
         return {
             "status": "NEED_INPUT",
@@ -361,18 +576,90 @@ class ConversationManager:
         Generate a contextual question using LLM
         """
         try:
-            # Get field description for context
-            field_info = DECISION_NODES.get(missing_field, {})
-            field_description = field_info.get('description', '')
-            field_options = field_info.get('values', [])
+            # Use extractor's LLM backend to generate question
+            request = self._smart_question_request(missing_field, context)
+            with metered_call("generate_smart_question", request) as metered:
+                response = self.extractor.backend.chat(request)
+                metered.usage = response.usage
+            return self._clean_question(response.content)
             
-            # Build context for LLM
-            situation = context.get("situation_summary", "Customer refund request")
-            available_info = context.get("available_info", {})
+        except Exception as e:
+            self.log(f"Warning: Could not generate smart question ({e}), using fallback")
+            return fallback_question
+    
+    async def generate_smart_question_async(self, missing_field, context, fallback_question, timeout=LLM_TIMEOUT):
+        """
+        generate_smart_question through the backend's async path; falls back
+        to the template question on timeout or once retries are exhausted
+        """
+        try:
+            request = self._smart_question_request(missing_field, context)
+            with metered_call("generate_smart_question", request) as metered:
+                response = await self.extractor.backend.chat_async(request, timeout)
+                metered.usage = response.usage
+            return self._clean_question(response.content)
             
-            # Create more specific prompts based on field type
-            if missing_field == "return_window":
-                prompt = f"""Generate a customer service question asking when they purchased the item.
+        except Exception as e:
+            self.log(f"Warning: Could not generate smart question ({e}), using fallback")
+            return fallback_question
+    
+    def generate_smart_question_streaming(self, missing_field, context, fallback_question, sink=None):
+        """
+        Stream the generated question into sink (self.question_sink by
+        default) as it arrives; delivers fallback_question instead if the
+        stream stalls for STREAM_STALL_TIMEOUT seconds or fails
+        """
+        request = self._smart_question_request(missing_field, context)
+        # Streams report no usage; tokens are estimated from the texts
+        with metered_call("generate_smart_question", request) as metered:
+            metered.completion_text = stream_question(
+                self.extractor.backend,
+                request,
+                fallback_question,
+                sink or self.question_sink,
+                STREAM_STALL_TIMEOUT,
+                missing_field
+            )
+        return metered.completion_text
+    
+    def _prefetch_question(self, missing_field, context, fallback_question):
+        """Background generation for the prefetcher: no printing, errors propagate"""
+        request = self._smart_question_request(missing_field, context)
+        with metered_call("prefetch_question", request) as metered:
+            response = self.extractor.backend.chat(request)
+            metered.usage = response.usage
+        return self._clean_question(response.content)
+    
+    def _smart_question_request(self, missing_field, context):
+        """Keyword arguments for chat.completions.create"""
+        return {
+            "model": "gpt-3.5-turbo",
+            "messages": [{"role": "user", "content": self._smart_question_prompt(missing_field, context)}],
+            "max_tokens": 100,
+            "temperature": 0.7
+        }
+    
+    def _clean_question(self, content):
+        generated_question = content.strip()
+        # Remove quotes if LLM added them
+        if generated_question.startswith('"') and generated_question.endswith('"'):
+            generated_question = generated_question[1:-1]
+        return generated_question
+    
+    def _smart_question_prompt(self, missing_field, context):
+        """Prompt tailored to the field being asked about"""
+        # Get field description for context
+        field_info = DECISION_NODES.get(missing_field, {})
+        field_description = field_info.get('description', '')
+        field_options = field_info.get('values', [])
+        
+        # Build context for LLM
+        situation = context.get("situation_summary", "Customer refund request")
+        available_info = context.get("available_info", {})
+        
+        # Create more specific prompts based on field type
+        if missing_field == "return_window":
+            prompt = f"""Generate a customer service question asking when they purchased the item.
 
 Context: {situation}
 What we know: {', '.join([f"{k}={v}" for k, v in available_info.items()])}
@@ -380,8 +667,8 @@ What we know: {', '.join([f"{k}={v}" for k, v in available_info.items()])}
 Make it conversational and explain why timing matters for the return policy.
 Keep it under 50 words."""
 
-            elif missing_field == "payment_method":
-                prompt = f"""Generate a customer service question asking how they paid.
+        elif missing_field == "payment_method":
+            prompt = f"""Generate a customer service question asking how they paid.
 
 Context: {situation}
 What we know: {', '.join([f"{k}={v}" for k, v in available_info.items()])}
@@ -389,16 +676,16 @@ Options: {', '.join(field_options)}
 
 Explain that payment method affects refund options. Keep it under 50 words."""
 
-            elif missing_field == "seller_type":
-                prompt = f"""Generate a customer service question asking if they bought from us directly or a marketplace seller.
+        elif missing_field == "seller_type":
+            prompt = f"""Generate a customer service question asking if they bought from us directly or a marketplace seller.
 
 Context: {situation}
 What we know: {', '.join([f"{k}={v}" for k, v in available_info.items()])}
 
 Explain that this affects which policy applies. Keep it under 50 words."""
 
-            else:
-                prompt = f"""Generate a natural customer service question to ask about: {missing_field}
+        else:
+            prompt = f"""Generate a natural customer service question to ask about: {missing_field}
 
 Context: {situation}
 What we know: {', '.join([f"{k}={v}" for k, v in available_info.items()])}
@@ -408,24 +695,7 @@ Possible values: {', '.join(field_options)}
 Make it conversational, helpful, and explain why you need this information.
 Keep it under 50 words."""
 
-            # Use extractor's LLM to generate question
-            response = self.extractor.client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=100,
-                temperature=0.7
-            )
-            
-            generated_question = response.choices[0].message.content.strip()
-            # Remove quotes if LLM added them
-            if generated_question.startswith('"') and generated_question.endswith('"'):
-                generated_question = generated_question[1:-1]
-            
-            return generated_question
-            
-        except Exception as e:
-            print(f"Warning: Could not generate smart question ({e}), using fallback")
-            return fallback_question
+        return prompt
     
     def get_confidence_level(self, confidence):
         """Convert numeric confidence to readable level"""
@@ -440,7 +710,7 @@ Keep it under 50 words."""
     
     def get_conversation_summary(self):
         """Get summary of current conversation state"""
-        complete_data = self.extractor.get_complete_data()
+        complete_data = self.extractor.facts.explain()
         return {
             "total_fields": len(complete_data),
             "completion_percentage": self.extractor.get_completion_percentage(),
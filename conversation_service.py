@@ -0,0 +1,823 @@
+# Many concurrent refund conversations in one asyncio event loop, over HTTP and WebSocket
+import asyncio
+import base64
+import contextlib
+import hashlib
+import json
+import os
+import random
+import secrets
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import traceback
+from collections import OrderedDict, Counter
+from http import HTTPStatus
+
+from conversation_manager import ConversationManager, quiet_log
+from decision_nodes import DECISION_NODES
+from llm_backends import create_backend, set_llm_backend
+from llm_metering import LLM_METER, Histogram, DURATION_BUCKETS
+from rule_loader import get_rule_registry
+from session_store import create_session_store, snapshot, restore
+from config import (
+    SERVICE_HOST, SERVICE_PORT, SERVICE_MAX_SESSIONS, SERVICE_IDLE_TIMEOUT, SERVICE_MAX_BODY, DECISION_METRICS,
+    SESSION_STORE, SESSION_STORE_PATH
+)
+import decision_metrics
+
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+class ServiceError(Exception):
+    """A request the service turns down, with the HTTP status to answer with"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+class Session:
+    """
+    One customer's conversation. Turns of the same session run one at a
+    time under self.lock; different sessions interleave freely. account
+    holds fields layered over the account file's (never decision fields
+    for a new session; see _account).
+    """
+
+    def __init__(self, session_id, account_file, account=None, conversation=None):
+        self.session_id = session_id
+        self.account_file = account_file
+        self.account = account
+        self.lock = asyncio.Lock()
+        self.last_used = time.monotonic()
+        self.turns = conversation.meter.turn if conversation is not None else 0
+        self.conversation = conversation or self._new_conversation()
+        self.snapshot = None  # bytes last saved to or loaded from the session store
+
+    def _new_conversation(self):
+        conversation = ConversationManager(self.account_file, log=quiet_log)
+        if self.account:
+            conversation.extractor.account_data = {**conversation.extractor.account_data, **self.account}
+        return conversation
+
+    async def turn(self, message, question_sink=None):
+        """
+        A customer message: opens the conversation or answers the last
+        question, like main.py's loop. Caller holds self.lock.
+        """
+        conversation = self.conversation
+        if conversation.current_state == "COMPLETE":
+            raise ServiceError(409, "conversation is complete; reset it to start a new request")
+        if conversation.current_state == "INITIAL":
+            result = await conversation.start_conversation_async(message, question_sink)
+            conversation.current_state = "IN_PROGRESS"
+        else:
+            result = await conversation.process_user_response_async(message, question_sink)
+        if result["status"] == "COMPLETE":
+            conversation.current_state = "COMPLETE"
+        self.turns += 1
+        return result
+
+    def reset(self):
+        """Start over with a fresh conversation under the same id and account"""
+        self.close()
+        self.conversation = self._new_conversation()
+        self.turns = 0
+
+    def close(self):
+        if self.conversation.prefetcher is not None:
+            self.conversation.prefetcher.cancel()
+
+    def status(self):
+        conversation = self.conversation
+        summary = conversation.get_conversation_summary()
+        return {
+            "session_id": self.session_id,
+            "state": conversation.current_state,
+            "turns": self.turns,
+            "field_needed": conversation.current_field_needed,
+            "fields_collected": summary["total_fields"],
+            "completion_percentage": summary["completion_percentage"],
+            "data": {
+                field: {"value": info["value"], "confidence": info.get("confidence"), "source": info.get("source")}
+                for field, info in summary["available_data"].items()
+            },
+            "rules_version": conversation.rule_set.version,
+            "llm_usage": conversation.meter.summary()["totals"]
+        }
+
+class SessionRegistry:
+    """
+    Live sessions by id, least recently used first. Sessions idle for
+    idle_timeout are dropped; when max_sessions are live, creating one
+    drops the least recently used session that is not mid-turn.
+
+    With a store, every turn's result is saved as a snapshot, and a
+    session is loaded from the store when this worker does not hold it
+    or holds an older copy than the store (another worker took a turn),
+    so any worker sharing the store can serve any turn, and a session
+    dropped for room is only gone from memory. Store calls run on worker
+    threads, so a slow disk or a busy SQLite file holds up only the
+    requests that touch it; a store that fails answers 503.
+    """
+
+    def __init__(self, account_file="account_data.json", max_sessions=SERVICE_MAX_SESSIONS,
+                 idle_timeout=SERVICE_IDLE_TIMEOUT, store=None):
+        self.account_file = account_file
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.store = store
+        self.sessions = OrderedDict()
+        self.deletes = set()  # store deletions still running
+        self.store_errors = 0
+        self.stats = {"created": 0, "loaded": 0, "saved": 0, "expired": 0, "evicted": 0, "closed": 0}
+
+    def create(self, account=None):
+        session = Session(secrets.token_urlsafe(12), self.account_file, account)
+        self._admit(session)
+        self.stats["created"] += 1
+        return session
+
+    async def get(self, session_id):
+        session = self.sessions.get(session_id)
+        if self.store is not None and (session is None or not session.lock.locked()):
+            session = await self._load(session_id)
+        if session is None:
+            raise ServiceError(404, f"no conversation {session_id!r} (finished, expired or never started)")
+        session.last_used = time.monotonic()
+        self.sessions.move_to_end(session_id)
+        return session
+
+    async def save(self, session):
+        """Snapshot the session to the store, if there is one"""
+        if self.store is not None:
+            session.snapshot = snapshot(session.conversation)
+            await self._store_call(self.store.put, session.session_id, session.snapshot)
+            self.stats["saved"] += 1
+
+    async def close(self, session_id):
+        deleting = self._drop(await self.get(session_id), "closed")
+        if deleting is not None:
+            await deleting
+
+    def expire(self):
+        """Drop sessions idle longer than idle_timeout"""
+        cutoff = time.monotonic() - self.idle_timeout
+        for session in list(self.sessions.values()):
+            if session.last_used > cutoff:
+                break
+            if not session.lock.locked():
+                self._drop(session, "expired")
+
+    async def _load(self, session_id):
+        """The stored session, unless the one held is already that version or mid-turn"""
+        try:
+            data = await self._store_call(self.store.get, session_id)
+        except ValueError:
+            data = None  # an id the store can't hold
+        held = self.sessions.get(session_id)  # again: other requests ran while the store was read
+        if data is None or (held is not None and (held.lock.locked() or data == held.snapshot)):
+            return held
+        try:
+            conversation = restore(data, self.account_file, log=quiet_log)
+        except ValueError:
+            return held  # corrupt snapshot
+        if held is not None:
+            del self.sessions[session_id]
+            held.close()
+        session = Session(session_id, self.account_file, conversation.extractor.account_data, conversation)
+        session.snapshot = data
+        self._admit(session)
+        self.stats["loaded"] += 1
+        return session
+
+    def _admit(self, session):
+        self.expire()
+        if len(self.sessions) >= self.max_sessions:
+            for held in self.sessions.values():
+                if not held.lock.locked():
+                    self._drop(held, "evicted")
+                    break
+            else:
+                raise ServiceError(503, "too many conversations in progress")
+        self.sessions[session.session_id] = session
+
+    def _drop(self, session, reason):
+        """Forget a session; returns the task deleting it from the store, if any"""
+        del self.sessions[session.session_id]
+        session.close()
+        self.stats[reason] += 1
+        # Evicted sessions live on in the store; ended or abandoned ones go
+        if self.store is not None and reason != "evicted":
+            task = asyncio.get_running_loop().create_task(self._store_call(self.store.delete, session.session_id))
+            self.deletes.add(task)
+            task.add_done_callback(self._deleted)
+            return task
+        return None
+
+    def _deleted(self, task):
+        self.deletes.discard(task)
+        if not task.cancelled():
+            task.exception()  # already counted in store_errors; nobody else may look
+
+    async def _store_call(self, method, *args):
+        """A store get/put/delete on a worker thread, off the event loop"""
+        try:
+            return await asyncio.to_thread(method, *args)
+        except (sqlite3.Error, OSError) as e:
+            self.store_errors += 1
+            raise ServiceError(503, f"session store unavailable: {e}")
+
+class WebSocket:
+    """Server side of RFC 6455 over asyncio streams: text messages, ping/pong and close"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self.closed = False
+
+    async def receive(self):
+        """Next text message, or None once the connection is closing"""
+        fragments = []
+        while True:
+            header = await self.reader.readexactly(2)
+            fin = header[0] & 0x80
+            opcode = header[0] & 0x0F
+            length = header[1] & 0x7F
+            if length == 126:
+                length = int.from_bytes(await self.reader.readexactly(2), "big")
+            elif length == 127:
+                length = int.from_bytes(await self.reader.readexactly(8), "big")
+            if not header[1] & 0x80:
+                self.close(1002)  # clients must mask
+                return None
+            if length + sum(len(fragment) for fragment in fragments) > SERVICE_MAX_BODY:
+                self.close(1009)
+                return None
+            mask = await self.reader.readexactly(4)
+            payload = _unmask(await self.reader.readexactly(length), mask)
+
+            if opcode == 0x8:
+                self.close()
+                return None
+            if opcode == 0x9:
+                self.send_frame(0xA, payload)
+                continue
+            if opcode == 0xA:
+                continue
+            if opcode == 0x2:
+                self.close(1003)  # text only
+                return None
+            fragments.append(payload)
+            if fin:
+                try:
+                    return b"".join(fragments).decode("utf-8")
+                except UnicodeDecodeError:
+                    self.close(1007)
+                    return None
+
+    def send_frame(self, opcode, payload):
+        if self.writer.is_closing():
+            return
+        length = len(payload)
+        if length < 126:
+            header = bytes([0x80 | opcode, length])
+        elif length < 1 << 16:
+            header = bytes([0x80 | opcode, 126]) + length.to_bytes(2, "big")
+        else:
+            header = bytes([0x80 | opcode, 127]) + length.to_bytes(8, "big")
+        self.writer.write(header + payload)
+
+    def send_json(self, message):
+        self.send_frame(0x1, json.dumps(message, default=str).encode("utf-8"))
+
+    def close(self, code=1000):
+        if not self.closed:
+            self.closed = True
+            self.send_frame(0x8, code.to_bytes(2, "big"))
+
+    def question_sink(self):
+        """Sink streaming a turn's question as delta messages; safe to call from worker threads"""
+        def sink(text):
+            message = {"type": "delta", "text": text}
+            if threading.get_ident() == self.loop_thread:
+                self.send_json(message)
+            else:
+                self.loop.call_soon_threadsafe(self.send_json, message)
+        return sink
+
+def _unmask(payload, mask):
+    length = len(payload)
+    key = int.from_bytes((mask * (length // 4 + 1))[:length], "little")
+    return (int.from_bytes(payload, "little") ^ key).to_bytes(length, "little")
+
+class ConversationService:
+    """
+    JSON over HTTP/1.1 (keep-alive) and a WebSocket channel, serving
+    every session from one event loop:
+
+      POST   /sessions               {"message", "account"?} -> first turn and the new session_id
+                                       ("account" adds non-decision fields to the server's)
+      POST   /sessions/{id}/respond  {"message"}             -> next turn
+      GET    /sessions/{id}                                  -> status
+      POST   /sessions/{id}/reset                            -> fresh conversation, same id
+      DELETE /sessions/{id}
+      GET    /metrics                                        -> Prometheus text
+      GET    /ws or /sessions/{id}/ws                        -> WebSocket upgrade
+
+    WebSocket messages are JSON. {"type": "message", "text"} runs a turn
+    (starting a session on /ws if needed), streaming the question as
+    {"type": "delta", "text"} messages before {"type": "result", ...};
+    {"type": "status"} and {"type": "reset"} mirror the HTTP calls.
+    """
+
+    def __init__(self, registry=None, host=SERVICE_HOST, port=SERVICE_PORT):
+        self.registry = registry or SessionRegistry()
+        self.host = host
+        self.port = port
+        self.server = None
+        self.sweeper = None
+        self.connections = {}  # handler task -> writer
+        self.turn_durations = Histogram(DURATION_BUCKETS)
+        self.stats = {"turns": 0, "turn_errors": 0, "http_requests": 0, "websockets": 0}
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.sweeper = asyncio.create_task(self._sweep())
+        return self
+
+    async def serve_forever(self):
+        await self.server.serve_forever()
+
+    async def close(self):
+        """Stop accepting, hang up on open connections (turns in flight finish first) and drop every session"""
+        self.sweeper.cancel()
+        self.server.close()
+        for writer in self.connections.values():
+            writer.close()
+        await asyncio.gather(*self.connections, return_exceptions=True)
+        await asyncio.gather(*self.registry.deletes, return_exceptions=True)
+        await self.server.wait_closed()
+        for session in list(self.registry.sessions.values()):
+            session.close()
+
+    async def _sweep(self):
+        while True:
+            await asyncio.sleep(min(60.0, self.registry.idle_timeout / 4))
+            self.registry.expire()
+
+    async def handle_connection(self, reader, writer):
+        task = asyncio.current_task()
+        self.connections[task] = writer
+        try:
+            while True:
+                try:
+                    request = await self.read_request(reader)
+                except ServiceError as e:
+                    self.write_response(writer, e.status, {"error": str(e)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                self.stats["http_requests"] += 1
+
+                parts = request["path"].strip("/").split("/")
+                if request["headers"].get("upgrade", "").lower() == "websocket" and parts[-1] == "ws":
+                    await self.websocket(reader, writer, request, parts)
+                    break
+
+                keep_alive = request["keep_alive"]
+                try:
+                    status, payload = await self.route(request["method"], parts, request["body"])
+                except ServiceError as e:
+                    status, payload = e.status, {"error": str(e)}
+                except Exception as e:
+                    status, payload = 500, {"error": _internal_error(e)}
+                self.write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass  # client went away
+        except Exception as e:
+            # A bug in request handling: answer if the connection still can, never kill the server
+            with contextlib.suppress(Exception):
+                self.write_response(writer, 500, {"error": _internal_error(e)}, keep_alive=False)
+                await writer.drain()
+        finally:
+            del self.connections[task]
+            writer.close()
+            with contextlib.suppress(Exception):
+                await writer.wait_closed()
+
+    async def read_request(self, reader):
+        """Method, path, lower-cased headers and body of the next request; None at end of stream"""
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            raise ServiceError(431, "request headers too large")
+
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            raise ServiceError(400, "malformed request line")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get("content-length", "0") or 0)
+        if length > SERVICE_MAX_BODY:
+            raise ServiceError(413, f"request body over {SERVICE_MAX_BODY} bytes")
+        body = await reader.readexactly(length) if length else b""
+
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+        return {"method": method, "path": target.split("?", 1)[0], "headers": headers, "body": body,
+                "keep_alive": keep_alive}
+
+    def write_response(self, writer, status, payload, keep_alive=True):
+        """A str payload goes out as plain text (the Prometheus format), anything else as JSON"""
+        if isinstance(payload, str):
+            body = payload.encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = (json.dumps(payload, default=str) + "\n").encode("utf-8")
+            content_type = "application/json"
+        head = (f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+
+    async def route(self, method, parts, body):
+        """(status, payload) for an HTTP request; a str payload is sent as text"""
+        if parts == ["metrics"] and method == "GET":
+            return 200, self.prometheus_text()
+
+        if parts[0] != "sessions" or len(parts) > 3:
+            raise ServiceError(404, "unknown path")
+        if len(parts) == 1:
+            if method != "POST":
+                raise ServiceError(405, "use POST to start a conversation")
+            data = _json_body(body)
+            session = self.registry.create(_account(data))
+            result = await self.run_turn(session, _message(data))
+            return 201, {"session_id": session.session_id, **result}
+
+        session = await self.registry.get(parts[1])
+        action = parts[2] if len(parts) == 3 else None
+        if action is None and method == "GET":
+            return 200, session.status()
+        if action is None and method == "DELETE":
+            await self.registry.close(session.session_id)
+            return 200, {"session_id": session.session_id, "closed": True}
+        if action == "respond" and method == "POST":
+            result = await self.run_turn(session, _message(_json_body(body)))
+            return 200, {"session_id": session.session_id, **result}
+        if action == "reset" and method == "POST":
+            async with session.lock:
+                session.reset()
+                await self.registry.save(session)
+            return 200, session.status()
+        raise ServiceError(405 if action in (None, "respond", "reset") else 404, "unsupported request")
+
+    async def run_turn(self, session, message, question_sink=None):
+        started = time.perf_counter()
+        async with session.lock:
+            try:
+                result = await session.turn(message, question_sink)
+                await self.registry.save(session)
+                return result
+            except ServiceError:
+                raise
+            except Exception as e:
+                self.stats["turn_errors"] += 1
+                raise ServiceError(500, f"{type(e).__name__}: {e}")
+            finally:
+                self.stats["turns"] += 1
+                self.turn_durations.observe(time.perf_counter() - started)
+
+    async def websocket(self, reader, writer, request, parts):
+        session = None
+        try:
+            if parts[0] == "sessions" and len(parts) == 3:
+                session = await self.registry.get(parts[1])
+            elif parts != ["ws"]:
+                raise ServiceError(404, "unknown path")
+            key = request["headers"].get("sec-websocket-key")
+            if not key:
+                raise ServiceError(400, "missing Sec-WebSocket-Key")
+        except ServiceError as e:
+            self.write_response(writer, e.status, {"error": str(e)}, keep_alive=False)
+            return
+
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode("ascii")).digest()).decode("ascii")
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\n"
+                      "Upgrade: websocket\r\n"
+                      "Connection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode("latin-1"))
+        self.stats["websockets"] += 1
+        channel = WebSocket(reader, writer)
+
+        while True:
+            text = await channel.receive()
+            if text is None:
+                break
+            try:
+                data = json.loads(text)
+                if not isinstance(data, dict):
+                    raise ServiceError(400, "messages must be JSON objects")
+                kind = data.get("type")
+                if session is not None:
+                    session = await self.registry.get(session.session_id)
+                if kind == "message":
+                    if session is None:
+                        session = self.registry.create(_account(data))
+                        channel.send_json({"type": "session", "session_id": session.session_id})
+                    result = await self.run_turn(session, _message(data, "text"), channel.question_sink())
+                    channel.send_json({"type": "result", "session_id": session.session_id, **result})
+                elif kind in ("status", "reset"):
+                    if session is None:
+                        raise ServiceError(409, "no conversation yet; send a message first")
+                    if kind == "reset":
+                        async with session.lock:
+                            session.reset()
+                            await self.registry.save(session)
+                    channel.send_json({"type": kind, **session.status()})
+                else:
+                    raise ServiceError(400, f"unknown message type {kind!r}")
+            except json.JSONDecodeError:
+                channel.send_json({"type": "error", "status": 400, "error": "messages must be JSON"})
+            except ServiceError as e:
+                channel.send_json({"type": "error", "status": e.status, "error": str(e)})
+            except Exception as e:
+                channel.send_json({"type": "error", "status": 500, "error": _internal_error(e)})
+            await writer.drain()
+        channel.close()
+        await writer.drain()
+
+    def prometheus_text(self):
+        """Service counters and turn latency, followed by LLM usage"""
+        lines = [
+            "# HELP service_sessions_active Conversations held in memory",
+            "# TYPE service_sessions_active gauge",
+            f"service_sessions_active {len(self.registry.sessions)}",
+            "# HELP service_sessions_total Conversations by how they ended (or started)",
+            "# TYPE service_sessions_total counter"
+        ]
+        for event, count in sorted(self.registry.stats.items()):
+            lines.append(f'service_sessions_total{{event="{event}"}} {count}')
+        lines += [
+            "# HELP service_store_errors_total Session store calls that failed (answered 503)",
+            "# TYPE service_store_errors_total counter",
+            f"service_store_errors_total {self.registry.store_errors}",
+            "# HELP service_turn_errors_total Turns that failed with an internal error",
+            "# TYPE service_turn_errors_total counter",
+            f"service_turn_errors_total {self.stats['turn_errors']}",
+            "# HELP service_turn_duration_seconds Wall time per customer turn, LLM calls included",
+            "# TYPE service_turn_duration_seconds histogram"
+        ]
+        lines += self.turn_durations.prometheus_lines("service_turn_duration_seconds", "")
+        return "\n".join(lines) + "\n" + LLM_METER.prometheus_text()
+
+def _json_body(body):
+    try:
+        data = json.loads(body or b"{}")
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        raise ServiceError(400, "body must be JSON")
+    if not isinstance(data, dict):
+        raise ServiceError(400, "body must be a JSON object")
+    return data
+
+def _account(data):
+    """
+    Client-supplied account fields for a new session. Fields a rule or
+    decision node reads (account_status, fraud_flag, ...) only ever come
+    from the server's account data, so a request naming one is refused.
+    """
+    account = data.get("account")
+    if account is None:
+        return None
+    if not isinstance(account, dict):
+        raise ServiceError(400, "'account' must be a JSON object")
+    decision_fields = set(DECISION_NODES)
+    for rule in get_rule_registry().current().index.rules:
+        decision_fields.update(rule["conditions"])
+    refused = sorted(field for field in account if field in decision_fields)
+    if refused:
+        raise ServiceError(400, f"account fields {', '.join(refused)} are set by the server, not the client")
+    return account
+
+def _internal_error(error):
+    """Log an unexpected exception and word it for the client"""
+    traceback.print_exception(type(error), error, error.__traceback__, file=sys.stderr)
+    return f"internal error: {type(error).__name__}"
+
+def _message(data, key="message"):
+    message = data.get(key)
+    if not isinstance(message, str) or not message.strip():
+        raise ServiceError(400, f"{key!r} must be a non-empty string")
+    return message.strip()
+
+def serve(host=SERVICE_HOST, port=SERVICE_PORT, account_file="account_data.json", store=None):
+    """Run the service until interrupted; sessions log to quiet_log, the address goes to stderr"""
+    if DECISION_METRICS:
+        decision_metrics.enable()
+    get_rule_registry().start_watching()
+
+    async def run():
+        service = await ConversationService(SessionRegistry(account_file, store=store), host, port).start()
+        print(f"Conversation service on http://{host}:{service.port}", file=sys.stderr, flush=True)
+        try:
+            await service.serve_forever()
+        finally:
+            await service.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+# Opening requests for the benchmark's scripted customers
+BENCH_REQUESTS = [
+    "I want to return my headphones, they arrived broken",
+    "Can I get a refund for the shoes I bought last week? They don't fit",
+    "My laptop stopped working after two days and I'd like my money back",
+    "I ordered a jacket from a marketplace seller and it never came",
+    "The blender I got is defective, I paid with PayPal",
+]
+
+class _BenchClient:
+    """Keep-alive JSON client over one connection"""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    @classmethod
+    async def connect(cls, port):
+        return cls(*await asyncio.open_connection("127.0.0.1", port))
+
+    async def request(self, method, path, payload=None):
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        self.writer.write((f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                           f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+                           ).encode("latin-1") + body)
+        head = (await self.reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+        status = int(head.split(" ", 2)[1])
+        length = 0
+        for line in head.split("\r\n")[1:]:
+            if line.lower().startswith("content-length:"):
+                length = int(line.split(":", 1)[1])
+        return status, json.loads(await self.reader.readexactly(length))
+
+    async def close(self):
+        self.writer.close()
+        with contextlib.suppress(Exception):
+            await self.writer.wait_closed()
+
+def _bench_answer(rng, field):
+    """A scripted reply to a question about `field`: one of its values, sometimes in a sentence"""
+    values = DECISION_NODES.get(field, {}).get("values") or ["not sure"]
+    value = rng.choice(values)
+    return value if rng.random() < 0.5 else f"I think it was {value}"
+
+async def _drive(port, sessions, concurrency, max_turns, seed):
+    """Scripted customers over HTTP; returns (turn latencies, session outcomes, wall seconds)"""
+    latencies = []
+    outcomes = Counter()
+    remaining = iter(range(sessions))
+
+    async def customer(worker):
+        rng = random.Random(seed * 1000 + worker)
+        client = await _BenchClient.connect(port)
+        try:
+            for _ in remaining:
+                started = time.perf_counter()
+                status, result = await client.request("POST", "/sessions", {"message": rng.choice(BENCH_REQUESTS)})
+                latencies.append(time.perf_counter() - started)
+                if status != 201:
+                    outcomes["ERROR"] += 1
+                    continue
+                session_id = result["session_id"]
+                turns = 0
+                while result["status"] == "NEED_INPUT" and turns < max_turns:
+                    started = time.perf_counter()
+                    status, result = await client.request(
+                        "POST", f"/sessions/{session_id}/respond",
+                        {"message": _bench_answer(rng, result.get("field_needed"))}
+                    )
+                    latencies.append(time.perf_counter() - started)
+                    turns += 1
+                    if status != 200:
+                        result = {"status": "ERROR"}
+                outcomes[result["status"]] += 1
+                await client.request("DELETE", f"/sessions/{session_id}")
+        finally:
+            await client.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(customer(worker) for worker in range(concurrency)))
+    return latencies, outcomes, time.perf_counter() - started
+
+def benchmark(sessions=2000, concurrency=200, latency=0.2, max_turns=8, seed=1):
+    """
+    Start the service in a child process on the stub backend (each LLM
+    call takes `latency` seconds; extraction caches off so every turn
+    reaches the backend) and drive `concurrency` scripted customers
+    through `sessions` conversations with no think time. One event loop
+    is one core, so sessions per core is the concurrency held divided by
+    the share of a core the server used.
+    """
+    import resource
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    env = dict(os.environ, LLM_BACKEND="stub", STUB_LATENCY=str(latency), STUB_TOKEN_DELAY="0",
+               EXTRACTION_CACHE="false", SIMILARITY_CACHE="false")
+    server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "serve", "--port", str(port)],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        for _ in range(100):
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                break
+            except OSError:
+                time.sleep(0.1)
+        cpu_before = _cpu_seconds(server.pid)
+        latencies, outcomes, wall = asyncio.run(_drive(port, sessions, concurrency, max_turns, seed))
+        cpu = _cpu_seconds(server.pid) - cpu_before
+    finally:
+        server.terminate()
+        server.wait()
+    if cpu < 0:  # no /proc: fall back to the child's whole lifetime
+        cpu = resource.getrusage(resource.RUSAGE_CHILDREN).ru_utime + \
+              resource.getrusage(resource.RUSAGE_CHILDREN).ru_stime
+
+    ordered = sorted(latencies)
+    p50 = ordered[len(ordered) // 2]
+    p99 = ordered[min(int(len(ordered) * 0.99), len(ordered) - 1)]
+    core_share = cpu / wall if wall else 0.0
+    print(f"Conversation service benchmark: {sessions} sessions, {concurrency} concurrent, "
+          f"stub LLM latency {latency * 1000:.0f}ms")
+    print(f"  {len(latencies)} turns in {wall:.1f}s: {len(latencies) / wall:.0f} turns/s, "
+          f"{sessions / wall:.1f} sessions/s ({dict(outcomes)})")
+    print(f"  turn latency: p50 {p50 * 1000:.0f}ms, p99 {p99 * 1000:.0f}ms, max {ordered[-1] * 1000:.0f}ms")
+    print(f"  server CPU: {cpu:.1f}s ({core_share * 100:.0f}% of one core), "
+          f"{len(latencies) / cpu if cpu else 0:.0f} turns per CPU-second")
+    if core_share:
+        print(f"  ~{concurrency / core_share:.0f} concurrent sessions per core at this LLM latency")
+    return {"turns": len(latencies), "wall": wall, "p50": p50, "p99": p99, "cpu": cpu, "outcomes": dict(outcomes)}
+
+def _cpu_seconds(pid):
+    """User + system CPU seconds of a running process from /proc; -1 where unavailable"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+    except (OSError, IndexError, ValueError):
+        return -1.0
+
+def _option(argv, name, default):
+    if name in argv:
+        return argv[argv.index(name) + 1]
+    return default
+
+def main(argv=None):
+    """python conversation_service.py serve [--host H] [--port N] [--account FILE] [--backend NAME]
+        [--store memory|sqlite|files] [--store-path PATH]
+    python conversation_service.py bench [--sessions N] [--concurrency N] [--latency S] [--turns N]"""
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else None
+    if command == "serve":
+        backend = _option(argv, "--backend", None)
+        if backend is not None:
+            set_llm_backend(create_backend(backend))
+        store = create_session_store(_option(argv, "--store", SESSION_STORE),
+                                     _option(argv, "--store-path", SESSION_STORE_PATH))
+        serve(_option(argv, "--host", SERVICE_HOST), int(_option(argv, "--port", SERVICE_PORT)),
+              _option(argv, "--account", "account_data.json"), store)
+        return 0
+    if command == "bench":
+        benchmark(
+            sessions=int(_option(argv, "--sessions", 2000)),
+            concurrency=int(_option(argv, "--concurrency", 200)),
+            latency=float(_option(argv, "--latency", 0.2)),
+            max_turns=int(_option(argv, "--turns", 8))
+        )
+        return 0
+    print(main.__doc__)
+    return 2
+
+if __name__ == "__main__":
+    sys.exit(main())
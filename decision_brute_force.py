@@ -1,4 +1,9 @@
 # Rule-Based Decision Table Implementation
+import time
+
+import decision_metrics
+from decision_index import RuleIndex
+from fact_store import Fact
 
 DECISION_RULES = [
     # CRITICAL DENIAL RULES (Priority 1-10) - Check these first
@@ -268,26 +273,80 @@ FIELD_PRIORITY_ORDER = [
     "delivery_status"     # For specific cases
 ]
 
-def make_refund_decision(data):
+# Compiled once at import; make_refund_decision looks rules up through it
+RULE_INDEX = RuleIndex(DECISION_RULES)
+
+def make_refund_decision(data, agenda=None, rule_index=None):
     """
     Rule-based decision making - replaces all if/else logic
     """
+    metrics = decision_metrics.active
+    if metrics is None:
+        return _make_refund_decision(data, agenda, rule_index)
+    return _recorded_decision(metrics, data, agenda, rule_index)
+
+def _recorded_decision(metrics, data, agenda, rule_index, count_need_info=True):
+    """_make_refund_decision, timed and recorded in metrics"""
+    start = time.perf_counter()
+    result = _make_refund_decision(data, agenda, rule_index)
+    elapsed = time.perf_counter() - start
+    rules = agenda.rules if agenda is not None else (rule_index or RULE_INDEX).rules
+    metrics.record_decision(data, result, rules, elapsed, count_need_info)
+    return result
+
+def _make_refund_decision(data, agenda, rule_index):
+    """Uninstrumented body of make_refund_decision"""
+    # First matching rule by priority, via a conversation's incrementally
+    # maintained agenda or a compiled index (built-in rules by default).
+    # The agenda goes first even when the index has an outcome table: a
+    # conversation syncs it every turn anyway (is_forced reads it), and
+    # first_satisfied is then cheaper than a table lookup.
+    if agenda is not None:
+        rule = agenda.first_satisfied()
+    else:
+        rule_index = rule_index or RULE_INDEX
+        if rule_index.outcome_table is not None:
+            return rule_index.outcome_table.make_refund_decision(data)
+        rule = rule_index.match(data)
+    if rule is not None:
+        return build_rule_result(rule, data)
+    
+    # No rules matched - we need more information
+    return build_need_info_result(data)
+
+def make_refund_decision_brute_force(data):
+    """
+    Reference implementation: sort the rules and scan them on every call.
+    Kept for equivalence checks and benchmarks against RULE_INDEX.
+    """
     # Sort rules by priority (lower number = higher priority)
     sorted_rules = sorted(DECISION_RULES, key=lambda x: x["priority"])
     
     # Try each rule in priority order
     for rule in sorted_rules:
         if matches_rule(data, rule["conditions"]):
-            return {
-                "decision": rule["decision"],
-                "reason": rule["reason"],
-                "confidence": rule["confidence"],
-                "path": build_path_from_rule(rule, data),
-                "rule_id": rule["id"]
-            }
+            return build_rule_result(rule, data)
     
-    # No rules matched - we need more information
-    missing_field = find_next_needed_field(data)
+    return build_need_info_result(data)
+
+def build_rule_result(rule, data):
+    """
+    Build the decision result for a matched rule
+    """
+    return {
+        "decision": rule["decision"],
+        "reason": rule["reason"],
+        "confidence": rule["confidence"],
+        "path": build_path_from_rule(rule, data),
+        "rule_id": rule["id"]
+    }
+
+def build_need_info_result(data, missing_field=None):
+    """
+    Build the NEED_INFO result asking for the next missing field
+    """
+    if missing_field is None:
+        missing_field = find_next_needed_field(data)
     field_info = get_field_question_info(missing_field)
     
     return {
@@ -324,7 +383,7 @@ def get_field_value(data, field):
     Extract value from field data (handles both formats)
     """
     field_data = data[field]
-    if isinstance(field_data, dict) and "value" in field_data:
+    if isinstance(field_data, (dict, Fact)) and "value" in field_data:
         return field_data["value"]
     else:
         return field_data
@@ -426,12 +485,43 @@ def get_critical_fields():
         "seller_type"
     ]
 
-def traverse_decision_tree(data):
+def traverse_decision_tree(data, planner=None, agenda=None, rule_index=None):
     """
     Navigate the decision tree as far as possible with available data
     Returns detailed traversal information
     """
-    result = make_refund_decision(data)
+    metrics = decision_metrics.active
+    if metrics is None:
+        return _traverse_decision_tree(data, planner, agenda, rule_index)
+    
+    # NEED_INFO is counted here, under the field actually asked once the
+    # planner has had its say, rather than make_refund_decision's pick
+    def decide(data, agenda, rule_index):
+        return _recorded_decision(metrics, data, agenda, rule_index, count_need_info=False)
+
+    start = time.perf_counter()
+    traversal = _traverse_decision_tree(data, planner, agenda, rule_index, decide)
+    metrics.record_latency("traverse_decision_tree", time.perf_counter() - start)
+    if traversal["status"] == "NEED_MORE_INFO":
+        metrics.record_need_info(traversal["stopping_field"])
+    return traversal
+
+def speculative_traversal(data, planner=None, rule_index=None):
+    """
+    traverse_decision_tree for hypothetical data no customer gave (question
+    prefetching): nothing is recorded in decision_metrics
+    """
+    return _traverse_decision_tree(data, planner, None, rule_index, _make_refund_decision)
+
+def _traverse_decision_tree(data, planner, agenda, rule_index, decide=make_refund_decision):
+    """Uninstrumented body of traverse_decision_tree"""
+    result = decide(data, agenda, rule_index)
+    
+    # Let the planner pick a question that can still change the outcome
+    if result["decision"] == "NEED_INFO" and planner is not None:
+        planned_field = planner.next_field(data)
+        if planned_field is not None:
+            result = build_need_info_result(data, planned_field)
     
     if result["decision"] == "NEED_INFO":
         return {
@@ -448,7 +538,9 @@ def traverse_decision_tree(data):
             "final_decision": result["decision"],
             "reason": result["reason"],
             "path": result["path"],
-            "confidence": result.get("confidence", 1.0)
+            "confidence": result.get("confidence", 1.0),
+            # No higher-priority rule is still waiting on a missing field
+            "forced": agenda.is_forced() if agenda is not None else None
         }
 
 def build_question_context(data, missing_field):
@@ -463,7 +555,7 @@ def build_question_context(data, missing_field):
     
     # Extract available information
     for field, info in data.items():
-        if isinstance(info, dict) and "value" in info:
+        if isinstance(info, (dict, Fact)) and "value" in info:
             context["available_info"][field] = info["value"]
     
     # Build customer profile
@@ -0,0 +1,75 @@
+# Compiled rule index for first-match lookup over DECISION_RULES
+from fact_store import Fact
+
+class RuleIndex:
+    """
+    Per-field value-to-rule bitmask index, built once from a rule list.
+    Bit i stands for the i-th rule in priority order, so after intersecting
+    the masks of every indexed field the lowest set bit is the first
+    matching rule - the same answer as scanning the sorted rules.
+    """
+
+    def __init__(self, rules):
+        # Stable sort keeps list order for equal priorities, like the scan
+        self.rules = sorted(rules, key=lambda x: x["priority"])
+        # Optional precomputed answers (outcome_table.OutcomeTable)
+        self.outcome_table = None
+        self.all_rules = (1 << len(self.rules)) - 1
+        self.value_masks = {}
+        self.unconstrained = {}
+
+        for bit, rule in enumerate(self.rules):
+            for field, required_value in rule["conditions"].items():
+                if field not in self.value_masks:
+                    self.value_masks[field] = {}
+                    self.unconstrained[field] = self.all_rules
+                self.unconstrained[field] &= ~(1 << bit)
+
+                # Handle list of acceptable values
+                values = required_value if isinstance(required_value, list) else [required_value]
+                for value in values:
+                    masks = self.value_masks[field]
+                    masks[value] = masks.get(value, 0) | (1 << bit)
+
+        # A rule without a condition on a field survives any value of it
+        for field, masks in self.value_masks.items():
+            for value in masks:
+                masks[value] |= self.unconstrained[field]
+
+        # Most selective fields first so non-matching data bails out early
+        self.fields = sorted(
+            self.value_masks,
+            key=lambda f: bin(self.unconstrained[f]).count("1")
+        )
+
+    def candidate_mask(self, data):
+        """
+        Bitmask of rules whose conditions all hold for data
+        """
+        candidates = self.all_rules
+        for field in self.fields:
+            if field not in data:
+                # Missing fields only keep rules that don't mention them
+                candidates &= self.unconstrained[field]
+            else:
+                field_data = data[field]
+                if isinstance(field_data, (dict, Fact)) and "value" in field_data:
+                    field_data = field_data["value"]
+                try:
+                    candidates &= self.value_masks[field].get(field_data, self.unconstrained[field])
+                except TypeError:
+                    # Unhashable values can never equal a rule value
+                    candidates &= self.unconstrained[field]
+
+            if not candidates:
+                break
+        return candidates
+
+    def match(self, data):
+        """
+        Return the highest-priority rule matching data, or None
+        """
+        candidates = self.candidate_mask(data)
+        if not candidates:
+            return None
+        return self.rules[(candidates & -candidates).bit_length() - 1]
@@ -0,0 +1,164 @@
+# In-process instrumentation for the decision engine (off unless enabled)
+import threading
+from collections import Counter
+
+from fact_store import Fact
+
+# Upper bounds in microseconds; the last bucket catches everything slower
+LATENCY_BUCKETS_US = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000, 10000]
+
+class LatencyHistogram:
+    """Fixed-bucket latency histogram"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_US):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total_us = 0.0
+
+    def observe(self, seconds):
+        micros = seconds * 1e6
+        self.count += 1
+        self.total_us += micros
+        for i, bound in enumerate(self.buckets):
+            if micros <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def percentile(self, fraction):
+        """Bucket upper bound holding the given fraction of observations"""
+        if not self.count:
+            return 0
+        target = fraction * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean_us": self.total_us / self.count if self.count else 0.0,
+            "p50_us": self.percentile(0.5),
+            "p99_us": self.percentile(0.99),
+            "buckets": dict(zip([str(b) for b in self.buckets] + ["+inf"], self.counts))
+        }
+
+class DecisionMetrics:
+    """
+    Per-rule hit counts, near misses (rules failing exactly one condition,
+    a missing field counting as a failure), NEED_INFO counts per field asked
+    and latency histograms per instrumented function
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.rule_hits = Counter()
+            self.near_misses = Counter()
+            self.need_info = Counter()
+            self.latency = {}
+
+    def record_decision(self, data, result, rules, seconds, count_need_info=True):
+        """
+        Record one make_refund_decision call. A traversal passes
+        count_need_info=False and records the field it asks for itself
+        """
+        near = []
+        for rule in rules:
+            if rule["id"] == result.get("rule_id"):
+                continue
+            failed = 0
+            for field, required_value in rule["conditions"].items():
+                if field not in data:
+                    failed += 1
+                else:
+                    value = data[field]
+                    if isinstance(value, (dict, Fact)) and "value" in value:
+                        value = value["value"]
+                    if isinstance(required_value, list):
+                        failed += value not in required_value
+                    else:
+                        failed += value != required_value
+                if failed > 1:
+                    break
+            if failed == 1:
+                near.append(rule["id"])
+
+        with self.lock:
+            if result["decision"] == "NEED_INFO":
+                if count_need_info:
+                    self.need_info[result["field_needed"]] += 1
+            else:
+                self.rule_hits[result["rule_id"]] += 1
+            self.near_misses.update(near)
+            self._observe("make_refund_decision", seconds)
+
+    def record_need_info(self, field):
+        """Record a NEED_INFO that asked for field"""
+        with self.lock:
+            self.need_info[field] += 1
+
+    def record_latency(self, name, seconds):
+        """Record the duration of any other instrumented call"""
+        with self.lock:
+            self._observe(name, seconds)
+
+    def _observe(self, name, seconds):
+        if name not in self.latency:
+            self.latency[name] = LatencyHistogram()
+        self.latency[name].observe(seconds)
+
+    def snapshot(self):
+        """Plain-dict copy of every metric"""
+        with self.lock:
+            return {
+                "rule_hits": dict(self.rule_hits),
+                "near_misses": dict(self.near_misses),
+                "need_info": dict(self.need_info),
+                "latency": {name: h.snapshot() for name, h in self.latency.items()}
+            }
+
+    def format_text(self):
+        """Readable dump of the current metrics"""
+        snapshot = self.snapshot()
+        lines = ["DECISION ENGINE METRICS", "=" * 40]
+
+        lines.append("Rule hits:")
+        for rule_id, count in sorted(snapshot["rule_hits"].items(), key=lambda x: -x[1]):
+            lines.append(f"  {rule_id}: {count}")
+        lines.append("Near misses (one condition short):")
+        for rule_id, count in sorted(snapshot["near_misses"].items(), key=lambda x: -x[1]):
+            lines.append(f"  {rule_id}: {count}")
+        lines.append("NEED_INFO by field:")
+        for field, count in sorted(snapshot["need_info"].items(), key=lambda x: -x[1]):
+            lines.append(f"  {field}: {count}")
+
+        lines.append("Latency:")
+        for name, stats in snapshot["latency"].items():
+            lines.append(f"  {name}: n={stats['count']} mean={stats['mean_us']:.1f}us "
+                         f"p50<={stats['p50_us']}us p99<={stats['p99_us']}us")
+        return "\n".join(lines)
+
+# The decision engine checks this once per call; None means no recording
+active = None
+
+def enable():
+    """Start recording into a fresh DecisionMetrics and return it"""
+    global active
+    active = DecisionMetrics()
+    return active
+
+def disable():
+    global active
+    active = None
+
+def get_metrics():
+    """The active DecisionMetrics, or None when instrumentation is off"""
+    return active
@@ -103,6 +103,64 @@ DECISION_NODES = {
         "keywords": ["gift card refund", "store credit", "cash back"]
     }
 }
+
+# Item words that reveal the item category
+ITEM_CATEGORY_KEYWORDS = {
+    "laptop": "physical",
+    "computer": "physical", 
+    "phone": "physical",
+    "tablet": "physical",
+    "headphones": "physical",
+    "electronics": "physical",
+    "food": "perishable",
+    "pizza": "perishable",
+    "meal": "perishable",
+    "groceries": "perishable",
+    "software": "digital",
+    "app": "digital",
+    "course": "digital",
+    "ebook": "digital",
+    "download": "digital",
+    "jacket": "physical",
+    "shirt": "physical",
+    "shoes": "physical",
+    "clothing": "physical",
+    "furniture": "physical",
+    "appliance": "physical"
+}
+
+# Common ways customers phrase field values
+KEYWORD_MAPPINGS = {
+    "seller_type": {
+        "direct": ["inhouse", "directly", "official", "your store", "your website"],
+        "third party": ["thirdparty", "third-party", "marketplace", "vendor", "seller", "partner"],
+        "unknown": ["unknown", "not sure", "don't know", "unsure"]
+    },
+    "payment_method": {
+        "credit_card": ["credit", "credit card", "visa", "mastercard", "amex"],
+        "debit_card": ["debit", "debit card"],
+        "paypal": ["paypal", "pay pal"],
+        "bnpl": ["afterpay", "klarna", "buy now pay later", "bnpl"],
+        "gift_card": ["gift card", "giftcard", "store credit"],
+        "prepaid_card": ["prepaid", "prepaid card"]
+    },
+    "return_window": {
+        "within": ["within", "recent", "recently", "last week", "few days", "yesterday"],
+        "expired": ["expired", "long time", "months ago", "old", "while ago"]
+    },
+    "item_condition": {
+        "damaged": ["damaged", "broken", "defective", "faulty"],
+        "wrong_item": ["wrong", "incorrect", "different"],
+        "not_as_described": ["not as described", "different than expected"],
+        "change_of_mind": ["changed mind", "don't want", "don't need"]
+    },
+    "delivery_status": {
+        "delivered": ["delivered", "received", "got it"],
+        "not_delivered": ["never arrived", "didn't arrive", "not delivered", "missing"],
+        "damaged_in_transit": ["damaged shipping", "broken in shipping", "arrived broken"]
+    }
+}
+
 # Utility functions for decision nodes
 
 def get_node_info(node_name):
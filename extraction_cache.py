@@ -0,0 +1,154 @@
+# Two-tier (memory LRU + SQLite) cache for LLM extraction results
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from config import (
+    EXTRACTION_CACHE_ENABLED, EXTRACTION_CACHE_FILE, EXTRACTION_CACHE_MEMORY_ENTRIES,
+    EXTRACTION_CACHE_DISK_ENTRIES, EXTRACTION_CACHE_TTL
+)
+
+def normalize_text(text):
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    text = re.sub(r"\s+", " ", text.lower()).strip()
+    return text.rstrip(".!?,; ")
+
+def known_values(context):
+    """Sorted (field, value) pairs of the facts a prompt is built from"""
+    return sorted((field, str(data.get("value"))) for field, data in (context or {}).items())
+
+def make_context_key(context):
+    """Short digest of the known facts, for keys that must not mix contexts"""
+    return hashlib.sha256(json.dumps(known_values(context)).encode("utf-8")).hexdigest()[:16]
+
+def make_cache_key(user_input, context, fields, model, prompt_version, rules_checksum=None):
+    """
+    Key over the normalized message, the known field values the prompt
+    includes, the fields asked for, the model and prompt version, and the
+    rule version (its checksum) the prompt's field choice came from
+    """
+    source = json.dumps([normalize_text(user_input), known_values(context), sorted(fields or []),
+                         model, prompt_version, rules_checksum])
+    return hashlib.sha256(source.encode("utf-8")).hexdigest()
+
+class ExtractionCache:
+    """
+    In-memory LRU in front of an SQLite table. Entries expire after
+    ttl_seconds; the disk tier is trimmed to disk_entries, oldest first.
+    """
+
+    def __init__(self, path=EXTRACTION_CACHE_FILE, memory_entries=EXTRACTION_CACHE_MEMORY_ENTRIES,
+                 disk_entries=EXTRACTION_CACHE_DISK_ENTRIES, ttl_seconds=EXTRACTION_CACHE_TTL):
+        self.enabled = True
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.ttl_seconds = ttl_seconds
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0,
+                      "memory_evictions": 0, "disk_evictions": 0}
+
+        self.db = None
+        if path:
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS extractions ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            self.db.execute("CREATE INDEX IF NOT EXISTS extractions_created ON extractions (created_at)")
+            self.db.commit()
+
+    def get(self, key):
+        """Cached extractions for key, or None"""
+        if not self.enabled:
+            return None
+        now = time.time()
+
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if now - created_at <= self.ttl_seconds:
+                    self.memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return value
+                del self.memory[key]
+
+            if self.db is not None:
+                row = self.db.execute(
+                    "SELECT value, created_at FROM extractions WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and now - row[1] <= self.ttl_seconds:
+                    value = json.loads(row[0])
+                    self._remember(key, row[1], value)
+                    self.stats["disk_hits"] += 1
+                    return value
+
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key, extractions):
+        """Store extractions in both tiers"""
+        if not self.enabled:
+            return
+        now = time.time()
+
+        with self.lock:
+            self._remember(key, now, extractions)
+            self.stats["stores"] += 1
+            if self.db is not None:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO extractions (key, value, created_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(extractions), now)
+                )
+                # Trim occasionally rather than on every write
+                if self.stats["stores"] % 100 == 0:
+                    self._trim_disk(now)
+                self.db.commit()
+
+    def _remember(self, key, created_at, value):
+        self.memory[key] = (created_at, value)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+            self.stats["memory_evictions"] += 1
+
+    def _trim_disk(self, now):
+        """Drop expired rows, then the oldest rows beyond disk_entries"""
+        cursor = self.db.execute("DELETE FROM extractions WHERE created_at < ?", (now - self.ttl_seconds,))
+        self.stats["disk_evictions"] += cursor.rowcount
+        cursor = self.db.execute(
+            "DELETE FROM extractions WHERE key IN ("
+            "SELECT key FROM extractions ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (self.disk_entries,)
+        )
+        self.stats["disk_evictions"] += cursor.rowcount
+
+    def get_stats(self):
+        """Hit/miss counters plus the overall hit rate"""
+        with self.lock:
+            stats = dict(self.stats)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        stats["memory_size"] = len(self.memory)
+        return stats
+
+    def clear(self):
+        with self.lock:
+            self.memory.clear()
+            if self.db is not None:
+                self.db.execute("DELETE FROM extractions")
+                self.db.commit()
+
+_cache = None
+
+def get_extraction_cache():
+    """Process-wide cache, or None when EXTRACTION_CACHE_ENABLED is off"""
+    global _cache
+    if _cache is None and EXTRACTION_CACHE_ENABLED:
+        _cache = ExtractionCache()
+    return _cache
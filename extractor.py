@@ -1,100 +1,287 @@
-import openai
+import asyncio
 import json
 import re
-from config import OPENAI_API_KEY, MODEL_NAME, CONFIDENCE_THRESHOLD, MAX_TOKENS, TEMPERATURE
+from config import (
+    MODEL_NAME, MAX_TOKENS, TEMPERATURE,
+    FAST_PATH_CONFIDENCE, LLM_TIMEOUT, PROMPT_SAVINGS_LOG
+)
 from decision_nodes import DECISION_NODES, find_relevant_nodes
+from keyword_matcher import KEYWORD_MATCHER
+from extraction_cache import get_extraction_cache, make_cache_key, make_context_key
+from similarity_cache import get_similarity_cache
+from llm_backends import get_llm_backend
+from prompt_builder import PromptBuilder, PROMPT_TOKEN_LOG, estimate_tokens
+from rule_loader import get_rule_registry
+from llm_metering import metered_call
+from fact_store import FactStore
+from field_classifier import get_field_classifier
+
+# Bump whenever the extraction prompt changes so cached results are not reused
+PROMPT_VERSION = 2
+
+# System message of the pre-PromptBuilder prompt; only used to size the
+# legacy prompt for the token-savings log (PROMPT_SAVINGS_LOG)
+LEGACY_SYSTEM_PROMPT = "You are a precise information extraction system. Extract information from customer refund requests using account context. Return valid JSON only."
 
 class InformationExtractor:
     
-    def __init__(self, account_data_file="account_data.json"):
-        """Initialize OpenAI client and load account data"""
-        self.client = openai.OpenAI(api_key=OPENAI_API_KEY)
-        # Main storage: extracted information stored here during session
-        self.extracted_data = {}
-        # Account data loaded from JSON file
-        self.account_data = self.load_account_data(account_data_file)
+    def __init__(self, account_data_file="account_data.json", log=print):
+        """Initialize the LLM backend and load account data"""
+        # Where status and errors are printed (print-compatible callable)
+        self.log = log
+        # OpenAI, offline stub or record/replay, chosen by LLM_BACKEND
+        self.backend = get_llm_backend()
+        # Main storage: account and extracted facts, merged as they are written
+        self.facts = FactStore(self.load_account_data(account_data_file))
+        # Shared extraction cache (None when disabled in config)
+        self.cache = get_extraction_cache()
+        # Near-duplicate cache consulted after an exact miss (None when disabled)
+        self.similarity_cache = get_similarity_cache()
+        # Trained per-field classifier tried before the LLM (None without a model file)
+        self.classifier = get_field_classifier()
+        # Questions drafted by the last combined-mode extraction call
+        self.last_questions = {}
+        # Decision-aware prompts; ConversationManager swaps in its pinned rule version
+        self.use_rule_set(get_rule_registry().current())
+    
+    def use_rule_set(self, rule_set):
+        """Build prompts (and key cached answers) for this version of the rules"""
+        self.rule_set = rule_set
+        self.prompt_builder = PromptBuilder(rule_set.index)
     
     def load_account_data(self, filename):
         """Load customer account data from JSON file"""
         try:
             with open(filename, 'r') as f:
                 data = json.load(f)
-            print(f"Loaded account data for: {data.get('customer_id', 'Unknown Customer')}")
+            self.log(f"Loaded account data for: {data.get('customer_id', 'Unknown Customer')}")
             return data
         except FileNotFoundError:
-            print(f" Account data file {filename} not found. Using empty account data.")
+            self.log(f" Account data file {filename} not found. Using empty account data.")
             return {}
         except json.JSONDecodeError:
-            print(f"Invalid JSON in {filename}. Using empty account data.")
+            self.log(f"Invalid JSON in {filename}. Using empty account data.")
             return {}
     
+    @property
+    def account_data(self):
+        """Account data loaded from JSON file"""
+        return self.facts.account_data
+
+    @account_data.setter
+    def account_data(self, account_data):
+        self.facts.set_account_data(account_data)
+
+    @property
+    def extracted_data(self):
+        """Extracted information stored here during session; writes update the fact store"""
+        return self.facts.extracted
+
+    @extracted_data.setter
+    def extracted_data(self, extracted_data):
+        self.facts.set_extracted(extracted_data)
+
     def get_complete_data(self):
-        """Returns combined account data and extracted data"""
-        complete_data = {}
-        
-        # Add account data (map to decision node fields)
-        account_mapping = {
-            "account_status": "account_status",
-            "loyalty_tier": "loyalty_tier", 
-            "fraud_flag": "fraud_flag",
-            "return_abuse": "return_abuse"
-        }
-        
-        for account_field, decision_field in account_mapping.items():
-            if account_field in self.account_data:
-                complete_data[decision_field] = {
-                    "value": self.account_data[account_field],
-                    "confidence": 1.0,
-                    "source": "account_data",
-                    "reasoning": f"From customer account: {account_field}"
-                }
-        
-        # Add extracted data (override account data if higher confidence)
-        for field, data in self.extracted_data.items():
-            if field in complete_data:
-                # Keep higher confidence data
-                if data.get("confidence", 0) > complete_data[field].get("confidence", 0):
-                    complete_data[field] = {**data, "source": "user_input"}
-            else:
-                complete_data[field] = {**data, "source": "user_input"}
-        
-        return complete_data
+        """
+        Returns combined account data and extracted data. This is the fact
+        store's live merged view, not a copy: read it, don't modify it.
+        """
+        return self.facts.view
 
-    def extract_info(self, user_input, context=None):
-        """Main method: extracts information from user input using account context"""
-        # Include account data in context
-        enhanced_context = self.get_complete_data()
-        prompt = self._build_optimized_prompt(user_input, enhanced_context)
+    def extract_info(self, user_input, context=None, use_cache=True, question_fields=None, field_asked=None):
+        """
+        Main method: extracts information from user input using account context.
+        With question_fields the same call also drafts a question for each of
+        those fields, left in self.last_questions (combined turn mode).
+        field_asked is the field the user is answering, if any.
+        """
+        call = self._prepare_extraction(user_input, use_cache, question_fields, field_asked)
+        if "result" not in call:
+            cached = self.cache.get(call["cache_key"]) if call["cache_key"] is not None else None
+            call = self._build_extraction(call, cached)
+        if "result" in call:
+            return call["result"]
         
         try:
-            response = self.client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": "You are a precise information extraction system. Extract information from customer refund requests using account context. Return valid JSON only."
-                    },
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=TEMPERATURE,
-                max_tokens=MAX_TOKENS,
-                response_format={"type": "json_object"}
-            )
+            request = self._extraction_request(call["messages"])
+            with metered_call("extract_info", request) as metered:
+                response = self.backend.chat(request)
+                metered.usage = response.usage
+            result = self._finish_extraction(call, response)
+            if call["cache_key"] is not None:
+                self.cache.put(call["cache_key"], call["extracted"])
+            return result
             
-            content = response.choices[0].message.content.strip()
-            extracted = self._parse_response(content)
-            
-            # Update main storage with new extractions
-            self._update_data(extracted)
-            
-            return extracted
+        except Exception as e:
+            self.log(f"Extraction error: {e}")
+            return call["fast_extracted"]
+    
+    async def extract_info_async(self, user_input, context=None, use_cache=True, question_fields=None,
+                                 timeout=LLM_TIMEOUT, field_asked=None):
+        """
+        extract_info through the backend's async path (for OpenAI: shared
+        pooled client, retries with backoff on 429/5xx), with a per-call
+        timeout and cancellable by cancelling the task. The extraction
+        cache's SQLite reads and writes run on a worker thread, off the loop.
+        """
+        call = self._prepare_extraction(user_input, use_cache, question_fields, field_asked)
+        if "result" not in call:
+            cached = None
+            if call["cache_key"] is not None:
+                cached = await asyncio.to_thread(self.cache.get, call["cache_key"])
+            call = self._build_extraction(call, cached)
+        if "result" in call:
+            return call["result"]
+        
+        try:
+            request = self._extraction_request(call["messages"])
+            with metered_call("extract_info", request) as metered:
+                response = await self.backend.chat_async(request, timeout)
+                metered.usage = response.usage
+            result = self._finish_extraction(call, response)
+            if call["cache_key"] is not None:
+                await asyncio.to_thread(self.cache.put, call["cache_key"], call["extracted"])
+            return result
             
         except Exception as e:
-            print(f"Extraction error: {e}")
-            return {}
+            self.log(f"Extraction error: {e}")
+            return call["fast_extracted"]
     
-    def _build_optimized_prompt(self, user_input, context):
-        """Builds prompt with account data context and focuses on relevant fields"""
+    def _prepare_extraction(self, user_input, use_cache, question_fields=None, field_asked=None):
+        """
+        Local extraction and the cache key. Returns {"result": ...} when the
+        fast path answers, otherwise the state _build_extraction needs; the
+        caller looks the key up (on a worker thread, from the async path).
+        """
+        self.last_questions = {}
+        
+        # Local keyword fast path first; the LLM only sees what it left open
+        fast_extracted, mentioned = KEYWORD_MATCHER.extract(user_input, field_asked)
+        fast_extracted = {
+            field: data for field, data in fast_extracted.items()
+            if data["confidence"] >= FAST_PATH_CONFIDENCE
+        }
+        self._update_data(fast_extracted)
+        
+        # Then the local classifier, for fields the keywords did not settle;
+        # answers at CONFIDENCE_THRESHOLD or above are taken without the LLM
+        if self.classifier is not None:
+            known = self.get_complete_data()
+            classified = self.classifier.predict(
+                user_input, field_asked,
+                fields=[field for field in DECISION_NODES if field not in fast_extracted and field not in known]
+            )
+            if classified:
+                self._update_data(classified)
+                fast_extracted = {**fast_extracted, **classified}
+                mentioned = set(mentioned) | set(classified)
+        
+        # Mentioned but unsettled fields, plus unknown fields the node
+        # keywords point at: a longer phrase can swallow the only word that
+        # named a field ("arrived broken" leaves item_condition unmatched)
+        known = self.get_complete_data()
+        relevant = set(find_relevant_nodes(user_input))
+        unresolved = [field for field in DECISION_NODES if field not in fast_extracted and
+                      (field in mentioned or (field in relevant and field not in known))]
+        if fast_extracted and not unresolved:
+            return {"result": fast_extracted}
+        
+        # Include account data in context
+        enhanced_context = self.get_complete_data()
+        
+        # Same message, context, fields, model, prompt and rules -> reuse the answer
+        cache_key = None
+        if use_cache and self.cache is not None:
+            cache_key = make_cache_key(user_input, enhanced_context, unresolved, MODEL_NAME, PROMPT_VERSION,
+                                       self.rule_set.checksum)
+        
+        return {
+            "user_input": user_input,
+            "use_cache": use_cache,
+            "enhanced_context": enhanced_context,
+            "unresolved": unresolved,
+            "fast_extracted": fast_extracted,
+            "cache_key": cache_key,
+            "question_fields": question_fields or []
+        }
+    
+    def _build_extraction(self, call, cached):
+        """
+        The rest before the LLM call, given the exact-cache answer for
+        call["cache_key"] (None on a miss): {"result": ...} when a cache
+        answers, otherwise the call with its prompt messages.
+        """
+        user_input = call["user_input"]
+        enhanced_context = call["enhanced_context"]
+        unresolved = call["unresolved"]
+        fast_extracted = call["fast_extracted"]
+        question_fields = call["question_fields"]
+        if cached is not None:
+            self._update_data(cached)
+            return {"result": {**cached, **fast_extracted}}
+        
+        # A paraphrase of an earlier message asking for the same fields
+        # about a customer with the same known facts, under the same rules
+        similarity_namespace = None
+        if call["use_cache"] and self.similarity_cache is not None:
+            similarity_namespace = (tuple(unresolved), make_context_key(enhanced_context),
+                                    MODEL_NAME, PROMPT_VERSION, self.rule_set.checksum)
+            similar, _ = self.similarity_cache.lookup(user_input, similarity_namespace)
+            if similar is not None:
+                self._update_data(similar)
+                return {"result": {**similar, **fast_extracted}}
+        
+        section = self._build_question_section(question_fields, enhanced_context) if question_fields else ""
+        messages, prompt_tokens = self.prompt_builder.build(user_input, enhanced_context, unresolved or None, section)
+        # Rebuilding the legacy prompt only serves the savings report
+        legacy_tokens = None
+        if PROMPT_SAVINGS_LOG:
+            legacy_tokens = (estimate_tokens(LEGACY_SYSTEM_PROMPT) +
+                             estimate_tokens(self._build_optimized_prompt(user_input, enhanced_context, unresolved or None) + section))
+        
+        return {
+            **call,
+            "messages": messages,
+            "prompt_tokens": prompt_tokens,
+            "legacy_tokens": legacy_tokens,
+            "similarity_namespace": similarity_namespace
+        }
+    
+    def _extraction_request(self, messages):
+        """Keyword arguments for chat.completions.create"""
+        return {
+            "model": MODEL_NAME,
+            "messages": messages,
+            "temperature": TEMPERATURE,
+            "max_tokens": MAX_TOKENS,
+            "response_format": {"type": "json_object"}
+        }
+    
+    def _finish_extraction(self, call, response):
+        """
+        Parse the LLM response, fill the similarity cache and update main
+        storage. The parsed answer is left in call["extracted"] for the
+        caller to put in the exact cache.
+        """
+        PROMPT_TOKEN_LOG.record(call["prompt_tokens"], call["legacy_tokens"], response.usage)
+        content = response.content.strip()
+        extracted = self._parse_response(content)
+        call["extracted"] = extracted
+        if call["question_fields"]:
+            self.last_questions = self._parse_questions(content, call["question_fields"])
+        if call["similarity_namespace"] is not None and extracted:
+            self.similarity_cache.insert(call["user_input"], extracted, call["similarity_namespace"])
+        
+        # Update main storage with new extractions
+        self._update_data(extracted)
+        
+        return {**extracted, **call["fast_extracted"]}
+    
+    def _build_optimized_prompt(self, user_input, context, fields=None):
+        """
+        Builds prompt with account data context and focuses on relevant fields.
+        Superseded by PromptBuilder; kept to measure the token savings.
+        """
         context_str = ""
         if context:
             # Separate account data from extracted data
@@ -106,8 +293,8 @@ class InformationExtractor:
             if extracted_info:
                 context_str += f"Previously extracted: {', '.join([f'{k}: {v}' for k, v in extracted_info.items()])}\n"
         
-        # Find relevant nodes based on keywords
-        relevant_nodes = find_relevant_nodes(user_input)
+        # Find relevant nodes based on keywords (unless told which fields to ask for)
+        relevant_nodes = fields or find_relevant_nodes(user_input)
         if not relevant_nodes:
             relevant_nodes = list(DECISION_NODES.keys())[:8]
         
@@ -145,6 +332,41 @@ Response format (JSON):
 
 If no clear information found, return: {{"extractions": {{}}}}"""
     
+    def _build_question_section(self, fields, context):
+        """
+        Extra instructions for combined turn mode: draft the questions the
+        decision engine may need next in the same response
+        """
+        known = ", ".join(f"{k}={v['value']}" for k, v in (context or {}).items())
+        lines = []
+        for field in fields:
+            field_info = DECISION_NODES.get(field, {})
+            lines.append(f"{field}: {field_info.get('description', '')} "
+                         f"(options: {', '.join(field_info.get('values', []))})")
+        return f"""
+
+Also draft one conversational customer service question for each field below,
+in case we need to ask about it next. Explain briefly why we need it and keep
+each question under 50 words. Take what we already know into account: {known or "nothing yet"}
+{chr(10).join(lines)}
+
+Add them to the same JSON object as:
+"questions": {{"field_name": "question text"}}"""
+    
+    def _parse_questions(self, content, fields):
+        """Drafted questions from a combined response, for the requested fields only"""
+        try:
+            questions = json.loads(content).get("questions", {})
+        except (json.JSONDecodeError, AttributeError):
+            return {}
+        if not isinstance(questions, dict):
+            return {}
+        return {
+            field: question.strip().strip('"')
+            for field, question in questions.items()
+            if field in fields and isinstance(question, str) and question.strip()
+        }
+    
     def _parse_response(self, content):
         """Converts JSON response to validated dictionary"""
         try:
@@ -163,26 +385,12 @@ If no clear information found, return: {{"extractions": {{}}}}"""
             return validated
             
         except json.JSONDecodeError as e:
-            print(f"JSON parsing error: {e}")
+            self.log(f"JSON parsing error: {e}")
             return {}
     
     def _update_data(self, new_extractions):
         """Updates self.extracted_data with new extractions using confidence-based merging"""
-        for field, data in new_extractions.items():
-            if field in DECISION_NODES:
-                confidence = data.get("confidence", 0)
-                value = data.get("value", "unknown")
-                
-                # Validate value against allowed options
-                allowed_values = DECISION_NODES[field]["values"]
-                if value not in allowed_values:
-                    continue
-                
-                if confidence >= CONFIDENCE_THRESHOLD:
-                    # Update if new field or higher confidence
-                    if (field not in self.extracted_data or 
-                        confidence > self.extracted_data[field].get("confidence", 0)):
-                        self.extracted_data[field] = data
+        self.facts.merge(new_extractions)
     
     def get_extracted_data(self):
         """Returns all data stored in self.extracted_data"""
@@ -190,21 +398,15 @@ If no clear information found, return: {{"extractions": {{}}}}"""
     
     def get_missing_fields(self):
         """Returns list of fields not yet available (account + extracted)"""
-        all_fields = set(DECISION_NODES.keys())
-        complete_data = self.get_complete_data()
-        available_fields = set(complete_data.keys())
-        return list(all_fields - available_fields)
+        return self.facts.missing
     
     def clear_data(self):
         """Empties self.extracted_data storage (keeps account data)"""
-        self.extracted_data = {}
+        self.facts.set_extracted({})
     
     def get_completion_percentage(self):
         """Calculates percentage of fields available (account + extracted)"""
-        total = len(DECISION_NODES)
-        complete_data = self.get_complete_data()
-        available = len(complete_data)
-        return (available / total) * 100 if total > 0 else 0
+        return self.facts.completion_percentage()
     
     def display_progress(self):
         """Shows current extraction progress with visual bars"""
@@ -213,25 +415,25 @@ If no clear information found, return: {{"extractions": {{}}}}"""
         available = len(complete_data)
         percentage = self.get_completion_percentage()
         
-        print(f"\nProgress: {available}/{total} fields available ({percentage:.1f}% complete)")
+        self.log(f"\nProgress: {available}/{total} fields available ({percentage:.1f}% complete)")
         
         if complete_data:
-            print("\nAvailable Information:")
+            self.log("\nAvailable Information:")
             for field, data in complete_data.items():
                 # Visual confidence bar
                 confidence = data.get('confidence', 0)
                 confidence_bar = "█" * int(confidence * 10) + "░" * (10 - int(confidence * 10))
                 source_emoji = {"account_data": "👤", "user_input": "💬", "inferred": "🔍"}.get(data.get("source"), "❓")
-                print(f"  {source_emoji} {field}: {data['value']} [{confidence_bar}] {confidence:.2f}")
+                self.log(f"  {source_emoji} {field}: {data['value']} [{confidence_bar}] {confidence:.2f}")
         
         missing = self.get_missing_fields()
         if missing and len(missing) <= 5:
-            print(f"\nStill needed:")
+            self.log(f"\nStill needed:")
             for field in missing:
                 node_info = DECISION_NODES.get(field, {})
-                print(f"  • {field}: {node_info.get('description', '')}")
+                self.log(f"  • {field}: {node_info.get('description', '')}")
         elif missing:
-            print(f"\nStill needed: {len(missing)} more fields (type 'missing' to see all)")
+            self.log(f"\nStill needed: {len(missing)} more fields (type 'missing' to see all)")
     
     def get_high_confidence_data(self, threshold=0.8):
         """Returns only extractions above confidence threshold from complete data"""
@@ -0,0 +1,430 @@
+# Versioned fact store: interned fact records, bitmask field tracking, merged view maintained on write
+import sys
+import threading
+
+from decision_nodes import DECISION_NODES
+from config import CONFIDENCE_THRESHOLD, FACT_INTERN_LIMIT
+
+# Account data keys that feed decision fields
+ACCOUNT_FIELD_MAPPING = {
+    "account_status": "account_status",
+    "loyalty_tier": "loyalty_tier",
+    "fraud_flag": "fraud_flag",
+    "return_abuse": "return_abuse"
+}
+ACCOUNT_SOURCE_FIELDS = {decision_field: account_field for account_field, decision_field in ACCOUNT_FIELD_MAPPING.items()}
+
+class Vocabulary:
+    """
+    Name <-> small int. Starts from a known list and grows on first sight
+    of a new name, so ids stay stable for the life of the process.
+    Unhashable names are stored by their str().
+    """
+
+    def __init__(self, names=()):
+        self.names = list(names)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.lock = threading.Lock()
+
+    def id(self, name):
+        try:
+            return self.ids[name]
+        except KeyError:
+            pass
+        except TypeError:
+            return self.id(str(name))
+        with self.lock:
+            if name not in self.ids:
+                self.ids[name] = len(self.names)
+                self.names.append(name)
+            return self.ids[name]
+
+# Bit i of a field mask is FIELDS.names[i]; decision fields come first
+FIELDS = Vocabulary(DECISION_NODES)
+DECISION_FIELD_MASK = (1 << len(DECISION_NODES)) - 1
+VALUES = [Vocabulary(DECISION_NODES[field]["values"]) for field in DECISION_NODES]
+SOURCES = Vocabulary(["user_input", "account_data", "inferred"])
+SOURCE_USER_INPUT = SOURCES.id("user_input")
+SOURCE_ACCOUNT = SOURCES.id("account_data")
+
+# Reasoning is rebuilt from these on demand instead of stored per fact.
+# Free-text reasoning (from the LLM) lives in FactStore.reasons instead.
+REASON_EXTRACTED = 0
+REASON_ACCOUNT = 1
+REASON_KEYWORD = 2
+REASON_CATEGORY = 3
+REASON_TEMPLATES = [
+    "Extracted from customer message",
+    "From customer account: {detail}",
+    "Direct keyword match for {field}",
+    "Detected '{detail}' indicates {value} item"
+]
+
+def field_id(field):
+    """Interned id of a field name (new fields get the next free bit)"""
+    fid = FIELDS.id(field)
+    while len(VALUES) <= fid:
+        with FIELDS.lock:
+            if len(VALUES) <= fid:
+                VALUES.append(Vocabulary())
+    return fid
+
+class Fact:
+    """
+    One known field value. Read like the old fact dicts - fact["value"],
+    fact.get("confidence", 0), {**fact} - but immutable and interned:
+    equal facts are one shared object, so a session only holds pointers.
+    """
+    __slots__ = ("field_id", "value_id", "confidence", "source_id", "reason_id", "detail")
+    KEYS = ("value", "confidence", "source", "reasoning")
+
+    def __init__(self, field_id, value_id, confidence, source_id, reason_id, detail):
+        self.field_id = field_id
+        self.value_id = value_id
+        self.confidence = confidence
+        self.source_id = source_id
+        self.reason_id = reason_id
+        self.detail = detail
+
+    @property
+    def field(self):
+        return FIELDS.names[self.field_id]
+
+    @property
+    def value(self):
+        return VALUES[self.field_id].names[self.value_id]
+
+    @property
+    def source(self):
+        return SOURCES.names[self.source_id]
+
+    @property
+    def reasoning(self):
+        """Materialized from the reason template each time it is asked for"""
+        return REASON_TEMPLATES[self.reason_id].format(field=self.field, value=self.value, detail=self.detail)
+
+    def __getitem__(self, key):
+        if key not in Fact.KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        if key not in Fact.KEYS:
+            return default
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in Fact.KEYS
+
+    def __iter__(self):
+        return iter(Fact.KEYS)
+
+    def __len__(self):
+        return len(Fact.KEYS)
+
+    def keys(self):
+        return Fact.KEYS
+
+    def items(self):
+        return [(key, getattr(self, key)) for key in Fact.KEYS]
+
+    def __repr__(self):
+        return f"Fact({self.field}={self.value!r}, confidence={self.confidence}, source={self.source})"
+
+_facts = {}
+
+def make_fact(field, value, confidence, source="user_input", reason=REASON_EXTRACTED, detail=None):
+    """
+    The shared Fact for these parts. Past FACT_INTERN_LIMIT distinct
+    facts new ones are still returned, just not shared.
+    """
+    fid = field_id(field)
+    key = (fid, VALUES[fid].id(value), confidence, SOURCES.id(source), reason, detail)
+    fact = _facts.get(key)
+    if fact is None:
+        fact = Fact(*key)
+        if len(_facts) < FACT_INTERN_LIMIT:
+            fact = _facts.setdefault(key, fact)
+    return fact
+
+def as_fact(field, data):
+    """A Fact from a fact or an old-style {"value", "confidence", ...} dict"""
+    if isinstance(data, Fact):
+        return data
+    return make_fact(field, data.get("value", "unknown"), data.get("confidence", 0),
+                     data.get("source") or "user_input")
+
+class ExtractedFacts(dict):
+    """
+    The extracted-data dict, field -> Fact. Reads are plain dict reads;
+    writes accept a Fact or an old-style dict and are passed on to the
+    owning FactStore so its merged view stays current, which keeps
+    existing `extractor.extracted_data[field] = {...}` code working.
+    """
+    __slots__ = ("store",)
+
+    def __init__(self, store):
+        super().__init__()
+        self.store = store
+
+    def __setitem__(self, field, data):
+        self.store._note_reasoning(field, data)
+        super().__setitem__(field, as_fact(field, data))
+        self.store._refresh(field)
+
+    def __delitem__(self, field):
+        super().__delitem__(field)
+        self.store._refresh(field)
+
+    def pop(self, field, *default):
+        present = field in self
+        value = super().pop(field, *default)
+        if present:
+            self.store._refresh(field)
+        return value
+
+    def popitem(self):
+        field, data = super().popitem()
+        self.store._refresh(field)
+        return field, data
+
+    def setdefault(self, field, default=None):
+        if field not in self:
+            self[field] = default
+        return self[field]
+
+    def update(self, *args, **kwargs):
+        for field, data in dict(*args, **kwargs).items():
+            self[field] = data
+
+    def clear(self):
+        fields = list(self)
+        super().clear()
+        for field in fields:
+            self.store._refresh(field)
+
+class FactStore:
+    """
+    Account facts plus extracted facts, merged as writes happen instead of
+    on every read. `view` is the merged field -> Fact dict get_complete_data
+    used to rebuild (account entries first, an extraction replaces an
+    account entry only with higher confidence); it is updated in place,
+    so reads are O(1) and allocate nothing - treat it as read-only.
+    `known_mask` has bit field_id set for every field in the view.
+    `version` goes up on every change, so callers can skip work when
+    nothing moved. `reasons` is the side table of free-text reasoning by
+    extracted field, None until an extraction brings some, so interned
+    facts stay shared.
+    """
+    __slots__ = ("version", "view", "known_mask", "account_data", "extracted", "reasons")
+
+    def __init__(self, account_data=None):
+        self.version = 0
+        self.view = {}
+        self.known_mask = 0
+        self.reasons = None
+        self.extracted = ExtractedFacts(self)
+        self.set_account_data(account_data or {})
+
+    @property
+    def missing_mask(self):
+        """Decision fields not in the view, one bit each"""
+        return DECISION_FIELD_MASK & ~self.known_mask
+
+    @property
+    def missing(self):
+        """Missing decision field names, in DECISION_NODES order"""
+        mask = self.missing_mask
+        return [field for bit, field in enumerate(DECISION_NODES) if mask >> bit & 1]
+
+    def set_account_data(self, account_data):
+        """Swap in new account data; the view is rebuilt once"""
+        self.account_data = account_data
+        self._rebuild()
+
+    def set_extracted(self, extracted, reasons=None):
+        """
+        Replace every extracted fact (clear_data, restoring a session);
+        reasons is free-text reasoning by field for facts that carry none
+        """
+        dict.clear(self.extracted)
+        self.reasons = dict(reasons) if reasons else None
+        for field, data in extracted.items():
+            if not isinstance(data, Fact):
+                self._note_reasoning(field, data)
+            dict.__setitem__(self.extracted, field, as_fact(field, data))
+        self._rebuild()
+
+    def reasoning(self, field):
+        """Reasoning for the field's merged fact: the free text it came with, else its template"""
+        fact = self.view.get(field)
+        if fact is None:
+            return None
+        if self.reasons and fact.source_id != SOURCE_ACCOUNT and field in self.reasons:
+            return self.reasons[field]
+        return fact.reasoning
+
+    def explain(self):
+        """The view as fact dicts with full reasoning, built on each call"""
+        return {
+            field: {"value": fact.value, "confidence": fact.confidence,
+                    "source": fact.source, "reasoning": self.reasoning(field)}
+            for field, fact in self.view.items()
+        }
+
+    def merge(self, new_extractions):
+        """
+        Confidence-based merge: a valid value at or above
+        CONFIDENCE_THRESHOLD is stored if the field is new or the
+        confidence beats what is stored. Returns the fields written.
+        """
+        written = []
+        for field, data in new_extractions.items():
+            if field not in DECISION_NODES:
+                continue
+            confidence = data.get("confidence", 0)
+            if data.get("value", "unknown") not in DECISION_NODES[field]["values"]:
+                continue
+            if confidence < CONFIDENCE_THRESHOLD:
+                continue
+            stored = dict.get(self.extracted, field)
+            if stored is None or confidence > stored.confidence:
+                self.extracted[field] = data
+                written.append(field)
+        return written
+
+    def completion_percentage(self):
+        total = len(DECISION_NODES)
+        return (bin(self.known_mask).count("1") / total) * 100 if total > 0 else 0
+
+    def _account_fact(self, field):
+        account_field = ACCOUNT_SOURCE_FIELDS.get(field)
+        if account_field is None or account_field not in self.account_data:
+            return None
+        return make_fact(field, self.account_data[account_field], 1.0, "account_data",
+                         REASON_ACCOUNT, account_field)
+
+    def _merged_entry(self, field):
+        account = self._account_fact(field)
+        fact = dict.get(self.extracted, field)
+        if fact is None:
+            return account
+        if account is not None and not fact.confidence > account.confidence:
+            return account
+        if fact.source_id != SOURCE_USER_INPUT:
+            fact = make_fact(field, fact.value, fact.confidence, "user_input", fact.reason_id, fact.detail)
+        return fact
+
+    def _note_reasoning(self, field, data):
+        # Only old-style dicts carry free text; a Fact's reasoning is its template
+        text = None if isinstance(data, Fact) else data.get("reasoning")
+        if isinstance(text, str) and text:
+            if self.reasons is None:
+                self.reasons = {}
+            self.reasons[field] = text
+        elif self.reasons:
+            self.reasons.pop(field, None)
+
+    def _refresh(self, field):
+        if self.reasons and field not in self.extracted:
+            self.reasons.pop(field, None)
+        entry = self._merged_entry(field)
+        bit = 1 << field_id(field)
+        if entry is None:
+            self.view.pop(field, None)
+            self.known_mask &= ~bit
+        else:
+            self.view[field] = entry
+            self.known_mask |= bit
+        self.version += 1
+
+    def _rebuild(self):
+        # In place, so anyone holding the view sees the new state
+        self.view.clear()
+        self.known_mask = 0
+        for field, account_field in ACCOUNT_SOURCE_FIELDS.items():
+            if account_field in self.account_data:
+                self.view[field] = self._merged_entry(field)
+        for field in self.extracted:
+            if field not in self.view:
+                self.view[field] = self._merged_entry(field)
+        for field in self.view:
+            self.known_mask |= 1 << field_id(field)
+        self.version += 1
+
+def _legacy_session(account_data, turns):
+    """The dict layout FactStore replaced: fact dicts, reasoning strings, a merged copy"""
+    extracted = {}
+    for extractions in turns:
+        for field, data in extractions.items():
+            if data["confidence"] >= CONFIDENCE_THRESHOLD and (
+                    field not in extracted or data["confidence"] > extracted[field]["confidence"]):
+                extracted[field] = data
+    complete = {}
+    for account_field, decision_field in ACCOUNT_FIELD_MAPPING.items():
+        if account_field in account_data:
+            complete[decision_field] = {"value": account_data[account_field], "confidence": 1.0,
+                                        "source": "account_data",
+                                        "reasoning": f"From customer account: {account_field}"}
+    for field, data in extracted.items():
+        if field not in complete or data["confidence"] > complete[field]["confidence"]:
+            complete[field] = {**data, "source": "user_input"}
+    missing = set(DECISION_NODES) - set(complete)
+    return extracted, complete, missing
+
+def _fact_store_session(account_data, turns):
+    store = FactStore(account_data)
+    for extractions in turns:
+        store.merge(extractions)
+    return store
+
+def _session_inputs(n):
+    """Account data and three turns of LLM-style extractions for session n"""
+    account_data = {
+        "customer_id": f"CUST_{n:05d}",
+        "account_status": "good_standing",
+        "loyalty_tier": ["gold", "silver", "bronze"][n % 3],
+        "fraud_flag": "no",
+        "return_abuse": "no"
+    }
+    picks = [("item_category", "physical"), ("item_condition", ["damaged", "normal"][n % 2]),
+             ("delivery_status", "delivered"), ("return_window", "within"),
+             ("seller_type", "inhouse"), ("payment_method", "credit_card"), ("item_returnable", "yes")]
+    turns = []
+    for turn in range(3):
+        extractions = {}
+        for field, value in picks[turn * 3:turn * 3 + 3]:
+            extractions[field] = {
+                "value": value,
+                "confidence": 0.85 + 0.05 * (n % 3),
+                "reasoning": f"Customer said their {field.replace('_', ' ')} is {value} (message {n}.{turn})"
+            }
+        turns.append(extractions)
+    return account_data, turns
+
+def measure_memory(build, sessions=2000):
+    """Bytes per live session allocated by build(account_data, turns)"""
+    import gc
+    import tracemalloc
+    # Warm up interning tables so only per-session cost is counted
+    build(*_session_inputs(sessions))
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    # Inputs are rebuilt inside the measurement: what a session keeps of them counts
+    kept = [build(*_session_inputs(n)) for n in range(sessions)]
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / sessions
+
+if __name__ == "__main__":
+    # python fact_store.py [SESSIONS]
+    sessions = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    legacy = measure_memory(_legacy_session, sessions)
+    compact = measure_memory(_fact_store_session, sessions)
+    print(f"Per-session fact memory over {sessions} live sessions")
+    print(f"  dict facts + merged copy: {legacy:8.0f} bytes")
+    print(f"  interned FactStore:       {compact:8.0f} bytes ({1 - compact / legacy:.0%} smaller)")
+    print(f"  shared fact records:      {len(_facts)}")
@@ -0,0 +1,290 @@
+# Local OpenAI-compatible chat completions server for exercising the LLM paths offline
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from decision_nodes import DECISION_NODES
+from keyword_matcher import KEYWORD_MATCHER
+
+def default_reply(request):
+    """
+    Extraction requests (json_object format) get the keyword matcher's
+    view of the customer message, plus a question per field when the
+    prompt asks for drafted questions; anything else gets a fixed question
+    """
+    prompt = request["messages"][-1]["content"]
+    if request.get("response_format", {}).get("type") == "json_object":
+        message = prompt.split('Customer message: "', 1)[-1].split('"\n', 1)[0]
+        extractions, _ = KEYWORD_MATCHER.extract(message, all_mappings=True)
+        reply = {"extractions": extractions}
+        if '"questions"' in prompt:
+            reply["questions"] = {
+                field: f"Could you tell me about the {field.replace('_', ' ')}?" for field in DECISION_NODES
+            }
+        return json.dumps(reply)
+    return '"Could you tell me a bit more about your order?"'
+
+class FakeOpenAIServer:
+    """
+    Serves POST /v1/chat/completions on 127.0.0.1. `script` is consumed
+    one entry per request: an int answers with that HTTP status, a float
+    delays the reply by that many seconds, "stall" stops a streamed reply
+    after its first few chunks, None (or an empty script) replies
+    normally. Streaming requests get server-sent events, one chunk per
+    word, chunk_delay apart. Every request body is kept in self.requests,
+    and the client address (host, port) it came from in self.peers.
+    """
+
+    def __init__(self, script=None, reply=default_reply, port=0, chunk_delay=0.0):
+        self.script = list(script or [])
+        self.reply = reply
+        self.chunk_delay = chunk_delay
+        self.requests = []
+        self.peers = []
+        self.lock = threading.Lock()
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with server.lock:
+                    server.requests.append(body)
+                    server.peers.append(self.client_address)
+                    step = server.script.pop(0) if server.script else None
+
+                if isinstance(step, float):
+                    time.sleep(step)
+                if isinstance(step, int) and not isinstance(step, bool):
+                    self._send(step, {"error": {"message": f"scripted {step}", "type": "fake_error"}},
+                               {"Retry-After": "0"} if step == 429 else {})
+                    return
+                if body.get("stream"):
+                    self._stream(body, server.reply(body), stall=step == "stall")
+                    return
+
+                self._send(200, {
+                    "id": f"chatcmpl-fake-{len(server.requests)}",
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body.get("model", "fake"),
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": server.reply(body)},
+                        "finish_reason": "stop"
+                    }],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+                })
+
+            def _stream(self, body, content, stall=False):
+                words = content.split(" ")
+                pieces = [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+                try:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Connection", "close")
+                    self.end_headers()
+                    self.close_connection = True
+                    deltas = [{"role": "assistant", "content": ""}] + [{"content": p} for p in pieces]
+                    for i, delta in enumerate(deltas):
+                        if stall and i == 3:
+                            time.sleep(60)
+                            return
+                        chunk = {
+                            "id": f"chatcmpl-fake-{len(server.requests)}",
+                            "object": "chat.completion.chunk",
+                            "created": int(time.time()),
+                            "model": body.get("model", "fake"),
+                            "choices": [{"index": 0, "delta": delta,
+                                         "finish_reason": "stop" if i == len(deltas) - 1 else None}]
+                        }
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                        time.sleep(server.chunk_delay)
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def _send(self, status, payload, headers=None):
+                data = json.dumps(payload).encode("utf-8")
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    for name, value in (headers or {}).items():
+                        self.send_header(name, value)
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # client gave up (timeout or cancellation)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}/v1"
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+def run_checks():
+    """Exercise the async extractor/question paths; returns failure messages"""
+    import asyncio
+    import llm_client
+    from llm_backends import OpenAIBackend, set_llm_backend
+    from extractor import InformationExtractor
+    from conversation_manager import ConversationManager
+
+    failures = []
+    set_llm_backend(OpenAIBackend())
+
+    def check(name, condition):
+        print(f"  {'ok  ' if condition else 'FAIL'} {name}")
+        if not condition:
+            failures.append(name)
+
+    async def scenario(server, coroutine_factory):
+        llm_client.OPENAI_BASE_URL = server.base_url
+        try:
+            return await coroutine_factory()
+        finally:
+            await llm_client.close_async_client()
+
+    # Nothing here for the keyword fast path, so every call reaches the server
+    message = "I want my money back for this order"
+
+    def reply(request):
+        return json.dumps({"extractions": {
+            "payment_method": {"value": "credit_card", "confidence": 0.9, "reasoning": "fake server"}
+        }})
+
+    with FakeOpenAIServer(reply=reply) as server:
+        extractor = InformationExtractor()
+        result = asyncio.run(scenario(server, lambda: extractor.extract_info_async(message, use_cache=False)))
+        check("extraction succeeds", "payment_method" in result and len(server.requests) >= 1)
+
+    with FakeOpenAIServer(script=[429, 503, 500], reply=reply) as server:
+        extractor = InformationExtractor()
+        started = time.perf_counter()
+        result = asyncio.run(scenario(server, lambda: extractor.extract_info_async(message, use_cache=False)))
+        check("retries 429/5xx then succeeds", len(server.requests) == 4 and "payment_method" in result)
+        check("backoff stays bounded", time.perf_counter() - started < 3 * llm_client.LLM_BACKOFF_MAX)
+
+    with FakeOpenAIServer(script=[400]) as server:
+        extractor = InformationExtractor()
+        asyncio.run(scenario(server, lambda: extractor.extract_info_async(message, use_cache=False)))
+        check("400 is not retried", len(server.requests) == 1)
+
+    with FakeOpenAIServer(script=[2.0, 2.0, 2.0, 2.0]) as server:
+        manager = ConversationManager()
+        started = time.perf_counter()
+        question = asyncio.run(scenario(server, lambda: manager.generate_smart_question_async(
+            "payment_method", {}, "How did you pay?", timeout=0.2)))
+        elapsed = time.perf_counter() - started
+        check("timeout falls back to the template question", question == "How did you pay?")
+        check("timeouts are retried", len(server.requests) == llm_client.LLM_MAX_RETRIES + 1)
+        check("per-call timeout is honoured", elapsed < 2.0 + llm_client.LLM_BACKOFF_MAX)
+
+    with FakeOpenAIServer(script=[5.0]) as server:
+        extractor = InformationExtractor()
+
+        async def cancel_midway():
+            task = asyncio.create_task(extractor.extract_info_async(message, use_cache=False))
+            await asyncio.sleep(0.2)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                return True
+            return False
+
+        started = time.perf_counter()
+        cancelled = asyncio.run(scenario(server, cancel_midway))
+        check("cancellation aborts the request", cancelled and time.perf_counter() - started < 2.0)
+
+    # Sync calls through the guard: latency budgets, hedging, circuit breaker
+    import llm_backends
+    from llm_guard import GuardedBackend, CircuitBreaker
+    from llm_metering import LLM_METER
+
+    def guarded(server, **options):
+        llm_backends.OPENAI_BASE_URL = server.base_url
+        return GuardedBackend(OpenAIBackend(max_retries=0), **options)
+
+    with FakeOpenAIServer(script=[1.5], reply=reply) as server:
+        extractor = InformationExtractor()
+        extractor.backend = guarded(server, hedge_delay=0.2)
+        started = time.perf_counter()
+        result = extractor.extract_info(message, use_cache=False)
+        check("a slow request is hedged and the hedge answers",
+              "payment_method" in result and len(server.requests) == 2 and time.perf_counter() - started < 1.0)
+        time.sleep(1.5)  # the losing attempt is metered when it finishes
+        attempts = sum(totals["calls"] for (site, _), totals in LLM_METER.totals.items()
+                       if site == "extract_info.attempt")
+        check("the losing hedge is metered as its own call", attempts == 1)
+
+    with FakeOpenAIServer(script=[3.0, 3.0], reply=reply) as server:
+        extractor = InformationExtractor()
+        extractor.backend = guarded(server, extraction_budget=0.5, hedge_delay=0.2)
+        started = time.perf_counter()
+        result = extractor.extract_info(message, use_cache=False)
+        check("the latency budget cuts a stalled extraction short",
+              result == {} and time.perf_counter() - started < 1.0)
+
+    with FakeOpenAIServer(script=[500, 500, 500], reply=reply) as server:
+        breaker = CircuitBreaker(min_calls=3, failure_rate=0.5, cooldown=0.5)
+        manager = ConversationManager()
+        manager.extractor.backend = guarded(server, breaker=breaker, max_attempts=1)
+        for _ in range(3):
+            manager.extractor.extract_info(message, use_cache=False)
+        check("sustained errors trip the breaker", breaker.state == "open" and breaker.stats["trips"] == 1)
+
+        started = time.perf_counter()
+        question = manager.generate_smart_question("payment_method", {}, "How did you pay?")
+        result = manager.extractor.extract_info(message, use_cache=False)
+        check("an open breaker serves templates without calling the LLM",
+              question == "How did you pay?" and result == {} and len(server.requests) == 3
+              and time.perf_counter() - started < 0.1)
+
+        time.sleep(0.6)
+        result = manager.extractor.extract_info(message, use_cache=False)
+        check("a successful half-open probe closes the breaker",
+              "payment_method" in result and breaker.state == "closed" and breaker.stats["probes"] == 1)
+
+    return failures
+
+if __name__ == "__main__":
+    # python fake_openai_server.py           -> run the async client checks
+    # python fake_openai_server.py serve 8765 -> serve until interrupted
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else 8765
+        server = FakeOpenAIServer(port=port)
+        print(f"Fake OpenAI server on {server.base_url} (set OPENAI_BASE_URL to use it)")
+        try:
+            server.httpd.serve_forever()
+        except KeyboardInterrupt:
+            server.stop()
+    else:
+        os.environ.setdefault("OPENAI_API_KEY", "fake-key")
+        print("Async LLM client checks against the fake server:")
+        sys.exit(1 if run_checks() else 0)
@@ -0,0 +1,361 @@
+# Local per-field classifier: naive Bayes over hashed word n-grams, trained from logged transcripts
+import json
+import re
+import sys
+import threading
+import time
+import zipfile
+import zlib
+
+import numpy as np
+
+from decision_nodes import DECISION_NODES
+from extraction_cache import normalize_text
+from config import CONFIDENCE_THRESHOLD, FIELD_CLASSIFIER_MODEL, TRANSCRIPT_LOG
+
+MODEL_FORMAT = 1
+HASH_BITS = 20
+HASH_MASK = (1 << HASH_BITS) - 1
+# Class for "this message says nothing about the field"
+NO_VALUE = "-"
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+# Temperatures tried when calibrating each field on held-out transcripts
+TEMPERATURE_GRID = np.geomspace(0.25, 32.0, 57)
+
+def message_features(message, field_asked=None):
+    """
+    Sorted hashed ids of the message's words and word pairs, plus the
+    field the bot had just asked about (a bare "yes" means nothing without it)
+    """
+    words = WORD_PATTERN.findall(normalize_text(message))
+    grams = words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+    if field_asked:
+        grams.append(f"asked={field_asked}")
+    return sorted({zlib.crc32(gram.encode("utf-8")) & HASH_MASK for gram in grams})
+
+class FieldClassifier:
+    """
+    One multinomial naive Bayes model per decision field, all stacked in
+    a single (features x classes) weight matrix so a message costs one
+    row gather and sum. Scores are divided by a per-field temperature fit
+    on held-out transcripts, so the softmax outputs are calibrated
+    confidences rather than naive Bayes' usual near-certainties.
+    """
+
+    def __init__(self, vocab, weights, bias, fields, classes, sizes, temperatures):
+        self.vocab = vocab                     # uint32 hashed feature ids, sorted
+        self.weights = weights                 # float32 (len(vocab), total classes)
+        self.bias = bias                       # float32 log priors per class
+        self.fields = list(fields)
+        self.classes = list(classes)           # value per class; NO_VALUE for none
+        self.sizes = np.asarray(sizes, dtype=np.int64)
+        self.starts = np.concatenate([[0], np.cumsum(self.sizes)[:-1]]).astype(np.int64)
+        self.temperatures = np.asarray(temperatures, dtype=np.float32)
+        self.class_temperature = np.repeat(self.temperatures, self.sizes)
+        self.class_field = np.repeat(np.arange(len(self.fields)), self.sizes)
+        self.no_value = np.array([value == NO_VALUE for value in self.classes])
+        self.columns = {int(feature): row for row, feature in enumerate(vocab)}
+        self.stats = {"messages": 0, "accepted": 0}
+
+    @classmethod
+    def load(cls, path=FIELD_CLASSIFIER_MODEL):
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta["format"] != MODEL_FORMAT or meta["hash_bits"] != HASH_BITS:
+                raise ValueError(f"{path}: unsupported classifier format")
+            return cls(data["vocab"], data["weights"], data["bias"], meta["fields"],
+                       meta["classes"], meta["sizes"], data["temperatures"])
+
+    def save(self, path):
+        meta = {"format": MODEL_FORMAT, "hash_bits": HASH_BITS, "fields": self.fields,
+                "classes": self.classes, "sizes": self.sizes.tolist()}
+        with open(path, "wb") as f:
+            np.savez_compressed(f, vocab=self.vocab, weights=self.weights, bias=self.bias,
+                                temperatures=self.temperatures, meta=np.array(json.dumps(meta)))
+
+    def probabilities(self, message, field_asked=None):
+        """Calibrated class probabilities, every field's classes side by side"""
+        rows = [self.columns[feature] for feature in message_features(message, field_asked)
+                if feature in self.columns]
+        scores = self.bias + self.weights[rows].sum(axis=0) if rows else self.bias.copy()
+        scores /= self.class_temperature
+        scores -= np.repeat(np.maximum.reduceat(scores, self.starts), self.sizes)
+        np.exp(scores, out=scores)
+        scores /= np.repeat(np.add.reduceat(scores, self.starts), self.sizes)
+        return scores
+
+    def predict(self, message, field_asked=None, threshold=CONFIDENCE_THRESHOLD, fields=None):
+        """
+        {field: {"value", "confidence", "reasoning"}} for fields whose most
+        likely value is a real value with calibrated confidence >= threshold
+        """
+        probs = self.probabilities(message, field_asked)
+        confident = np.flatnonzero((probs >= threshold) & ~self.no_value)
+        extractions = {}
+        for position in confident:
+            field = self.fields[self.class_field[position]]
+            if fields is not None and field not in fields:
+                continue
+            confidence = round(float(probs[position]), 2)
+            extractions[field] = {
+                "value": self.classes[position],
+                "confidence": confidence,
+                "reasoning": f"Local classifier ({confidence:.2f})"
+            }
+        self.stats["messages"] += 1
+        self.stats["accepted"] += len(extractions)
+        return extractions
+
+    def get_stats(self):
+        return dict(self.stats)
+
+def read_examples(paths):
+    """
+    (features, labels) per logged user turn; labels maps every field to
+    its final value for that turn, or NO_VALUE
+    """
+    examples = []
+    for path in paths:
+        with open(path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                for turn in json.loads(line)["turns"]:
+                    extracted = turn.get("extractions", {})
+                    labels = {field: extracted.get(field, NO_VALUE) for field in DECISION_NODES}
+                    examples.append((message_features(turn["message"], turn.get("field_asked")), labels))
+    return examples
+
+def _class_table(examples):
+    fields = list(DECISION_NODES)
+    classes, sizes = [], []
+    for field in fields:
+        seen = {labels[field] for _, labels in examples} - {NO_VALUE}
+        values = [NO_VALUE] + [value for value in DECISION_NODES[field]["values"] if value in seen]
+        classes.extend(values)
+        sizes.append(len(values))
+    return fields, classes, sizes
+
+def fit(examples, fields, classes, sizes, temperatures=None, alpha=0.5):
+    """Naive Bayes counts over examples; temperatures default to 1"""
+    vocab = np.array(sorted({feature for features, _ in examples for feature in features}), dtype=np.uint32)
+    columns = {int(feature): row for row, feature in enumerate(vocab)}
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    class_index = {}
+    for field, start, size in zip(fields, starts, sizes):
+        for offset in range(size):
+            class_index[(field, classes[start + offset])] = start + offset
+
+    # Each example's class in every field, and its feature rows
+    targets = np.array([[class_index.get((field, labels[field]), class_index[(field, NO_VALUE)])
+                         for field in fields] for _, labels in examples], dtype=np.int64)
+    lengths = np.array([len(features) for features, _ in examples], dtype=np.int64)
+    feature_rows = np.array([columns[feature] for features, _ in examples for feature in features], dtype=np.int64)
+    example_of_feature = np.repeat(np.arange(len(examples)), lengths)
+
+    total_classes = len(classes)
+    counts = np.zeros((len(vocab), total_classes), dtype=np.float64)
+    for position in range(len(fields)):
+        np.add.at(counts, (feature_rows, targets[example_of_feature, position]), 1)
+    class_totals = np.bincount(targets.ravel(), minlength=total_classes)
+
+    weights = np.log(counts + alpha) - np.log(counts.sum(axis=0) + alpha * len(vocab))
+    bias = np.zeros(total_classes)
+    for start, size in zip(starts, sizes):
+        segment = class_totals[start:start + size] + 1.0
+        bias[start:start + size] = np.log(segment / segment.sum())
+
+    if temperatures is None:
+        temperatures = np.ones(len(fields))
+    return FieldClassifier(vocab, weights.astype(np.float32), bias.astype(np.float32),
+                           fields, classes, sizes, temperatures)
+
+def calibrate(model, examples):
+    """Per-field temperature minimizing held-out negative log likelihood"""
+    true_positions = []
+    raw = []
+    class_index = {(model.fields[model.class_field[i]], value): i for i, value in enumerate(model.classes)}
+    for features, labels in examples:
+        rows = [model.columns[f] for f in features if f in model.columns]
+        raw.append(model.bias + model.weights[rows].sum(axis=0))
+        true_positions.append([class_index.get((field, labels[field]), class_index[(field, NO_VALUE)])
+                               for field in model.fields])
+    raw = np.array(raw, dtype=np.float64)
+    true_positions = np.array(true_positions)
+
+    temperatures = []
+    for position, (start, size) in enumerate(zip(model.starts, model.sizes)):
+        segment = raw[:, start:start + size]
+        truth = true_positions[:, position] - start
+        best = (np.inf, 1.0)
+        for temperature in TEMPERATURE_GRID:
+            scaled = segment / temperature
+            scaled -= scaled.max(axis=1, keepdims=True)
+            log_probs = scaled - np.log(np.exp(scaled).sum(axis=1, keepdims=True))
+            nll = -log_probs[np.arange(len(truth)), truth].mean()
+            best = min(best, (nll, float(temperature)))
+        temperatures.append(best[1])
+    return np.array(temperatures, dtype=np.float32)
+
+def evaluate(model, examples, threshold=CONFIDENCE_THRESHOLD):
+    """Per-field accepted count and precision at threshold, plus expected calibration error"""
+    report = {field: {"labelled": 0, "accepted": 0, "correct": 0} for field in model.fields}
+    confidences, hits = [], []
+    for features, labels in examples:
+        rows = [model.columns[f] for f in features if f in model.columns]
+        scores = (model.bias + model.weights[rows].sum(axis=0)) / model.class_temperature
+        for position, (start, size) in enumerate(zip(model.starts, model.sizes)):
+            field = model.fields[position]
+            segment = np.exp(scores[start:start + size] - scores[start:start + size].max())
+            segment /= segment.sum()
+            best = int(segment.argmax())
+            value = model.classes[start + best]
+            confidences.append(segment[best])
+            hits.append(value == labels[field])
+            report[field]["labelled"] += labels[field] != NO_VALUE
+            if value != NO_VALUE and segment[best] >= threshold:
+                report[field]["accepted"] += 1
+                report[field]["correct"] += value == labels[field]
+
+    confidences, hits = np.array(confidences), np.array(hits)
+    bins = np.minimum((confidences * 10).astype(int), 9)
+    ece = sum(abs(hits[bins == b].mean() - confidences[bins == b].mean()) * (bins == b).mean()
+              for b in range(10) if (bins == b).any())
+    return report, ece
+
+def train(paths, model_path=FIELD_CLASSIFIER_MODEL, holdout=0.2, log=sys.stdout):
+    """
+    Fit on transcripts, calibrate temperatures on a held-out slice, report
+    held-out precision, then refit on everything and save
+    """
+    examples = read_examples(paths)
+    if not examples:
+        raise ValueError("no transcript turns to train on")
+    fields, classes, sizes = _class_table(examples)
+    # Hash of the features picks the held-out slice, so reruns agree
+    held = [zlib.crc32(np.array(features, dtype=np.uint32).tobytes()) % 100 < holdout * 100
+            for features, _ in examples]
+    train_set = [example for example, is_held in zip(examples, held) if not is_held]
+    held_set = [example for example, is_held in zip(examples, held) if is_held]
+    print(f"{len(examples)} turns: {len(train_set)} train, {len(held_set)} held out", file=log)
+
+    temperatures = None
+    if train_set and held_set:
+        model = fit(train_set, fields, classes, sizes)
+        temperatures = calibrate(model, held_set)
+        model = fit(train_set, fields, classes, sizes, temperatures)
+        report, ece = evaluate(model, held_set)
+        print(f"Held-out calibration error {ece:.3f}", file=log)
+        for field, temperature in zip(fields, temperatures):
+            stats = report[field]
+            if stats["labelled"] or stats["accepted"]:
+                precision = stats["correct"] / stats["accepted"] if stats["accepted"] else 0.0
+                print(f"  {field:26s} T={temperature:5.2f}  labelled {stats['labelled']:5d}  "
+                      f"accepted {stats['accepted']:5d}  precision {precision:.3f}", file=log)
+
+    model = fit(examples, fields, classes, sizes, temperatures)
+    model.save(model_path)
+    print(f"Saved {model_path}: {len(model.vocab)} features x {len(model.classes)} classes", file=log)
+    return model
+
+class TranscriptLog:
+    """
+    Appends one JSON line per finished conversation: each customer turn
+    with the field being asked, the values that turn contributed to the
+    final facts and the reasoning given for them. Training input for the
+    classifier.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def write(self, turns, final_data, decision=None):
+        logged = []
+        for turn in turns:
+            kept = {field: value for field, value in turn["extractions"].items()
+                    if field in final_data and final_data[field]["value"] == value}
+            reasoning = {field: text for field, text in turn.get("reasoning", {}).items() if field in kept}
+            logged.append({"message": turn["message"], "field_asked": turn["field_asked"],
+                           "extractions": kept, "reasoning": reasoning})
+        line = json.dumps({"turns": logged, "decision": decision})
+        with self.lock:
+            with open(self.path, "a") as f:
+                f.write(line + "\n")
+
+_classifier = None
+_classifier_loaded = False
+_transcript_log = None
+_load_lock = threading.Lock()
+
+def get_field_classifier():
+    """
+    Process-wide classifier from FIELD_CLASSIFIER_MODEL, or None if there
+    is no usable model. An unreadable, corrupt or incompatible model file
+    is reported once and conversations carry on without the classifier.
+    """
+    global _classifier, _classifier_loaded
+    with _load_lock:
+        if not _classifier_loaded:
+            _classifier_loaded = True
+            try:
+                _classifier = FieldClassifier.load(FIELD_CLASSIFIER_MODEL)
+            except FileNotFoundError:
+                _classifier = None
+            except (OSError, EOFError, KeyError, ValueError, zipfile.BadZipFile) as e:
+                print(f"Field classifier disabled: could not load {FIELD_CLASSIFIER_MODEL} ({e})")
+                _classifier = None
+        return _classifier
+
+def get_transcript_log():
+    """Process-wide transcript log, or None when TRANSCRIPT_LOG is unset"""
+    global _transcript_log
+    with _load_lock:
+        if _transcript_log is None and TRANSCRIPT_LOG:
+            _transcript_log = TranscriptLog(TRANSCRIPT_LOG)
+        return _transcript_log
+
+def benchmark(model_path=FIELD_CLASSIFIER_MODEL, messages=None, rounds=2000):
+    """Load time and per-message inference time"""
+    started = time.perf_counter()
+    model = FieldClassifier.load(model_path)
+    load_ms = (time.perf_counter() - started) * 1000
+    messages = messages or ["My headphones arrived broken and I want my money back",
+                            "yes", "I paid with a gift card last month", "it never showed up"]
+    started = time.perf_counter()
+    for i in range(rounds):
+        model.predict(messages[i % len(messages)], "item_condition")
+    per_message_us = (time.perf_counter() - started) / rounds * 1e6
+    print(f"Load {load_ms:.1f}ms; inference {per_message_us:.0f}us per message "
+          f"({len(model.vocab)} features, {len(model.classes)} classes)")
+
+def main(argv=None):
+    """python field_classifier.py train TRANSCRIPTS.jsonl [...] [--model PATH]
+    python field_classifier.py predict "message" [--asked FIELD] [--model PATH]
+    python field_classifier.py bench [--model PATH]"""
+    argv = sys.argv[1:] if argv is None else argv
+    model_path = FIELD_CLASSIFIER_MODEL
+    if "--model" in argv:
+        position = argv.index("--model")
+        model_path = argv[position + 1]
+        argv = argv[:position] + argv[position + 2:]
+    field_asked = None
+    if "--asked" in argv:
+        position = argv.index("--asked")
+        field_asked = argv[position + 1]
+        argv = argv[:position] + argv[position + 2:]
+
+    if len(argv) >= 2 and argv[0] == "train":
+        train(argv[1:], model_path)
+    elif len(argv) == 2 and argv[0] == "predict":
+        model = FieldClassifier.load(model_path)
+        print(json.dumps(model.predict(argv[1], field_asked), indent=2))
+    elif argv == ["bench"]:
+        benchmark(model_path)
+    else:
+        print(main.__doc__)
+        return 2
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
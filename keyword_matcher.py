@@ -0,0 +1,196 @@
+# Local fast-path extraction: one Aho-Corasick automaton over every keyword vocabulary
+import re
+from collections import deque
+
+from decision_nodes import DECISION_NODES, ITEM_CATEGORY_KEYWORDS, KEYWORD_MAPPINGS
+
+# Node values too generic to mean anything on their own
+AMBIGUOUS_VALUES = {"unknown", "yes", "no", "issues"}
+
+# Same normalization try_direct_keyword_match applies to seller_type
+VALUE_ALIASES = {"seller_type": {"direct": "inhouse", "third party": "thirdparty"}}
+
+NEGATION_WORDS = {"not", "never", "no", "without", "didn't", "don't", "doesn't",
+                  "isn't", "wasn't", "hasn't", "haven't", "won't", "can't", "nothing"}
+NEGATION_WINDOW = 3  # words before a phrase that can negate it
+CLAUSE_BREAK = re.compile(r"[,.;:!?]")  # negation does not reach past these
+
+VALUE_NAME_CONFIDENCE = 0.90
+MAPPING_CONFIDENCE = 0.85
+# KEYWORD_MAPPINGS phrases that mean something else out of context ("old",
+# "seller", "missing"): only an answer for the field being asked, otherwise
+# a hint the LLM confirms. "broken" or "last week" stand on their own.
+AMBIGUOUS_MAPPINGS = {
+    "seller_type": {"official", "seller", "vendor", "partner", "unknown", "not sure", "don't know", "unsure"},
+    "payment_method": {"credit", "debit", "prepaid"},
+    "return_window": {"within", "recent", "recently", "expired", "long time", "old", "while ago"},
+    "item_condition": {"wrong", "incorrect", "different", "don't want", "don't need"},
+    "delivery_status": {"delivered", "received", "got it", "missing"}
+}
+UNASKED_MAPPING_CONFIDENCE = 0.60
+ITEM_CONFIDENCE = 0.85
+CONFLICT_PENALTY = 0.15
+
+# Phrases that only look like vocabulary ("of course" is no online course);
+# matched so they swallow the keyword inside them, but they mean nothing
+NON_VOCABULARY_PHRASES = ["of course", "in due course", "course of"]
+
+WORD_PATTERN = re.compile(r"[a-z0-9']+")
+
+class AhoCorasick:
+    """Multi-pattern matcher reporting every (start, end, payload) occurrence"""
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for pattern, payload in patterns:
+            state = 0
+            for char in pattern:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.output[state].append((len(pattern), payload))
+
+        # Breadth-first failure links; outputs inherit from their fail state
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                self.output[next_state] = self.output[next_state] + self.output[self.fail[next_state]]
+
+    def find_all(self, text):
+        state = 0
+        for position, char in enumerate(text):
+            while state and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+            for length, payload in self.output[state]:
+                yield position + 1 - length, position + 1, payload
+
+class KeywordMatcher:
+    """
+    Compiled from DECISION_NODES values and keywords, ITEM_CATEGORY_KEYWORDS
+    and KEYWORD_MAPPINGS. Produces field/value/confidence extractions plus
+    the set of fields a message mentions, without calling the LLM.
+    """
+
+    def __init__(self):
+        phrases = {}
+
+        def add(phrase, field, value, confidence, source):
+            phrase = phrase.lower().strip()
+            if value is not None and value not in DECISION_NODES[field]["values"]:
+                value = None  # still tells us the field was mentioned
+            phrases.setdefault(phrase, []).append((field, value, confidence, source))
+
+        for phrase in NON_VOCABULARY_PHRASES:
+            phrases.setdefault(phrase, [])
+
+        for field, node_info in DECISION_NODES.items():
+            for value in node_info["values"]:
+                if value not in AMBIGUOUS_VALUES:
+                    add(value.replace("_", " "), field, value, VALUE_NAME_CONFIDENCE, "value name")
+            for keyword in node_info.get("keywords", []):
+                add(keyword, field, None, 0.0, "node keyword")
+
+        for field, mappings in KEYWORD_MAPPINGS.items():
+            for value, keywords in mappings.items():
+                value = VALUE_ALIASES.get(field, {}).get(value, value)
+                for keyword in keywords:
+                    source = "ambiguous mapping" if keyword in AMBIGUOUS_MAPPINGS.get(field, ()) else "keyword mapping"
+                    add(keyword, field, value, MAPPING_CONFIDENCE, source)
+
+        for keyword, category in ITEM_CATEGORY_KEYWORDS.items():
+            add(keyword, "item_category", category, ITEM_CONFIDENCE, "item keyword")
+
+        self.automaton = AhoCorasick(phrases.items())
+
+    def match(self, text):
+        """
+        Non-overlapping whole-word phrase matches, leftmost-longest first,
+        so "not delivered" wins over the "delivered" inside it
+        """
+        text = text.lower()
+        candidates = []
+        for start, end, entries in self.automaton.find_all(text):
+            if start > 0 and text[start - 1].isalnum():
+                continue
+            if end < len(text) and text[end].isalnum():
+                continue
+            candidates.append((start, end, entries))
+
+        candidates.sort(key=lambda m: (m[0], -(m[1] - m[0])))
+        matches = []
+        covered_until = 0
+        for start, end, entries in candidates:
+            if start >= covered_until:
+                matches.append((start, end, entries))
+                covered_until = end
+        return text, matches
+
+    def matched_phrases(self, text):
+        """Frozen set of vocabulary phrases found in text"""
+        text, matches = self.match(text)
+        return frozenset(text[start:end] for start, end, _ in matches)
+
+    def extract(self, text, field_asked=None, all_mappings=False):
+        """
+        Returns (extractions, mentioned_fields). Extractions use the same
+        {"value", "confidence", "reasoning"} shape as the LLM path.
+        KEYWORD_MAPPINGS hits score MAPPING_CONFIDENCE, except that
+        AMBIGUOUS_MAPPINGS phrases score UNASKED_MAPPING_CONFIDENCE outside
+        field_asked (unless all_mappings), so they never settle an unasked
+        field on their own.
+        """
+        text, matches = self.match(text)
+        mentioned = set()
+        votes = {}
+
+        for start, end, entries in matches:
+            phrase = text[start:end]
+            negated = self._is_negated(text, start, phrase)
+            for field, value, confidence, source in entries:
+                mentioned.add(field)
+                if value is None or negated:
+                    continue
+                if source == "ambiguous mapping" and not all_mappings and field != field_asked:
+                    confidence = UNASKED_MAPPING_CONFIDENCE
+                best = votes.setdefault(field, {})
+                if confidence > best.get(value, (0, ""))[0]:
+                    best[value] = (confidence, f"Matched '{phrase}' ({source})")
+
+        extractions = {}
+        for field, values in votes.items():
+            ranked = sorted(values.items(), key=lambda item: -item[1][0])
+            value, (confidence, reasoning) = ranked[0]
+            if len(ranked) > 1:
+                # Competing values for one field: only trust a clear winner
+                if ranked[1][1][0] >= confidence:
+                    continue
+                confidence -= CONFLICT_PENALTY
+            extractions[field] = {
+                "value": value,
+                "confidence": round(confidence, 2),
+                "reasoning": reasoning
+            }
+        return extractions, mentioned
+
+    def _is_negated(self, text, start, phrase):
+        """A negation word shortly before the phrase flips its meaning"""
+        if any(word in NEGATION_WORDS for word in WORD_PATTERN.findall(phrase)):
+            return False  # the phrase already carries its own negation
+        preceding = CLAUSE_BREAK.split(text[max(0, start - 40):start])[-1]
+        preceding = WORD_PATTERN.findall(preceding)
+        return any(word in NEGATION_WORDS for word in preceding[-NEGATION_WINDOW:])
+
+KEYWORD_MATCHER = KeywordMatcher()
@@ -0,0 +1,285 @@
+# LLM backends: OpenAI, a deterministic offline stub, and record/replay keyed by prompt hash
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from types import SimpleNamespace
+
+from decision_nodes import DECISION_NODES
+from decision_brute_force import get_field_question_info
+from keyword_matcher import KEYWORD_MATCHER
+from config import (
+    OPENAI_API_KEY, OPENAI_BASE_URL, LLM_TIMEOUT, LLM_BACKEND, LLM_RECORD_FILE,
+    STUB_LATENCY, STUB_TOKEN_DELAY, LLM_GUARD
+)
+
+class ReplayMissError(LookupError):
+    """Replay backend has no recording for a request"""
+
+def make_response(content, prompt_tokens=0, completion_tokens=0, cached_tokens=0):
+    """
+    What every backend returns: .content plus an OpenAI-shaped .usage
+    """
+    return SimpleNamespace(
+        content=content,
+        usage=SimpleNamespace(
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            total_tokens=prompt_tokens + completion_tokens,
+            prompt_tokens_details=SimpleNamespace(cached_tokens=cached_tokens)
+        )
+    )
+
+def request_key(request):
+    """Prompt hash: SHA-256 over the parts of a request that shape the reply"""
+    keyed = {name: request.get(name) for name in
+             ("model", "messages", "temperature", "max_tokens", "response_format")}
+    return hashlib.sha256(json.dumps(keyed, sort_keys=True).encode("utf-8")).hexdigest()
+
+def split_words(content):
+    """Word-sized stream deltas that join back to content"""
+    return re.findall(r"\S+\s*|\s+", content)
+
+class LLMBackend(ABC):
+    """
+    Interface for chat completions. `request` is the keyword dict for
+    chat.completions.create (model, messages, temperature, ...).
+      chat(request, timeout)          -> response (.content, .usage)
+      chat_async(request, timeout)    -> response, awaitable and cancellable
+      stream(request, stall_timeout)  -> iterator of content deltas
+    """
+    name = "base"
+
+    @abstractmethod
+    def chat(self, request, timeout=LLM_TIMEOUT):
+        """One completion"""
+
+    @abstractmethod
+    async def chat_async(self, request, timeout=LLM_TIMEOUT):
+        """One completion, without blocking the event loop"""
+
+    @abstractmethod
+    def stream(self, request, stall_timeout=LLM_TIMEOUT):
+        """Content deltas as they arrive"""
+
+class OpenAIBackend(LLMBackend):
+    """The OpenAI API (or any compatible server at OPENAI_BASE_URL)"""
+    name = "openai"
+
+    def __init__(self, max_retries=2):
+        import openai
+        # One pooled sync client per process; async calls use llm_client's
+        self.client = openai.OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL, max_retries=max_retries)
+
+    def chat(self, request, timeout=LLM_TIMEOUT):
+        response = self.client.chat.completions.create(timeout=timeout, **request)
+        return self._to_response(response)
+
+    async def chat_async(self, request, timeout=LLM_TIMEOUT):
+        from llm_client import chat_completion_async
+        response = await chat_completion_async(timeout=timeout, **request)
+        return self._to_response(response)
+
+    def stream(self, request, stall_timeout=LLM_TIMEOUT):
+        # The timeout doubles as the read timeout between streamed chunks
+        stream = self.client.with_options(timeout=stall_timeout, max_retries=0).chat.completions.create(
+            stream=True, **request
+        )
+        try:
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            stream.close()  # release the connection, stalled or not
+
+    def _to_response(self, response):
+        usage = response.usage
+        details = getattr(usage, "prompt_tokens_details", None)
+        return make_response(
+            response.choices[0].message.content,
+            getattr(usage, "prompt_tokens", 0) or 0,
+            getattr(usage, "completion_tokens", 0) or 0,
+            getattr(details, "cached_tokens", 0) or 0
+        )
+
+class StubBackend(LLMBackend):
+    """
+    Deterministic, offline stand-in. Extraction requests are answered by
+    the keyword matcher (plus template questions when the prompt asks for
+    drafted questions); question requests get the get_field_question_info
+    template for the field the prompt is about. `latency` is added per
+    call and `token_delay` between streamed words for realistic load tests.
+    """
+    name = "stub"
+
+    # Which field a smart-question prompt asks about
+    QUESTION_PATTERNS = [
+        (re.compile(r"asking when they purchased"), "return_window"),
+        (re.compile(r"asking how they paid"), "payment_method"),
+        (re.compile(r"bought from us directly or a marketplace"), "seller_type"),
+        (re.compile(r"question to ask about: (\w+)"), None),
+    ]
+
+    def __init__(self, latency=STUB_LATENCY, token_delay=STUB_TOKEN_DELAY):
+        self.latency = latency
+        self.token_delay = token_delay
+
+    def reply(self, request):
+        """Reply text for a request; the same request always gets the same text"""
+        prompt = request["messages"][-1]["content"]
+        if (request.get("response_format") or {}).get("type") == "json_object":
+            match = re.search(r'Customer message: "(.*)"\n', prompt)
+            extractions, _ = KEYWORD_MATCHER.extract(match.group(1) if match else prompt, all_mappings=True)
+            reply = {"extractions": extractions}
+            if '"questions"' in prompt:
+                reply["questions"] = {
+                    field: get_field_question_info(field)["question"]
+                    for field in DECISION_NODES if f"\n{field}: " in prompt
+                }
+            return json.dumps(reply)
+
+        for pattern, field in self.QUESTION_PATTERNS:
+            match = pattern.search(prompt)
+            if match:
+                field = field or match.group(1)
+                return get_field_question_info(field)["question"]
+        return "Could you tell me a bit more about your request?"
+
+    def _response(self, request, content):
+        prompt_chars = sum(len(m["content"]) for m in request["messages"])
+        return make_response(content, (prompt_chars + 3) // 4, (len(content) + 3) // 4)
+
+    def chat(self, request, timeout=LLM_TIMEOUT):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._response(request, self.reply(request))
+
+    async def chat_async(self, request, timeout=LLM_TIMEOUT):
+        if self.latency:
+            await asyncio.wait_for(asyncio.sleep(self.latency), timeout)
+        return self._response(request, self.reply(request))
+
+    def stream(self, request, stall_timeout=LLM_TIMEOUT):
+        if self.latency:
+            time.sleep(self.latency)
+        for word in split_words(self.reply(request)):
+            yield word
+            if self.token_delay:
+                time.sleep(self.token_delay)
+
+class RecordReplayBackend(LLMBackend):
+    """
+    Record mode passes requests to `inner` and appends each reply to a
+    JSONL file under its prompt hash. Replay mode answers only from that
+    file and raises ReplayMissError for anything not recorded, so a
+    replayed run is offline and byte-for-byte reproducible.
+    """
+
+    def __init__(self, path=LLM_RECORD_FILE, mode="replay", inner=None):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"mode must be 'record' or 'replay', not {mode!r}")
+        self.name = mode
+        self.path = path
+        self.mode = mode
+        self.inner = inner
+        if mode == "record" and inner is None:
+            self.inner = OpenAIBackend()
+        self.lock = threading.Lock()
+        self.recordings = {}
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self.recordings[entry["key"]] = entry
+
+    def _lookup(self, request):
+        entry = self.recordings.get(request_key(request))
+        if entry is None:
+            raise ReplayMissError(f"no recording for request {request_key(request)[:12]}")
+        return make_response(entry["content"], **entry.get("usage", {}))
+
+    def _record(self, request, response):
+        entry = {
+            "key": request_key(request),
+            "model": request.get("model"),
+            "content": response.content,
+            "usage": {
+                "prompt_tokens": response.usage.prompt_tokens,
+                "completion_tokens": response.usage.completion_tokens,
+                "cached_tokens": response.usage.prompt_tokens_details.cached_tokens
+            }
+        }
+        with self.lock:
+            if self.recordings.get(entry["key"]) == entry:
+                return response  # same prompt, same reply: nothing new to store
+            self.recordings[entry["key"]] = entry
+            with open(self.path, "a") as f:
+                f.write(json.dumps(entry) + "\n")
+        return response
+
+    def chat(self, request, timeout=LLM_TIMEOUT):
+        if self.mode == "replay":
+            return self._lookup(request)
+        return self._record(request, self.inner.chat(request, timeout))
+
+    async def chat_async(self, request, timeout=LLM_TIMEOUT):
+        if self.mode == "replay":
+            return self._lookup(request)
+        return self._record(request, await self.inner.chat_async(request, timeout))
+
+    def stream(self, request, stall_timeout=LLM_TIMEOUT):
+        if self.mode == "replay":
+            yield from split_words(self._lookup(request).content)
+            return
+        deltas = []
+        for delta in self.inner.stream(request, stall_timeout):
+            deltas.append(delta)
+            yield delta
+        # Only complete streams are recorded; a stall raises before this
+        self._record(request, make_response("".join(deltas)))
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def create_backend(name, guarded=LLM_GUARD):
+    """
+    Backend for a config name: openai, stub, record or replay. Unless
+    guarded is False it is wrapped in llm_guard's latency budgets,
+    hedging and circuit breaker. Record and replay never are: a replay
+    miss is not an outage to retry or trip the breaker on, and hedging
+    while recording would pay for duplicate requests.
+    """
+    if name in ("record", "replay"):
+        guarded = False
+    if name == "openai":
+        # The guard does its own retrying within the call's budget
+        backend = OpenAIBackend(max_retries=0 if guarded else 2)
+    elif name == "stub":
+        backend = StubBackend()
+    elif name in ("record", "replay"):
+        backend = RecordReplayBackend(LLM_RECORD_FILE, name)
+    else:
+        raise ValueError(f"Unknown LLM_BACKEND {name!r} (expected openai, stub, record or replay)")
+    if guarded:
+        from llm_guard import GuardedBackend
+        backend = GuardedBackend(backend)
+    return backend
+
+def get_llm_backend():
+    """Process-wide backend selected by LLM_BACKEND"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend(LLM_BACKEND)
+        return _backend
+
+def set_llm_backend(backend):
+    """Swap the process-wide backend (benchmarks, regression runs)"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
@@ -0,0 +1,79 @@
+# Shared async OpenAI client: one pooled connection per process, per-call timeouts, jittered retries
+import asyncio
+import random
+
+import openai
+
+from config import (
+    OPENAI_API_KEY, OPENAI_BASE_URL, LLM_TIMEOUT, LLM_MAX_RETRIES, LLM_BACKOFF_BASE, LLM_BACKOFF_MAX
+)
+
+# Responses worth retrying; anything else (400, 401, ...) fails immediately
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+_client = None
+_client_loop = None
+
+def get_async_client():
+    """
+    Process-wide AsyncOpenAI client. Its connection pool belongs to the
+    event loop it was first used on, so a new loop gets a fresh client.
+    The SDK's own retries are off; chat_completion_async handles them.
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        _client = openai.AsyncOpenAI(
+            api_key=OPENAI_API_KEY,
+            base_url=OPENAI_BASE_URL,
+            timeout=LLM_TIMEOUT,
+            max_retries=0
+        )
+        _client_loop = loop
+    return _client
+
+async def close_async_client():
+    """Close the shared client's connections (call before the loop exits)"""
+    global _client, _client_loop
+    if _client is not None:
+        await _client.close()
+    _client = None
+    _client_loop = None
+
+def retry_delay(attempt, retry_after=None):
+    """
+    Full-jitter exponential backoff: uniform in [0, base * 2^attempt],
+    capped at LLM_BACKOFF_MAX. A server Retry-After wins when present.
+    """
+    if retry_after is not None:
+        return min(retry_after, LLM_BACKOFF_MAX)
+    return random.uniform(0, min(LLM_BACKOFF_MAX, LLM_BACKOFF_BASE * 2 ** attempt))
+
+def _retry_after(error):
+    """Seconds from a Retry-After header, if the server sent one"""
+    try:
+        return float(error.response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+async def chat_completion_async(timeout=LLM_TIMEOUT, max_retries=LLM_MAX_RETRIES, **request):
+    """
+    chat.completions.create on the shared client. Each attempt gets its
+    own timeout; 429/5xx responses, timeouts and connection errors are
+    retried with backoff. Cancelling the calling task aborts the request
+    in flight (or the backoff sleep) straight away.
+    """
+    client = get_async_client()
+    for attempt in range(max_retries + 1):
+        retry_after = None
+        try:
+            return await client.chat.completions.create(timeout=timeout, **request)
+        except openai.APIStatusError as e:
+            if e.status_code not in RETRY_STATUS_CODES or attempt == max_retries:
+                raise
+            retry_after = _retry_after(e)
+        except openai.APIConnectionError:
+            # Includes APITimeoutError
+            if attempt == max_retries:
+                raise
+        await asyncio.sleep(retry_delay(attempt, retry_after))
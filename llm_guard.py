@@ -0,0 +1,370 @@
+# Latency budgets, hedged requests and a circuit breaker around an LLM backend
+import asyncio
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from llm_backends import LLMBackend
+from llm_metering import record_attempt
+from config import (
+    LLM_TIMEOUT, LLM_EXTRACTION_BUDGET, LLM_QUESTION_BUDGET, LLM_HEDGE_DELAY, LLM_HEDGE_QUANTILE,
+    LLM_MAX_ATTEMPTS, LLM_GUARD_WORKERS, BREAKER_WINDOW, BREAKER_MIN_CALLS, BREAKER_FAILURE_RATE,
+    BREAKER_SLOW_CALL, BREAKER_COOLDOWN
+)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    """Thread pool for sync attempts, shared by every guarded backend"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=LLM_GUARD_WORKERS, thread_name_prefix="llm")
+        return _executor
+
+class CircuitOpenError(RuntimeError):
+    """The breaker is open: the LLM is not being called"""
+
+class CircuitBreaker:
+    """
+    Closed: calls go through and each outcome is recorded; once at least
+    min_calls of the last `window` calls exist and failure_rate of them
+    failed or took longer than slow_call seconds, the breaker opens.
+    Open: calls are refused until `cooldown` has passed. Half-open: one
+    probe call is let through; success closes the breaker, failure opens
+    it for another cooldown.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, window=BREAKER_WINDOW, min_calls=BREAKER_MIN_CALLS, failure_rate=BREAKER_FAILURE_RATE,
+                 slow_call=BREAKER_SLOW_CALL, cooldown=BREAKER_COOLDOWN, clock=time.monotonic):
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.cooldown = cooldown
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.state = self.CLOSED
+        self.outcomes = deque(maxlen=window)  # True = failed or slow
+        self.opened_at = None
+        self.probe_in_flight = False
+        self.stats = {"trips": 0, "rejected": 0, "successes": 0, "failures": 0, "slow": 0, "probes": 0}
+
+    def allow(self):
+        """Whether a call may go out now; in half-open, the caller becomes the probe"""
+        with self.lock:
+            if self.state == self.OPEN and self.clock() - self.opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self.probe_in_flight = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self.probe_in_flight:
+                self.probe_in_flight = True
+                self.stats["probes"] += 1
+                return True
+            self.stats["rejected"] += 1
+            return False
+
+    def record(self, ok, latency):
+        """Outcome of a call allow() let through"""
+        with self.lock:
+            slow = ok and latency > self.slow_call
+            failed = not ok or slow
+            self.stats["successes" if ok else "failures"] += 1
+            self.stats["slow"] += slow
+            if self.state == self.HALF_OPEN:
+                self.probe_in_flight = False
+                if failed:
+                    self._trip()
+                else:
+                    self.state = self.CLOSED
+                    self.outcomes.clear()
+            elif self.state == self.CLOSED:
+                self.outcomes.append(failed)
+                if (len(self.outcomes) >= self.min_calls and
+                        sum(self.outcomes) / len(self.outcomes) >= self.failure_rate):
+                    self._trip()
+            # Open: a call started before the trip finished late; nothing to decide
+
+    def release(self):
+        """A let-through call ended without a verdict (caller gave up); free the probe slot"""
+        with self.lock:
+            self.probe_in_flight = False
+
+    def _trip(self):
+        self.state = self.OPEN
+        self.opened_at = self.clock()
+        self.outcomes.clear()
+        self.stats["trips"] += 1
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["state"] = self.state
+            stats["window_failure_rate"] = sum(self.outcomes) / len(self.outcomes) if self.outcomes else 0.0
+            stats["open_for"] = self.clock() - self.opened_at if self.state == self.OPEN else 0.0
+        return stats
+
+class GuardedBackend(LLMBackend):
+    """
+    Wraps another backend. Every call has a latency budget (extraction or
+    question, by request shape) covering all of its attempts. A second
+    request is raced against the first once it has run longer than the
+    LLM_HEDGE_QUANTILE of recent latencies, or straight away if the first
+    fails; the first good answer wins. While the breaker is open calls
+    raise CircuitOpenError at once, so callers go straight to their
+    template question / keyword-only fallbacks.
+
+    The caller's metered_call accounts for the answer (or the error) it
+    gets back; every other attempt is billed too, so each is metered here
+    with llm_metering.record_attempt.
+    """
+
+    def __init__(self, inner, breaker=None, extraction_budget=LLM_EXTRACTION_BUDGET,
+                 question_budget=LLM_QUESTION_BUDGET, hedge_delay=LLM_HEDGE_DELAY,
+                 max_attempts=LLM_MAX_ATTEMPTS):
+        self.inner = inner
+        self.name = inner.name
+        self.breaker = breaker or CircuitBreaker()
+        self.extraction_budget = extraction_budget
+        self.question_budget = question_budget
+        self.hedge_delay = hedge_delay
+        self.max_attempts = max_attempts
+        self.latencies = deque(maxlen=200)
+        self.lock = threading.Lock()
+        self.stats = {"calls": 0, "hedges": 0, "hedge_wins": 0, "retries": 0, "over_budget": 0,
+                      "short_circuited": 0}
+
+    def budget(self, request, timeout):
+        extraction = (request.get("response_format") or {}).get("type") == "json_object"
+        return min(timeout, self.extraction_budget if extraction else self.question_budget)
+
+    def hedge_after(self):
+        """Seconds to wait on an attempt before racing another"""
+        with self.lock:
+            if len(self.latencies) < 20:
+                return self.hedge_delay
+            ordered = sorted(self.latencies)
+        return ordered[min(int(len(ordered) * LLM_HEDGE_QUANTILE), len(ordered) - 1)]
+
+    def _count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def _admit(self):
+        self._count("calls")
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            raise CircuitOpenError("LLM circuit breaker is open")
+
+    def _succeeded(self, started, attempt):
+        latency = time.monotonic() - started
+        with self.lock:
+            self.latencies.append(latency)
+            if attempt > 0:
+                self.stats["hedge_wins"] += 1
+        self.breaker.record(True, latency)
+
+    def _failed(self, started, error, budget):
+        self.breaker.record(False, time.monotonic() - started)
+        if error is None:
+            self._count("over_budget")
+            raise TimeoutError(f"LLM call exceeded its {budget:.1f}s budget")
+        raise error
+
+    def chat(self, request, timeout=LLM_TIMEOUT):
+        self._admit()
+        try:
+            return self._chat(request, timeout)
+        except BaseException:
+            self.breaker.release()
+            raise
+
+    def _chat(self, request, timeout):
+        budget = self.budget(request, timeout)
+        started = time.monotonic()
+        deadline = started + budget
+        attempts = {}  # future -> attempt number
+        launched = {}  # future -> start time
+        failures = {}  # future -> (error, seconds)
+        outcome = None  # the attempt the caller's metered_call accounts for
+        error = None
+
+        def launch():
+            remaining = max(deadline - time.monotonic(), 0.01)
+            future = _get_executor().submit(self.inner.chat, request, remaining)
+            attempts[future] = len(attempts)
+            launched[future] = time.monotonic()
+
+        launch()
+        next_hedge = started + self.hedge_after()
+        pending = set(attempts)
+        try:
+            while pending:
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                wake = deadline
+                if len(attempts) < self.max_attempts:
+                    wake = min(wake, next_hedge)
+                done, pending = wait(pending, timeout=max(wake - now, 0), return_when=FIRST_COMPLETED)
+                failed = False
+                for future in done:
+                    try:
+                        response = future.result()
+                    except Exception as e:
+                        error = e
+                        failures[future] = (e, time.monotonic() - launched[future])
+                        failed = True
+                        continue
+                    self._succeeded(started, attempts[future])
+                    outcome = future
+                    return response
+                if len(attempts) < self.max_attempts and time.monotonic() < deadline:
+                    if failed:
+                        self._count("retries")
+                    elif time.monotonic() >= next_hedge:
+                        self._count("hedges")
+                    else:
+                        continue
+                    launch()
+                    pending = {future for future in attempts if not future.done()}
+                    next_hedge = time.monotonic() + self.hedge_after()
+        finally:
+            if outcome is None and not pending and failures:
+                outcome = list(failures)[-1]  # its error is what the caller sees
+            self._meter_other_attempts(request, launched, failures, outcome)
+        self._failed(started, error if not pending else None, budget)
+
+    async def chat_async(self, request, timeout=LLM_TIMEOUT):
+        self._admit()
+        try:
+            return await self._chat_async(request, timeout)
+        except BaseException:
+            self.breaker.release()
+            raise
+
+    async def _chat_async(self, request, timeout):
+        budget = self.budget(request, timeout)
+        loop = asyncio.get_running_loop()
+        started = time.monotonic()
+        deadline = started + budget
+        attempts = {}
+        launched = {}
+        failures = {}
+        outcome = None
+        error = None
+
+        def launch():
+            remaining = max(deadline - time.monotonic(), 0.01)
+            task = loop.create_task(self.inner.chat_async(request, remaining))
+            attempts[task] = len(attempts)
+            launched[task] = time.monotonic()
+
+        launch()
+        next_hedge = started + self.hedge_after()
+        pending = set(attempts)
+        try:
+            while pending:
+                now = time.monotonic()
+                if now >= deadline:
+                    break
+                wake = deadline
+                if len(attempts) < self.max_attempts:
+                    wake = min(wake, next_hedge)
+                done, pending = await asyncio.wait(pending, timeout=max(wake - now, 0),
+                                                   return_when=asyncio.FIRST_COMPLETED)
+                failed = False
+                for task in done:
+                    if task.cancelled() or task.exception() is not None:
+                        error = None if task.cancelled() else task.exception()
+                        failures[task] = (error, time.monotonic() - launched[task])
+                        failed = True
+                        continue
+                    self._succeeded(started, attempts[task])
+                    outcome = task
+                    return task.result()
+                if len(attempts) < self.max_attempts and time.monotonic() < deadline:
+                    if failed:
+                        self._count("retries")
+                    elif time.monotonic() >= next_hedge:
+                        self._count("hedges")
+                    else:
+                        continue
+                    launch()
+                    pending = {task for task in attempts if not task.done()}
+                    next_hedge = time.monotonic() + self.hedge_after()
+        finally:
+            if outcome is None and not pending and failures:
+                outcome = list(failures)[-1]
+            # Losing and unfinished attempts are really cancelled here
+            for task, launched_at in launched.items():
+                if task is outcome:
+                    continue
+                seconds = time.monotonic() - launched_at
+                if task in failures:
+                    failed_with, seconds = failures[task]
+                    record_attempt(request, seconds, error=failed_with)
+                elif task.done() and not task.cancelled():
+                    record_attempt(request, seconds, response=task.result())
+                else:
+                    task.cancel()
+                    record_attempt(request, seconds)  # prompt sent, answer abandoned
+        self._failed(started, error if not pending else None, budget)
+
+    def _meter_other_attempts(self, request, launched, failures, outcome):
+        """
+        record_attempt for every sync attempt except outcome. One still
+        running cannot be stopped, so it is metered when it finishes.
+        """
+        for future, launched_at in launched.items():
+            if future is outcome:
+                continue
+            if future in failures:
+                failed_with, seconds = failures[future]
+                record_attempt(request, seconds, error=failed_with)
+            elif future.done():
+                record_attempt(request, time.monotonic() - launched_at, response=future.result())
+            elif not future.cancel():
+                # Runs on the worker thread: keep this session, turn and site
+                context = contextvars.copy_context()
+
+                def finished(future, launched_at=launched_at, context=context):
+                    error = future.exception()
+                    context.run(record_attempt, request, time.monotonic() - launched_at,
+                                None if error else future.result(), error)
+
+                future.add_done_callback(finished)
+
+    def stream(self, request, stall_timeout=LLM_TIMEOUT):
+        """
+        Not hedged (the caller is already showing tokens); a stream counts
+        as slow when its first token takes longer than slow_call
+        """
+        self._admit()
+        started = time.monotonic()
+        first_token = None
+        try:
+            for delta in self.inner.stream(request, stall_timeout):
+                if first_token is None:
+                    first_token = time.monotonic() - started
+                yield delta
+        except GeneratorExit:
+            self.breaker.release()  # consumer stopped reading; says nothing about the LLM
+            raise
+        except Exception:
+            self.breaker.record(False, time.monotonic() - started)
+            raise
+        self.breaker.record(True, first_token if first_token is not None else time.monotonic() - started)
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats["hedge_after"] = self.hedge_after()
+        stats["breaker"] = self.breaker.get_stats()
+        return stats
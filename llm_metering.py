@@ -0,0 +1,274 @@
+# Token, cost and latency metering per LLM call, labelled by call site, model, session and turn
+import contextvars
+import itertools
+import threading
+import time
+
+from prompt_builder import estimate_tokens
+from config import LLM_PRICES
+
+# Upper bounds for Prometheus histograms
+DURATION_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0]
+SESSION_COST_BUCKETS = [0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05]
+SESSION_TOKEN_BUCKETS = [500, 1000, 2500, 5000, 10000, 25000, 50000]
+
+# The session and turn the current code is running for; set per turn by
+# ConversationManager and copied into prefetch threads
+_current_session = contextvars.ContextVar("llm_meter_session", default=None)
+# Call site of the enclosing metered_call, for attempts a guard adds to it
+_current_site = contextvars.ContextVar("llm_meter_site", default=None)
+_session_ids = itertools.count(1)
+
+def call_cost(model, prompt_tokens, cached_tokens, completion_tokens):
+    """USD for one call at LLM_PRICES; 0 for models without a price"""
+    prices = LLM_PRICES.get(model)
+    if prices is None:
+        return 0.0
+    prompt_price, cached_price, completion_price = prices
+    return ((prompt_tokens - cached_tokens) * prompt_price + cached_tokens * cached_price +
+            completion_tokens * completion_price) / 1e6
+
+class Histogram:
+    """Cumulative-bucket histogram in Prometheus terms"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def prometheus_lines(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + ["+Inf"], self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {cumulative}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {self.sum:.6f}")
+        lines.append(f"{name}_count{suffix} {self.count}")
+        return lines
+
+def _new_totals():
+    return {"calls": 0, "errors": 0, "estimated": 0, "prompt_tokens": 0, "cached_tokens": 0,
+            "completion_tokens": 0, "cost_usd": 0.0, "seconds": 0.0}
+
+def _add(totals, call):
+    totals["calls"] += 1
+    totals["errors"] += not call["ok"]
+    totals["estimated"] += call["estimated"]
+    totals["prompt_tokens"] += call["prompt_tokens"]
+    totals["cached_tokens"] += call["cached_tokens"]
+    totals["completion_tokens"] += call["completion_tokens"]
+    totals["cost_usd"] += call["cost_usd"]
+    totals["seconds"] += call["seconds"]
+
+class SessionMeter:
+    """LLM usage of one conversation, in total, per turn and per call site"""
+
+    def __init__(self, session_id=None):
+        self.session_id = session_id or f"s{next(_session_ids)}"
+        self.turn = 0
+        self.lock = threading.Lock()
+        self.totals = _new_totals()
+        self.turns = {}   # turn -> totals
+        self.sites = {}   # call site -> totals
+        self.finished = False
+
+    def start_turn(self):
+        """
+        Next turn; returns a token for end_turn. Until then LLM calls made
+        from this context (and prefetches it starts) are charged here.
+        """
+        self.turn += 1
+        return _current_session.set(self)
+
+    def end_turn(self, token):
+        _current_session.reset(token)
+
+    def add(self, call):
+        with self.lock:
+            _add(self.totals, call)
+            _add(self.turns.setdefault(call["turn"], _new_totals()), call)
+            _add(self.sites.setdefault(call["site"], _new_totals()), call)
+
+    def summary(self):
+        with self.lock:
+            return {
+                "session": self.session_id,
+                "turns_taken": self.turn,
+                "totals": dict(self.totals),
+                "turns": {turn: dict(totals) for turn, totals in sorted(self.turns.items())},
+                "sites": {site: dict(totals) for site, totals in self.sites.items()}
+            }
+
+class LLMMeter:
+    """
+    Process-wide counters and latency histograms per (call site, model),
+    plus cost and token histograms over completed sessions. Session and
+    turn stay out of the Prometheus labels (unbounded cardinality); they
+    live in each SessionMeter.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.totals = {}      # (site, model) -> totals
+        self.durations = {}   # (site, model) -> Histogram
+        self.sessions_completed = 0
+        self.session_cost = Histogram(SESSION_COST_BUCKETS)
+        self.session_tokens = Histogram(SESSION_TOKEN_BUCKETS)
+
+    def record(self, site, model, seconds, usage=None, ok=True, prompt_text=None, completion_text=None):
+        """
+        One call. Token counts come from usage (.prompt_tokens,
+        .completion_tokens, .prompt_tokens_details.cached_tokens); when a
+        call has no usage (streams) they are estimated from the texts.
+        """
+        estimated = usage is None and ok
+        if usage is not None:
+            prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+            completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+            details = getattr(usage, "prompt_tokens_details", None)
+            cached_tokens = getattr(details, "cached_tokens", 0) or 0
+        else:
+            prompt_tokens = estimate_tokens(prompt_text or "") if ok else 0
+            completion_tokens = estimate_tokens(completion_text or "") if ok else 0
+            cached_tokens = 0
+
+        session = _current_session.get()
+        call = {
+            "site": site, "model": model, "ok": ok, "estimated": estimated, "seconds": seconds,
+            "prompt_tokens": prompt_tokens, "cached_tokens": cached_tokens,
+            "completion_tokens": completion_tokens,
+            "cost_usd": call_cost(model, prompt_tokens, cached_tokens, completion_tokens),
+            "session": session.session_id if session else None,
+            "turn": session.turn if session else None
+        }
+        with self.lock:
+            key = (site, model)
+            if key not in self.totals:
+                self.totals[key] = _new_totals()
+                self.durations[key] = Histogram(DURATION_BUCKETS)
+            _add(self.totals[key], call)
+            self.durations[key].observe(seconds)
+        if session is not None:
+            session.add(call)
+        return call
+
+    def finish_session(self, session):
+        """A conversation reached its decision: fold its cost into the per-refund histograms"""
+        with session.lock:
+            if session.finished:
+                return
+            session.finished = True
+            totals = dict(session.totals)
+        with self.lock:
+            self.sessions_completed += 1
+            self.session_cost.observe(totals["cost_usd"])
+            self.session_tokens.observe(totals["prompt_tokens"] + totals["completion_tokens"])
+
+    def prometheus_text(self):
+        """Everything in Prometheus text exposition format"""
+        lines = []
+        with self.lock:
+            series = sorted(self.totals.items())
+
+            def counter(name, help_text, field, extra=""):
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} counter")
+                for (site, model), totals in series:
+                    value = totals[field]
+                    value = f"{value:.8f}" if isinstance(value, float) else value
+                    lines.append(f'{name}{{site="{site}",model="{model}"{extra}}} {value}')
+
+            counter("llm_calls_total", "LLM calls by call site and model", "calls")
+            counter("llm_call_errors_total", "LLM calls that failed", "errors")
+            counter("llm_estimated_calls_total", "Calls whose tokens were estimated locally (no usage reported)",
+                    "estimated")
+            lines.append("# HELP llm_tokens_total Tokens by call site, model and kind")
+            lines.append("# TYPE llm_tokens_total counter")
+            for (site, model), totals in series:
+                for kind, field in (("prompt", "prompt_tokens"), ("cached_prompt", "cached_tokens"),
+                                    ("completion", "completion_tokens")):
+                    lines.append(f'llm_tokens_total{{site="{site}",model="{model}",kind="{kind}"}} {totals[field]}')
+            counter("llm_cost_usd_total", "Estimated spend at LLM_PRICES", "cost_usd")
+
+            lines.append("# HELP llm_call_duration_seconds Wall time per LLM call")
+            lines.append("# TYPE llm_call_duration_seconds histogram")
+            for (site, model), histogram in sorted(self.durations.items()):
+                lines.extend(histogram.prometheus_lines("llm_call_duration_seconds",
+                                                        f'site="{site}",model="{model}"'))
+
+            lines.append("# HELP llm_sessions_completed_total Conversations that reached a decision")
+            lines.append("# TYPE llm_sessions_completed_total counter")
+            lines.append(f"llm_sessions_completed_total {self.sessions_completed}")
+            lines.append("# HELP llm_session_cost_usd LLM spend per completed refund")
+            lines.append("# TYPE llm_session_cost_usd histogram")
+            lines.extend(self.session_cost.prometheus_lines("llm_session_cost_usd", ""))
+            lines.append("# HELP llm_session_tokens LLM tokens per completed refund")
+            lines.append("# TYPE llm_session_tokens histogram")
+            lines.extend(self.session_tokens.prometheus_lines("llm_session_tokens", ""))
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Textfile-collector style: write beside, then rename into place"""
+        import os
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(temp_path, path)
+
+LLM_METER = LLMMeter()
+
+class metered_call:
+    """
+    with metered_call("extract_info", request) as call:
+        response = backend.chat(request)
+        call.usage = response.usage
+    Times the block and records it; an exception is recorded as an error
+    and re-raised. Set call.completion_text instead of usage for streams.
+    """
+
+    def __init__(self, site, request):
+        self.site = site
+        self.request = request
+        self.usage = None
+        self.completion_text = None
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        self.site_token = _current_site.set(self.site)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current_site.reset(self.site_token)
+        prompt_text = None
+        if self.usage is None:
+            prompt_text = "".join(message["content"] for message in self.request["messages"])
+        LLM_METER.record(self.site, self.request.get("model"), time.perf_counter() - self.started,
+                         self.usage, exc_type is None, prompt_text, self.completion_text)
+        return False
+
+def record_attempt(request, seconds, response=None, error=None):
+    """
+    An attempt a guarded call made besides the one its metered_call
+    records: a losing hedge, a failed try before a retry, or an attempt
+    abandoned at the deadline (no response and no error; its prompt was
+    sent, so prompt tokens are estimated). Charged as "<site>.attempt"
+    to the enclosing call's site, session and turn.
+    """
+    site = (_current_site.get() or "unmetered") + ".attempt"
+    usage = getattr(response, "usage", None)
+    prompt_text = None
+    if usage is None:
+        prompt_text = "".join(message["content"] for message in request["messages"])
+    return LLM_METER.record(site, request.get("model"), seconds, usage, error is None,
+                            prompt_text, getattr(response, "content", None))
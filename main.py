@@ -2,6 +2,12 @@ from conversation_manager import ConversationManager
 from extractor import InformationExtractor
 from decision_nodes import DECISION_NODES
 from decision_brute_force import make_refund_decision, get_decision_outcomes, get_critical_fields
+from rule_loader import get_rule_registry
+from prompt_builder import PROMPT_TOKEN_LOG
+from question_stream import QUESTION_STREAM_STATS
+from llm_metering import LLM_METER
+from config import DECISION_METRICS, PROMPT_CACHE_MIN_TOKENS
+import decision_metrics
 import json
 import sys
 
@@ -16,6 +22,12 @@ def main():
     print("\nCommands available: 'reset', 'status', 'help', 'quit'")
     print("-" * 70)
     
+    if DECISION_METRICS:
+        decision_metrics.enable()
+    
+    # Pick up rules file edits without restarting
+    get_rule_registry().start_watching()
+    
     # Initialize conversation manager
     try:
         conversation = ConversationManager("account_data.json")
@@ -46,6 +58,10 @@ def main():
                 show_conversation_status(conversation)
                 continue
             
+            elif user_input.lower() == 'metrics':
+                show_decision_metrics()
+                continue
+            
             elif user_input.lower() in ['help', '?']:
                 show_conversational_help()
                 continue
@@ -83,6 +99,75 @@ def show_conversation_status(conversation):
     print(f"Fields collected: {summary['total_fields']}")
     print(f"Completion: {summary['completion_percentage']:.1f}%")
     print(f"Current state: {conversation.current_state}")
+    print(f"Rules: v{conversation.rule_set.version} ({conversation.rule_set.source})")
+    
+    cache = conversation.extractor.cache
+    if cache is not None:
+        stats = cache.get_stats()
+        print(f"Extraction cache: {stats['memory_hits'] + stats['disk_hits']} hits, "
+              f"{stats['misses']} misses ({stats['hit_rate'] * 100:.1f}% hit rate)")
+    
+    similarity_cache = conversation.extractor.similarity_cache
+    if similarity_cache is not None:
+        stats = similarity_cache.get_stats()
+        print(f"Similarity cache: {stats['hits']} hits, {stats['misses']} misses, "
+              f"{stats['entries']} entries ({stats['hit_rate'] * 100:.1f}% hit rate)")
+
+    prefetcher = conversation.prefetcher
+    if prefetcher is not None:
+        stats = prefetcher.get_stats()
+        print(f"Question prefetch: {stats['hits']} hits, {stats['misses']} misses "
+              f"({stats['hit_rate'] * 100:.1f}% hit rate), {stats['started']} started, "
+              f"{stats['cancelled'] + stats['unused']} discarded")
+
+    tokens = PROMPT_TOKEN_LOG.get_stats()
+    if tokens["calls"]:
+        print(f"Extraction prompts: {tokens['calls']} calls, ~{tokens['estimated']} tokens")
+        if tokens["legacy_calls"]:
+            print(f"  Legacy prompt ~{tokens['legacy_estimated']} tokens over {tokens['legacy_calls']} calls "
+                  f"({tokens['estimated_savings'] * 100:.1f}% saved)")
+        if not tokens["prefix_cacheable"]:
+            print(f"  System prefix ~{tokens['prefix_tokens']} tokens, below the provider's "
+                  f"{PROMPT_CACHE_MIN_TOKENS}-token minimum for prompt caching")
+        if tokens["reported"]:
+            print(f"  Provider reported {tokens['reported']} prompt tokens, {tokens['reported_cached']} cached")
+
+    usage = conversation.meter.summary()
+    totals = usage["totals"]
+    if totals["calls"]:
+        print(f"LLM usage this session: {totals['calls']} calls, {totals['prompt_tokens']} prompt + "
+              f"{totals['completion_tokens']} completion tokens ({totals['cached_tokens']} cached), "
+              f"${totals['cost_usd']:.4f}, {totals['seconds'] * 1000:.0f}ms")
+        for turn, turn_totals in usage["turns"].items():
+            print(f"  turn {turn}: {turn_totals['calls']} calls, "
+                  f"{turn_totals['prompt_tokens'] + turn_totals['completion_tokens']} tokens, "
+                  f"${turn_totals['cost_usd']:.4f}, {turn_totals['seconds'] * 1000:.0f}ms")
+        for site, site_totals in sorted(usage["sites"].items()):
+            print(f"  {site}: {site_totals['calls']} calls, ${site_totals['cost_usd']:.4f}, "
+                  f"{site_totals['seconds'] * 1000 / site_totals['calls']:.0f}ms mean")
+    
+    backend = conversation.extractor.backend
+    if hasattr(backend, "breaker"):
+        guard = backend.get_stats()
+        breaker = guard["breaker"]
+        print(f"LLM guard: breaker {breaker['state']} ({breaker['trips']} trips, {breaker['rejected']} calls refused), "
+              f"{guard['hedges']} hedged, {guard['retries']} retried, {guard['over_budget']} over budget, "
+              f"hedging after {guard['hedge_after']:.2f}s")
+
+    streamed = QUESTION_STREAM_STATS.get_stats()
+    if streamed["questions"]:
+        print(f"Streamed questions: {streamed['questions']} "
+              f"(time to first token mean {streamed['ttft']['mean_us'] / 1000:.0f}ms, "
+              f"total mean {streamed['total']['mean_us'] / 1000:.0f}ms, {streamed['fallbacks']} fell back)")
+
+def show_decision_metrics():
+    """Show decision engine counters and latency, then LLM usage in Prometheus text format"""
+    metrics = decision_metrics.get_metrics()
+    if metrics is None:
+        print("\nDecision metrics are off (set DECISION_METRICS=true to enable).")
+    else:
+        print("\n" + metrics.format_text())
+    print("\n" + LLM_METER.prometheus_text())
 
 def show_conversational_help():
     """Show help for conversational mode"""
@@ -105,8 +190,13 @@ def show_conversational_help():
     print("\nCommands:")
     print("• reset - Start a new refund request")
     print("• status - Show conversation progress")
+    print("• metrics - Show decision engine and LLM usage metrics")
     print("• help - Show this help")
     print("• quit - Exit the bot")
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        # python main.py --batch INPUT.jsonl OUTPUT.jsonl [options]; see batch_runner.main
+        from batch_runner import main as batch_main
+        sys.exit(batch_main(sys.argv[2:]))
     main()
\ No newline at end of file
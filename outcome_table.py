@@ -0,0 +1,220 @@
+# Precomputed outcome table: every decision for the critical fields, memory-mapped
+import hashlib
+import itertools
+import json
+import mmap
+import os
+import struct
+import sys
+
+from decision_nodes import DECISION_NODES
+from decision_brute_force import (
+    FIELD_PRIORITY_ORDER, RULE_INDEX,
+    build_rule_result, build_need_info_result, get_critical_fields, get_decision_outcomes
+)
+from fact_store import Fact
+from config import OUTCOME_TABLE_DIR
+
+DEFAULT_TABLE_FILE = os.path.join(OUTCOME_TABLE_DIR, "outcome_table.bin")
+
+TABLE_MAGIC = b"RFOT"
+TABLE_VERSION = 1
+# magic, format version, entry count, rules fingerprint, payload sha256
+HEADER = struct.Struct("<4sHI32s32s")
+ENTRY_SIZE = 3  # decision code, rule index, next field index
+
+NO_RULE = 0xFF
+DECIDED = 0xFF       # next field slot when a rule matched
+FIELDS_COMPLETE = 0xFE  # all table fields known; next field depends on the rest
+
+TABLE_FIELDS = get_critical_fields()
+DECISION_CODES = get_decision_outcomes()
+
+# Code 0 is "missing"; node values follow in DECISION_NODES order
+FIELD_CODES = [
+    {value: i + 1 for i, value in enumerate(DECISION_NODES[field]["values"])}
+    for field in TABLE_FIELDS
+]
+DIMENSIONS = [len(codes) + 1 for codes in FIELD_CODES]
+
+STRIDES = []
+stride = 1
+for size in reversed(DIMENSIONS):
+    STRIDES.insert(0, stride)
+    stride *= size
+ENTRY_COUNT = stride
+
+def rules_fingerprint(rules):
+    """
+    Hash of everything the table contents depend on, so any edit to
+    the rules or the field domains forces a rebuild
+    """
+    source = {
+        "rules": rules,
+        "fields": TABLE_FIELDS,
+        "domains": [DECISION_NODES[field]["values"] for field in TABLE_FIELDS],
+        "priority_order": FIELD_PRIORITY_ORDER,
+        "decisions": DECISION_CODES
+    }
+    return hashlib.sha256(json.dumps(source, sort_keys=True).encode("utf-8")).digest()
+
+def check_table_rules(rules):
+    """
+    Raise ValueError unless the table can answer for rules: every rule
+    must fit in an entry and condition only on TABLE_FIELDS, otherwise
+    an entry would depend on fields the table does not index
+    """
+    if len(rules) >= NO_RULE:
+        raise ValueError(f"Outcome table entries hold at most {NO_RULE - 1} rules")
+    for rule in rules:
+        outside = [field for field in rule["conditions"] if field not in TABLE_FIELDS]
+        if outside:
+            raise ValueError(f"Rule {rule['id']} conditions on {', '.join(outside)}, "
+                             f"outside the table fields")
+
+def outcome_table_path(rule_index):
+    """Table file for one rule version, so reloads never rebuild each other's file"""
+    return os.path.join(OUTCOME_TABLE_DIR, f"outcome_table.{rules_fingerprint(rule_index.rules).hex()[:16]}.bin")
+
+def decide_by_index(data, rule_index):
+    """make_refund_decision through rule_index alone, never through a table"""
+    rule = rule_index.match(data)
+    if rule is not None:
+        return build_rule_result(rule, data)
+    return build_need_info_result(data)
+
+def build_outcome_table(path=DEFAULT_TABLE_FILE, rule_index=RULE_INDEX):
+    """
+    Evaluate every combination of table field values (each plus missing)
+    against rule_index and write the packed table atomically
+    """
+    check_table_rules(rule_index.rules)
+    rule_positions = {rule["id"]: i for i, rule in enumerate(rule_index.rules)}
+    domains = [[None] + DECISION_NODES[field]["values"] for field in TABLE_FIELDS]
+    payload = bytearray(ENTRY_COUNT * ENTRY_SIZE)
+
+    # itertools.product walks the last field fastest, matching STRIDES
+    for index, values in enumerate(itertools.product(*domains)):
+        data = {field: {"value": value} for field, value in zip(TABLE_FIELDS, values)
+                if value is not None}
+        result = decide_by_index(data, rule_index)
+
+        offset = index * ENTRY_SIZE
+        payload[offset] = DECISION_CODES.index(result["decision"])
+        if result["decision"] == "NEED_INFO":
+            payload[offset + 1] = NO_RULE
+            field = result["field_needed"]
+            payload[offset + 2] = TABLE_FIELDS.index(field) if field in TABLE_FIELDS else FIELDS_COMPLETE
+        else:
+            payload[offset + 1] = rule_positions[result["rule_id"]]
+            payload[offset + 2] = DECIDED
+
+    header = HEADER.pack(TABLE_MAGIC, TABLE_VERSION, ENTRY_COUNT,
+                         rules_fingerprint(rule_index.rules), hashlib.sha256(payload).digest())
+
+    # Write-then-rename so readers never map a half-written file
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(header)
+        f.write(payload)
+    os.replace(temp_path, path)
+    return path
+
+class OutcomeTable:
+    """
+    Read-only, memory-mapped view of a built outcome table. Worker
+    processes mapping the same file share one page-cached copy.
+    """
+
+    def __init__(self, path=DEFAULT_TABLE_FILE, rule_index=RULE_INDEX):
+        self.path = path
+        self.rule_index = rule_index
+        # NEED_INFO results depend only on the field asked for; built on first use
+        self.need_info = [None] * len(TABLE_FIELDS)
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self.buffer) != HEADER.size + ENTRY_COUNT * ENTRY_SIZE:
+            raise ValueError(f"Outcome table {path} has unexpected size {len(self.buffer)}")
+
+        magic, version, count, fingerprint, checksum = HEADER.unpack_from(self.buffer, 0)
+        if magic != TABLE_MAGIC or version != TABLE_VERSION or count != ENTRY_COUNT:
+            raise ValueError(f"Outcome table {path} has an incompatible header")
+        if fingerprint != rules_fingerprint(rule_index.rules):
+            raise ValueError(f"Outcome table {path} was built from different rules")
+        if hashlib.sha256(self.buffer[HEADER.size:]).digest() != checksum:
+            raise ValueError(f"Outcome table {path} failed its checksum")
+
+    def close(self):
+        self.buffer.close()
+
+    def table_index(self, data):
+        """
+        Flat entry index for data, or None if a value is outside the table
+        """
+        index = 0
+        for field, codes, field_stride in zip(TABLE_FIELDS, FIELD_CODES, STRIDES):
+            if field in data:
+                value = data[field]
+                if isinstance(value, (dict, Fact)) and "value" in value:
+                    value = value["value"]
+                try:
+                    code = codes.get(value)
+                except TypeError:
+                    code = None
+                if code is None:
+                    return None
+                index += code * field_stride
+        return index
+
+    def make_refund_decision(self, data):
+        """
+        Same result as decision_brute_force.make_refund_decision, answered
+        from the table; values outside the node domains fall back to the
+        rule index
+        """
+        index = self.table_index(data)
+        if index is None:
+            return decide_by_index(data, self.rule_index)
+
+        offset = HEADER.size + index * ENTRY_SIZE
+        _, rule_position, field_position = self.buffer[offset:offset + ENTRY_SIZE]
+
+        if rule_position != NO_RULE:
+            return build_rule_result(self.rule_index.rules[rule_position], data)
+        if field_position == FIELDS_COMPLETE:
+            # Next field lies beyond the table fields; let the walk find it
+            return build_need_info_result(data)
+
+        result = self.need_info[field_position]
+        if result is None:
+            result = self.need_info[field_position] = build_need_info_result(data, TABLE_FIELDS[field_position])
+        return dict(result)
+
+def load_outcome_table(path=DEFAULT_TABLE_FILE, rule_index=RULE_INDEX):
+    """
+    Map the table at path, rebuilding it first if it is missing or was
+    built from a different version of the rules. Raises ValueError if
+    the rules cannot be tabled (see check_table_rules).
+    """
+    check_table_rules(rule_index.rules)
+    try:
+        return OutcomeTable(path, rule_index)
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Rebuilding outcome table {path}: {e}")
+        build_outcome_table(path, rule_index)
+        return OutcomeTable(path, rule_index)
+
+if __name__ == "__main__":
+    path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_TABLE_FILE
+    command = sys.argv[1] if len(sys.argv) > 1 else "build"
+
+    if command == "build":
+        build_outcome_table(path)
+        print(f"Wrote {ENTRY_COUNT} outcomes to {path}")
+    elif command == "verify":
+        OutcomeTable(path).close()
+        print(f"{path} matches the current DECISION_RULES")
+    else:
+        print("Usage: python outcome_table.py [build|verify] [path]")
+        sys.exit(2)
@@ -0,0 +1,208 @@
+# Extraction prompts: stable system prefix, decision-aware field list, token budget
+import threading
+from collections import deque
+
+from decision_nodes import DECISION_NODES, find_relevant_nodes
+from decision_brute_force import FIELD_PRIORITY_ORDER
+from config import PROMPT_TOKEN_BUDGET, PROMPT_CACHE_MIN_TOKENS
+
+# Identical on every call so providers can cache it as a prompt prefix;
+# nothing turn-specific may go in here
+EXTRACTION_SYSTEM_PROMPT = """You are a precise information extraction system. Extract information from customer refund requests using account context. Return valid JSON only.
+
+The user message gives the customer message, what we already know about the customer, and the fields to extract with their allowed values.
+
+Rules:
+1. Use information explicitly stated in the message
+2. Use account context to infer information when logical
+3. Use "unknown" if information is unclear or missing
+4. Provide confidence score (0.0-1.0) based on certainty
+5. Only include extractions with confidence > 0.7
+6. Mark source as "inferred" if using account context to deduce information
+7. Only use the listed fields and their allowed values
+
+Response format (JSON):
+{
+    "extractions": {
+        "field_name": {
+            "value": "extracted_value",
+            "confidence": 0.85,
+            "reasoning": "brief explanation including source"
+        }
+    }
+}
+
+If no clear information found, return: {"extractions": {}}"""
+
+def estimate_tokens(text):
+    """
+    Local token estimate: about four characters per token for English
+    under the GPT tokenizers, rounded up. No tokenizer dependency needed.
+    """
+    return (len(text) + 3) // 4
+
+class PromptBuilder:
+    """
+    Builds [system, user] messages for extraction. The user message lists
+    only fields some still-live rule needs (or the message mentions) and
+    only the known facts those rules also condition on, then trims to
+    token_budget: lowest-priority fields first, then facts, then the
+    customer message itself. A question section (combined turn mode)
+    counts against the budget but is never trimmed.
+    """
+
+    def __init__(self, rule_index, token_budget=PROMPT_TOKEN_BUDGET):
+        self.rule_index = rule_index
+        self.token_budget = token_budget
+        self.field_order = FIELD_PRIORITY_ORDER + [f for f in DECISION_NODES if f not in FIELD_PRIORITY_ORDER]
+
+    def live_rules(self, known):
+        """Rules no known value refutes"""
+        live = []
+        for rule in self.rule_index.rules:
+            refuted = False
+            for field, required_value in rule["conditions"].items():
+                if field not in known:
+                    continue
+                if isinstance(required_value, list):
+                    refuted = known[field] not in required_value
+                else:
+                    refuted = known[field] != required_value
+                if refuted:
+                    break
+            if not refuted:
+                live.append(rule)
+        return live
+
+    def select_fields(self, user_input, known, fields=None):
+        """
+        Fields to ask the LLM for, in priority order: the requested ones,
+        else the ones the message mentions that are still unknown, else
+        every unknown field a live rule conditions on
+        """
+        if fields:
+            return [f for f in self.field_order if f in fields]
+        live_fields = {f for rule in self.live_rules(known) for f in rule["conditions"]}
+        mentioned = [f for f in find_relevant_nodes(user_input) if f not in known]
+        if mentioned:
+            return [f for f in self.field_order if f in mentioned]
+        needed = [f for f in self.field_order if f in live_fields and f not in known]
+        return needed or [f for f in self.field_order if f not in known]
+
+    def build(self, user_input, context, fields=None, question_section=""):
+        """
+        (messages, token counts) for one extraction call. question_section
+        goes at the end of the user message. Token counts are local
+        estimates: {"system", "user", "total", "fields", "trimmed"}.
+        """
+        context = context or {}
+        known = {field: data["value"] for field, data in context.items()}
+        selected = self.select_fields(user_input, known, fields)
+
+        # Facts are only worth sending if a live rule ties them to a field we ask about
+        related = set()
+        for rule in self.live_rules(known):
+            if any(field in rule["conditions"] for field in selected):
+                related.update(rule["conditions"])
+        account_info = [(k, v["value"]) for k, v in context.items()
+                        if v.get("source") == "account_data" and k in related]
+        extracted_info = [(k, v["value"]) for k, v in context.items()
+                          if v.get("source") == "user_input" and k in related]
+
+        message = user_input
+        trimmed = 0
+        while True:
+            user_prompt = self._user_prompt(message, account_info, extracted_info, selected, question_section)
+            if estimate_tokens(user_prompt) <= self.token_budget:
+                break
+            trimmed += 1
+            if len(selected) > 1:
+                selected = selected[:-1]
+            elif extracted_info:
+                extracted_info = extracted_info[:-1]
+            elif account_info:
+                account_info = account_info[:-1]
+            else:
+                overflow = (estimate_tokens(user_prompt) - self.token_budget) * 4
+                if overflow >= len(message):
+                    break  # the fixed text alone is over budget
+                message = message[:len(message) - overflow - 3] + "..."
+
+        system_tokens = estimate_tokens(EXTRACTION_SYSTEM_PROMPT)
+        user_tokens = estimate_tokens(user_prompt)
+        messages = [
+            {"role": "system", "content": EXTRACTION_SYSTEM_PROMPT},
+            {"role": "user", "content": user_prompt}
+        ]
+        return messages, {
+            "system": system_tokens,
+            "user": user_tokens,
+            "total": system_tokens + user_tokens,
+            "fields": len(selected),
+            "trimmed": trimmed
+        }
+
+    def _user_prompt(self, message, account_info, extracted_info, fields, question_section=""):
+        lines = [f'Customer message: "{message}"']
+        if account_info:
+            lines.append(f"Customer account info: {', '.join(f'{k}: {v}' for k, v in account_info)}")
+        if extracted_info:
+            lines.append(f"Previously extracted: {', '.join(f'{k}: {v}' for k, v in extracted_info)}")
+        lines.append("Fields to extract:")
+        for field in fields:
+            lines.append(f"{field}: {', '.join(DECISION_NODES[field]['values'])}")
+        return "\n".join(lines) + question_section
+
+class PromptTokenLog:
+    """
+    Per-call prompt token counts: our estimate (total, and the per-turn
+    part after the shared system prefix), the legacy prompt's size for
+    the same call when PROMPT_SAVINGS_LOG sized it, and the provider's
+    reported prompt and cached tokens when a response carries usage.
+    Keeps the last `keep` calls plus running totals.
+    """
+
+    def __init__(self, keep=1000):
+        self.lock = threading.Lock()
+        self.calls = deque(maxlen=keep)
+        self.totals = {"calls": 0, "estimated": 0, "estimated_per_turn": 0,
+                       "legacy_calls": 0, "legacy_estimated": 0, "legacy_compared": 0,
+                       "reported": 0, "reported_cached": 0, "trimmed_calls": 0}
+
+    def record(self, counts, legacy_tokens=None, usage=None):
+        entry = {"estimated": counts["total"], "estimated_per_turn": counts["user"],
+                 "fields": counts["fields"], "trimmed": counts["trimmed"]}
+        if legacy_tokens is not None:
+            entry["legacy_estimated"] = legacy_tokens
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        if prompt_tokens is not None:
+            details = getattr(usage, "prompt_tokens_details", None)
+            entry["reported"] = prompt_tokens
+            entry["reported_cached"] = getattr(details, "cached_tokens", None) or 0
+
+        with self.lock:
+            self.calls.append(entry)
+            self.totals["calls"] += 1
+            self.totals["estimated"] += entry["estimated"]
+            self.totals["estimated_per_turn"] += entry["estimated_per_turn"]
+            if legacy_tokens is not None:
+                self.totals["legacy_calls"] += 1
+                self.totals["legacy_estimated"] += legacy_tokens
+                self.totals["legacy_compared"] += entry["estimated"]
+            self.totals["reported"] += entry.get("reported", 0)
+            self.totals["reported_cached"] += entry.get("reported_cached", 0)
+            self.totals["trimmed_calls"] += bool(counts["trimmed"])
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.totals)
+        legacy = stats["legacy_estimated"]
+        # Savings only over the calls the legacy prompt was sized for
+        stats["estimated_savings"] = 1 - stats["legacy_compared"] / legacy if legacy else 0.0
+        # The shared system prefix only gets provider caching once a whole
+        # prompt reaches the provider's minimum; ours usually stays below it
+        stats["prefix_tokens"] = estimate_tokens(EXTRACTION_SYSTEM_PROMPT)
+        stats["prefix_cacheable"] = stats["prefix_tokens"] >= PROMPT_CACHE_MIN_TOKENS
+        return stats
+
+PROMPT_TOKEN_LOG = PromptTokenLog()
@@ -0,0 +1,189 @@
+# Next-question planning: ask the field that minimizes expected remaining turns
+import itertools
+import json
+import sys
+
+from decision_nodes import DECISION_NODES
+from decision_brute_force import RULE_INDEX, FIELD_PRIORITY_ORDER, make_refund_decision
+from fact_store import Fact
+
+class QuestionPlanner:
+    """
+    Picks the next field to ask about by looking at which DECISION_RULES
+    are still satisfiable and minimizing the expected number of further
+    questions until a rule matches (or no rule can match any more).
+    """
+
+    def __init__(self, value_weights=None, rule_index=RULE_INDEX):
+        self.rule_index = rule_index
+        # Only fields some rule conditions on can move the decision
+        rule_fields = {field for rule in rule_index.rules for field in rule["conditions"]}
+        self.fields = [f for f in FIELD_PRIORITY_ORDER if f in rule_fields]
+        self.fields += sorted(rule_fields - set(self.fields))
+
+        # Probability of each answer; uniform unless historical weights given
+        self.value_probabilities = {}
+        for field in self.fields:
+            values = DECISION_NODES.get(field, {}).get("values", [])
+            weights = (value_weights or {}).get(field, {})
+            raw = {value: weights.get(value, 0 if weights else 1) for value in values}
+            total = sum(raw.values()) or 1
+            self.value_probabilities[field] = {v: w / total for v, w in raw.items() if w > 0}
+
+        self._plans = {}
+
+    def known_values(self, data):
+        """
+        Tuple of values for self.fields, None where the field is missing
+        """
+        known = []
+        for field in self.fields:
+            if field in data:
+                value = data[field]
+                if isinstance(value, (dict, Fact)) and "value" in value:
+                    value = value["value"]
+                known.append(value)
+            else:
+                known.append(None)
+        return tuple(known)
+
+    def live_rules(self, known):
+        """
+        Rules not yet refuted by any known value
+        """
+        live = []
+        for rule in self.rule_index.rules:
+            refuted = False
+            for field, required_value in rule["conditions"].items():
+                value = known[self.fields.index(field)]
+                if value is None:
+                    continue
+                if isinstance(required_value, list):
+                    refuted = value not in required_value
+                else:
+                    refuted = value != required_value
+                if refuted:
+                    break
+            if not refuted:
+                live.append(rule)
+        return live
+
+    def precompute(self):
+        """
+        Plan every state reachable from knowing nothing, so lookups during
+        conversations are memo hits. Returns the number of planned states.
+        """
+        self.plan(self.known_values({}))
+        return len(self._plans)
+
+    def next_field(self, data):
+        """
+        Best field to ask about next, or None if no question can still
+        change the outcome (a rule already matched or every rule is refuted)
+        """
+        return self.plan(self.known_values(data))[1]
+
+    def plan(self, known):
+        """
+        (expected remaining turns, best field) for a tuple of known values
+        """
+        if known in self._plans:
+            return self._plans[known]
+
+        data = {field: value for field, value in zip(self.fields, known) if value is not None}
+        live = self.live_rules(known)
+        if not live or self.rule_index.match(data) is not None:
+            self._plans[known] = (0.0, None)
+            return self._plans[known]
+
+        candidates = {field for rule in live for field in rule["conditions"]
+                      if known[self.fields.index(field)] is None}
+
+        best = (float("inf"), None)
+        # Walking self.fields keeps FIELD_PRIORITY_ORDER as the tie-breaker
+        for position, field in enumerate(self.fields):
+            if field not in candidates:
+                continue
+            expected = 1.0
+            for value, probability in self.value_probabilities[field].items():
+                answered = known[:position] + (value,) + known[position + 1:]
+                expected += probability * self.plan(answered)[0]
+            if expected < best[0]:
+                best = (expected, field)
+
+        self._plans[known] = best
+        return best
+
+def simulate_turns(planner, start_data=None):
+    """
+    Replay every combination of answers for the unknown rule fields and
+    compare turns-to-outcome between FIELD_PRIORITY_ORDER and the planner.
+    A run ends when a rule matches or the next question cannot matter.
+    """
+    start_data = start_data or {}
+    start = planner.known_values(start_data)
+    unknown = [i for i, value in enumerate(start) if value is None]
+    value_lists = [list(planner.value_probabilities[planner.fields[i]].items()) for i in unknown]
+
+    totals = {"static": 0.0, "planner": 0.0}
+    decided = {"static": 0.0, "planner": 0.0}
+    scenarios = 0
+    for answers in itertools.product(*value_lists):
+        truth = list(start)
+        weight = 1.0
+        for i, (value, probability) in zip(unknown, answers):
+            truth[i] = value
+            weight *= probability
+
+        for mode in totals:
+            turns, reached = _simulate_one(planner, start, truth, mode)
+            totals[mode] += weight * turns
+            decided[mode] += weight * reached
+        scenarios += 1
+
+    return {
+        "scenarios": scenarios,
+        "static_avg_turns": totals["static"],
+        "planner_avg_turns": totals["planner"],
+        "static_decision_rate": decided["static"],
+        "planner_decision_rate": decided["planner"]
+    }
+
+def _simulate_one(planner, start, truth, mode):
+    """Turns taken (and whether a rule matched) for one true answer set"""
+    known = list(start)
+    turns = 0
+    while True:
+        data = {f: {"value": v} for f, v in zip(planner.fields, known) if v is not None}
+        result = make_refund_decision(data, rule_index=planner.rule_index)
+        if result["decision"] != "NEED_INFO":
+            return turns, 1
+
+        if mode == "planner":
+            field = planner.next_field(data)
+        else:
+            field = result["field_needed"]
+        if field not in planner.fields:
+            # Nothing left to ask can reach a rule - dead end
+            return turns, 0
+
+        position = planner.fields.index(field)
+        known[position] = truth[position]
+        turns += 1
+
+if __name__ == "__main__":
+    start_data = {}
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], "r") as f:
+            account = json.load(f)
+        start_data = {field: account[field] for field in
+                      ["account_status", "loyalty_tier", "fraud_flag", "return_abuse"]
+                      if field in account}
+
+    report = simulate_turns(QuestionPlanner(), start_data)
+    print(f"Simulated {report['scenarios']} answer combinations "
+          f"(starting from {len(start_data)} known fields)")
+    print(f"  Static order : {report['static_avg_turns']:.2f} turns, "
+          f"{report['static_decision_rate'] * 100:.1f}% decided")
+    print(f"  Planner      : {report['planner_avg_turns']:.2f} turns, "
+          f"{report['planner_decision_rate'] * 100:.1f}% decided")
@@ -0,0 +1,136 @@
+# Speculative next-question generation while the customer is still typing
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from decision_nodes import DECISION_NODES
+from decision_brute_force import speculative_traversal
+from config import PREFETCH_BUDGET, PREFETCH_WORKERS, LLM_TIMEOUT
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    """Thread pool shared by every conversation's prefetcher"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="prefetch")
+        return _executor
+
+class QuestionPrefetcher:
+    """
+    After a question goes out, runs the decision engine once per possible
+    answer and generates, in the background, the smart question that
+    answer leads to. Each question is written knowing the hypothetical
+    answer, so when the reply lands take() serves one only if the
+    customer gave that answer and the same field is needed next;
+    cancel() drops the rest.
+
+    `generate(field, context, fallback)` returns the question text; it runs
+    on a worker thread, so it must not print or touch conversation state.
+    """
+
+    def __init__(self, generate, planner=None, rule_index=None, budget=PREFETCH_BUDGET):
+        self.generate = generate
+        self.planner = planner
+        self.rule_index = rule_index
+        self.budget = budget
+        self.field = None  # the field asked about, whose answers are speculated on
+        self.pending = {}  # (hypothetical answer, next field) -> Future
+        self.stats = {"started": 0, "hits": 0, "misses": 0, "cancelled": 0, "unused": 0, "failed": 0}
+
+    def start(self, field, complete_data):
+        """
+        Speculate on every value of `field`. At most `budget` generations
+        are started, in the order DECISION_NODES lists the values.
+        """
+        self.cancel()
+        self.field = field
+        for value in DECISION_NODES.get(field, {}).get("values", []):
+            if len(self.pending) >= self.budget:
+                break
+            hypothetical = {**complete_data, field: {"value": value, "confidence": 1.0, "source": "user_input"}}
+            # Hypothetical answers must not count as decisions in decision_metrics
+            outcome = speculative_traversal(hypothetical, self.planner, self.rule_index)
+            if outcome["status"] != "NEED_MORE_INFO":
+                continue
+            next_field = outcome["stopping_field"]
+            if next_field == field:
+                continue
+            # Run in a copy of this context so the work is metered to this session and turn
+            self.pending[(value, next_field)] = _get_executor().submit(
+                contextvars.copy_context().run, self.generate, next_field, outcome["context"], outcome["question"]
+            )
+            self.stats["started"] += 1
+
+    def take(self, field, complete_data, timeout=LLM_TIMEOUT):
+        """
+        Prefetched question for `field`, or None: only one speculated on
+        the answer complete_data now holds for the asked field. A
+        generation still in flight is waited on, since it is ahead of a
+        fresh call. Everything else prefetched for this turn is cancelled.
+        """
+        future = self._claim(field, complete_data)
+        if future is None:
+            return None
+        try:
+            question = future.result(timeout=timeout)
+        except Exception:
+            question = None
+        return self._served(question)
+
+    async def take_async(self, field, complete_data, timeout=LLM_TIMEOUT):
+        """
+        take() for an event loop: an in-flight generation is awaited, not
+        blocked on. One still queued behind other conversations' prefetches
+        is dropped instead, as the async path can call the LLM at once.
+        """
+        future = self._claim(field, complete_data)
+        if future is None:
+            return None
+        if future.cancel():
+            self.stats["cancelled"] += 1
+            self.stats["misses"] += 1
+            return None
+        try:
+            question = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except Exception:
+            question = None
+        return self._served(question)
+
+    def _claim(self, field, complete_data):
+        """Future prefetched for the real answer and `field` (None on a miss); the rest are cancelled"""
+        speculated = bool(self.pending)
+        answer = complete_data.get(self.field)
+        future = None
+        if answer is not None:
+            future = self.pending.pop((answer["value"], field), None)
+        self.cancel()
+        if future is None and speculated:
+            self.stats["misses"] += 1
+        return future
+
+    def _served(self, question):
+        if not question:
+            self.stats["failed"] += 1
+            return None
+        self.stats["hits"] += 1
+        return question
+
+    def cancel(self):
+        """Drop every outstanding prefetch; queued ones never reach the LLM"""
+        for future in self.pending.values():
+            if future.cancel():
+                self.stats["cancelled"] += 1
+            else:
+                # Already running or done: the result is simply discarded
+                self.stats["unused"] += 1
+        self.pending = {}
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        served = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / served if served else 0.0
+        return stats
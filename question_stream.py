@@ -0,0 +1,130 @@
+# Streamed question delivery: incremental cleanup, time-to-first-token and stall fallback
+import re
+import sys
+import threading
+import time
+from collections import deque
+
+from decision_metrics import LatencyHistogram
+
+# Microsecond bounds suited to LLM latencies (50 ms .. 10 s)
+STREAM_LATENCY_BUCKETS_US = [50000, 100000, 200000, 300000, 500000, 750000,
+                             1000000, 2000000, 5000000, 10000000]
+
+def stdout_sink(text):
+    """Default output sink: write straight to the terminal"""
+    sys.stdout.write(text)
+    sys.stdout.flush()
+
+class QuestionStreamFilter:
+    """
+    Cleans question text as it streams: drops leading whitespace and an
+    opening quote, turns newlines and tabs into single spaces, removes
+    other control characters (so stray escape codes never reach the
+    terminal) and holds back trailing quotes/whitespace until more text
+    shows they are not the end. Mirrors _clean_question on the full text.
+    """
+
+    def __init__(self):
+        self.started = False
+        self.opened_quote = False
+        self.held = ""
+
+    def feed(self, delta):
+        """Text safe to emit now for one streamed delta"""
+        text = "".join(" " if c in "\n\r\t" else c for c in delta if c.isprintable() or c in "\n\r\t")
+        if not self.started:
+            text = text.lstrip()
+            if not text:
+                return ""
+            self.started = True
+            if text[0] == '"':
+                self.opened_quote = True
+                text = text[1:]
+
+        text = re.sub(" {2,}", " ", self.held + text)
+        stripped = text.rstrip('" ')
+        self.held = text[len(stripped):]
+        return stripped
+
+    def finish(self):
+        """Whatever was held back, minus the closing quote and trailing space"""
+        held = self.held.rstrip()
+        if self.opened_quote and held.endswith('"'):
+            held = held[:-1]
+        self.held = ""
+        return held.rstrip()
+
+class QuestionStreamStats:
+    """Time-to-first-token and total latency per streamed question"""
+
+    def __init__(self, keep=1000):
+        self.lock = threading.Lock()
+        self.ttft = LatencyHistogram(STREAM_LATENCY_BUCKETS_US)
+        self.total = LatencyHistogram(STREAM_LATENCY_BUCKETS_US)
+        self.fallbacks = 0
+        self.questions = deque(maxlen=keep)
+
+    def record(self, field, ttft, total, fell_back):
+        with self.lock:
+            if ttft is not None:
+                self.ttft.observe(ttft)
+            self.total.observe(total)
+            self.fallbacks += fell_back
+            self.questions.append({"field": field, "ttft": ttft, "total": total, "fallback": fell_back})
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "questions": self.total.count,
+                "fallbacks": self.fallbacks,
+                "ttft": self.ttft.snapshot(),
+                "total": self.total.snapshot()
+            }
+
+QUESTION_STREAM_STATS = QuestionStreamStats()
+
+def stream_question(backend, request, fallback_question, sink=stdout_sink, stall_timeout=5.0, field=None):
+    """
+    Stream a chat completion from an LLM backend into sink as cleaned question text and
+    return the full question. stall_timeout bounds the wait for the
+    first token and between tokens; on a stall or error the template
+    fallback_question is delivered instead (on a fresh line if part of
+    the stream was already shown). TTFT and total latency are recorded
+    in QUESTION_STREAM_STATS.
+    """
+    started = time.perf_counter()
+    first_token = None
+    emitted = []
+    cleaner = QuestionStreamFilter()
+    stream = None
+
+    try:
+        stream = backend.stream(request, stall_timeout)
+        for delta in stream:
+            text = cleaner.feed(delta)
+            if text:
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+                sink(text)
+                emitted.append(text)
+        tail = cleaner.finish()
+        if tail:
+            sink(tail)
+            emitted.append(tail)
+        question = "".join(emitted)
+        if not question:
+            raise ValueError("empty completion")
+
+    except Exception:
+        if emitted:
+            sink("\n")
+        sink(fallback_question)
+        QUESTION_STREAM_STATS.record(field, first_token, time.perf_counter() - started, True)
+        return fallback_question
+    finally:
+        if stream is not None:
+            stream.close()  # lets the backend release its connection
+
+    QUESTION_STREAM_STATS.record(field, first_token, time.perf_counter() - started, False)
+    return question
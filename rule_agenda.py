@@ -0,0 +1,132 @@
+# Incremental rule agenda: tracks every rule's state as facts arrive across turns
+from decision_brute_force import RULE_INDEX
+from fact_store import Fact
+
+SATISFIED = "satisfied"
+REFUTED = "refuted"
+PENDING = "pending"
+
+class RuleAgenda:
+    """
+    Per-conversation agenda keeping each rule satisfied, refuted or pending
+    (with the fields it still misses). A changed fact only touches the rules
+    that reference it, so a turn costs O(changed facts), not O(rules).
+    """
+
+    def __init__(self, rule_index=RULE_INDEX):
+        self.rules = rule_index.rules
+        self.facts = {}
+
+        # Which rule positions mention each field
+        self.rules_by_field = {}
+        for position, rule in enumerate(self.rules):
+            for field in rule["conditions"]:
+                self.rules_by_field.setdefault(field, []).append(position)
+
+        # Per rule: conditions still missing a fact, conditions already failed
+        self.missing = [set(rule["conditions"]) for rule in self.rules]
+        self.failed = [set() for _ in self.rules]
+
+        self.satisfied_mask = 0
+        self.refuted_mask = 0
+        for position, rule in enumerate(self.rules):
+            if not rule["conditions"]:
+                self.satisfied_mask |= 1 << position
+
+    def sync(self, data):
+        """
+        Bring the agenda in line with a complete-data dict; returns the
+        rule-relevant fields whose value changed
+        """
+        changed = []
+        for field in self.rules_by_field:
+            if field in data:
+                value = data[field]
+                if isinstance(value, (dict, Fact)) and "value" in value:
+                    value = value["value"]
+            else:
+                value = None
+
+            if self.facts.get(field) != value:
+                self.update(field, value)
+                changed.append(field)
+        return changed
+
+    def update(self, field, value):
+        """
+        Record a new value for field (None retracts it) and refresh only
+        the rules that condition on it
+        """
+        if value is None:
+            self.facts.pop(field, None)
+        else:
+            self.facts[field] = value
+
+        for position in self.rules_by_field.get(field, []):
+            required_value = self.rules[position]["conditions"][field]
+            self.missing[position].discard(field)
+            self.failed[position].discard(field)
+
+            if value is None:
+                self.missing[position].add(field)
+            elif isinstance(required_value, list):
+                if value not in required_value:
+                    self.failed[position].add(field)
+            elif value != required_value:
+                self.failed[position].add(field)
+
+            bit = 1 << position
+            self.satisfied_mask &= ~bit
+            self.refuted_mask &= ~bit
+            if self.failed[position]:
+                self.refuted_mask |= bit
+            elif not self.missing[position]:
+                self.satisfied_mask |= bit
+
+    def state(self, rule_id):
+        """
+        (state, missing fields) for a rule id
+        """
+        for position, rule in enumerate(self.rules):
+            if rule["id"] == rule_id:
+                bit = 1 << position
+                if self.refuted_mask & bit:
+                    return REFUTED, []
+                if self.satisfied_mask & bit:
+                    return SATISFIED, []
+                return PENDING, sorted(self.missing[position])
+        raise KeyError(rule_id)
+
+    def first_satisfied(self):
+        """
+        Highest-priority satisfied rule (what make_refund_decision picks), or None
+        """
+        if not self.satisfied_mask:
+            return None
+        return self.rules[(self.satisfied_mask & -self.satisfied_mask).bit_length() - 1]
+
+    def pending_mask(self):
+        """Bitmask of rules neither satisfied nor refuted"""
+        all_rules = (1 << len(self.rules)) - 1
+        return all_rules & ~self.satisfied_mask & ~self.refuted_mask
+
+    def is_forced(self):
+        """
+        True when the first satisfied rule has no higher-priority rule still
+        pending, so no further answer can change the decision
+        """
+        if not self.satisfied_mask:
+            return False
+        first_bit = self.satisfied_mask & -self.satisfied_mask
+        return not (self.pending_mask() & (first_bit - 1))
+
+    def pending_fields(self):
+        """
+        Fields still missing for any pending rule
+        """
+        fields = set()
+        pending = self.pending_mask()
+        for position in range(len(self.rules)):
+            if pending & (1 << position):
+                fields |= self.missing[position]
+        return fields
@@ -0,0 +1,270 @@
+# Static analysis of DECISION_RULES against DECISION_NODES
+import itertools
+import json
+import os
+import sys
+
+from decision_nodes import DECISION_NODES
+from decision_brute_force import DECISION_RULES, FIELD_PRIORITY_ORDER
+from decision_index import RuleIndex
+
+WILDCARD = "*"
+# Findings accepted for the shipped rules; --check fails only on new ones
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rule_analyzer_baseline.json")
+
+def rule_fields(rules):
+    """
+    Fields any rule conditions on, in FIELD_PRIORITY_ORDER where listed
+    """
+    fields = {field for rule in rules for field in rule["conditions"]}
+    ordered = [f for f in FIELD_PRIORITY_ORDER if f in fields]
+    return ordered + sorted(fields - set(ordered))
+
+def find_unknown_values(rules):
+    """
+    (rule_id, field, value) for every condition naming a field or value
+    that does not exist in DECISION_NODES; value is None for unknown fields
+    """
+    problems = []
+    for rule in rules:
+        for field, required_value in rule["conditions"].items():
+            if field not in DECISION_NODES:
+                problems.append((rule["id"], field, None))
+                continue
+            values = required_value if isinstance(required_value, list) else [required_value]
+            for value in values:
+                if value not in DECISION_NODES[field]["values"]:
+                    problems.append((rule["id"], field, value))
+    return problems
+
+def find_dead_ends(rules):
+    """
+    Every combination of known values for the rule fields that matches no
+    rule, compressed into patterns where '*' means any value of that field
+    """
+    fields, dead_ends = dead_end_combinations(rules)
+    domains = [DECISION_NODES[field]["values"] for field in fields]
+    count = len(dead_ends)
+
+    # Collapse a field to '*' wherever every one of its values is a dead
+    # end; repeat until stable since one collapse can enable another
+    patterns = dead_ends
+    previous = None
+    while patterns != previous:
+        previous = patterns
+        for position, domain in enumerate(domains):
+            patterns = _collapse_field(patterns, position, set(domain))
+
+    return count, [dict(zip(fields, pattern)) for pattern in sorted(patterns)]
+
+def dead_end_combinations(rules):
+    """
+    (fields, set of value tuples) for every fully known combination of
+    the rule fields that matches no rule
+    """
+    index = RuleIndex(rules)
+    fields = [f for f in rule_fields(rules) if f in DECISION_NODES]
+    domains = [DECISION_NODES[field]["values"] for field in fields]
+
+    dead_ends = set()
+    for values in itertools.product(*domains):
+        if index.match(dict(zip(fields, values))) is None:
+            dead_ends.add(values)
+    return fields, dead_ends
+
+def _collapse_field(patterns, position, domain):
+    """Merge patterns that differ only in position and cover its domain"""
+    groups = {}
+    for pattern in patterns:
+        key = pattern[:position] + pattern[position + 1:]
+        groups.setdefault(key, set()).add(pattern[position])
+
+    collapsed = set()
+    for key, seen in groups.items():
+        if seen == domain:
+            collapsed.add(key[:position] + (WILDCARD,) + key[position:])
+        else:
+            for value in seen:
+                collapsed.add(key[:position] + (value,) + key[position:])
+    return collapsed
+
+def find_unreachable_rules(rules):
+    """
+    Rules that are never the first match for any combination of node values
+    (each field also possibly missing). Returns (unsatisfiable, shadowed):
+    rule ids that never match at all, and {rule_id: ids of the
+    higher-priority rules that always win} for rules that match but never win.
+    """
+    index = RuleIndex(rules)
+    fields = rule_fields(rules)
+    domains = [DECISION_NODES.get(field, {}).get("values", []) + [None] for field in fields]
+
+    matched = 0
+    first = 0
+    winners = {}
+    for values in itertools.product(*domains):
+        data = {field: value for field, value in zip(fields, values) if value is not None}
+        candidates = index.candidate_mask(data)
+        if not candidates:
+            continue
+        first_bit = candidates & -candidates
+        matched |= candidates
+        first |= first_bit
+
+        # Remember who beats each matching-but-losing rule
+        losers = candidates & ~first_bit
+        position = 0
+        while losers:
+            if losers & 1:
+                winners.setdefault(position, set()).add(first_bit.bit_length() - 1)
+            losers >>= 1
+            position += 1
+
+    unsatisfiable = []
+    shadowed = {}
+    for position, rule in enumerate(index.rules):
+        bit = 1 << position
+        if not matched & bit:
+            unsatisfiable.append(rule["id"])
+        elif not first & bit:
+            shadowed[rule["id"]] = sorted(index.rules[p]["id"] for p in winners[position])
+    return unsatisfiable, shadowed
+
+def analyze_rules(rules=None):
+    """
+    Run every check and return the findings as a dict
+    """
+    rules = DECISION_RULES if rules is None else rules
+    dead_end_count, dead_end_patterns = find_dead_ends(rules)
+    unsatisfiable, shadowed = find_unreachable_rules(rules)
+    return {
+        "unknown_values": find_unknown_values(rules),
+        "unsatisfiable_rules": unsatisfiable,
+        "shadowed_rules": shadowed,
+        "dead_end_count": dead_end_count,
+        "dead_end_patterns": dead_end_patterns
+    }
+
+def print_report(findings, limit=50):
+    """Print analyzer findings in readable form"""
+    print("RULE SET ANALYSIS")
+    print("=" * 50)
+
+    print(f"\nConditions using values not in DECISION_NODES: {len(findings['unknown_values'])}")
+    for rule_id, field, value in findings["unknown_values"]:
+        if value is None:
+            print(f"  • {rule_id}: unknown field '{field}'")
+        else:
+            print(f"  • {rule_id}: {field}='{value}'")
+
+    print(f"\nRules that can never match: {len(findings['unsatisfiable_rules'])}")
+    for rule_id in findings["unsatisfiable_rules"]:
+        print(f"  • {rule_id}")
+
+    print(f"\nRules shadowed by higher-priority rules: {len(findings['shadowed_rules'])}")
+    for rule_id, winners in findings["shadowed_rules"].items():
+        print(f"  • {rule_id} (always beaten by {', '.join(winners)})")
+
+    patterns = findings["dead_end_patterns"]
+    print(f"\nDead-end fact combinations (all rule fields known, no decision): "
+          f"{findings['dead_end_count']} in {len(patterns)} patterns")
+    for pattern in patterns[:limit]:
+        shown = [f"{field}={value}" for field, value in pattern.items() if value != WILDCARD]
+        print(f"  • {', '.join(shown) or 'any combination'}")
+    if len(patterns) > limit:
+        print(f"  ... {len(patterns) - limit} more (use --limit N to see more)")
+
+def load_baseline(path=DEFAULT_BASELINE):
+    """Accepted findings from path; an empty baseline if there is no file"""
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def write_baseline(findings, path=DEFAULT_BASELINE):
+    """Accept every current finding, so only later regressions fail --check"""
+    baseline = {
+        "unknown_values": [list(problem) for problem in findings["unknown_values"]],
+        "unsatisfiable_rules": findings["unsatisfiable_rules"],
+        "shadowed_rules": findings["shadowed_rules"],
+        "dead_end_patterns": [
+            {field: value for field, value in pattern.items() if value != WILDCARD}
+            for pattern in findings["dead_end_patterns"]
+        ]
+    }
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2)
+        f.write("\n")
+
+def new_findings(findings, baseline, rules=None):
+    """
+    The part of findings the baseline does not accept, in the same shape.
+    A dead end is accepted when a baseline pattern covers it; fields a
+    pattern does not name count as '*'.
+    """
+    rules = DECISION_RULES if rules is None else rules
+    known_problems = {tuple(problem) for problem in baseline.get("unknown_values", [])}
+    accepted_patterns = baseline.get("dead_end_patterns", [])
+
+    fields, dead_ends = dead_end_combinations(rules)
+    uncovered = []
+    for values in sorted(dead_ends):
+        combination = dict(zip(fields, values))
+        if not any(_covers(pattern, combination) for pattern in accepted_patterns):
+            uncovered.append(combination)
+
+    return {
+        "unknown_values": [p for p in findings["unknown_values"] if tuple(p) not in known_problems],
+        "unsatisfiable_rules": [r for r in findings["unsatisfiable_rules"]
+                                if r not in baseline.get("unsatisfiable_rules", [])],
+        "shadowed_rules": {r: w for r, w in findings["shadowed_rules"].items()
+                           if r not in baseline.get("shadowed_rules", {})},
+        "dead_end_count": len(uncovered),
+        "dead_end_patterns": uncovered
+    }
+
+def _covers(pattern, combination):
+    """True if every field pattern pins has the combination's value"""
+    return all(pattern.get(field, WILDCARD) in (WILDCARD, value)
+               for field, value in combination.items())
+
+def has_findings(findings):
+    """True if anything in the report should block shipping the rules"""
+    return bool(findings["unknown_values"] or findings["unsatisfiable_rules"] or
+                findings["shadowed_rules"] or findings["dead_end_count"])
+
+if __name__ == "__main__":
+    limit = 50
+    baseline_path = DEFAULT_BASELINE
+    paths = []
+    args = iter(sys.argv[1:])
+    for arg in args:
+        if arg == "--limit":
+            limit = int(next(args))
+        elif arg == "--baseline":
+            baseline_path = next(args)
+        elif not arg.startswith("--"):
+            paths.append(arg)
+
+    # Optional rules file to analyze instead of the built-in DECISION_RULES
+    rules = None
+    if paths:
+        from rule_loader import load_rules_file
+        rules = load_rules_file(paths[0])
+
+    findings = analyze_rules(rules)
+    print_report(findings, limit)
+
+    if "--update-baseline" in sys.argv:
+        write_baseline(findings, baseline_path)
+        print(f"\nAccepted current findings in {baseline_path}")
+
+    # --check fails CI on any finding the baseline does not accept
+    if "--check" in sys.argv:
+        regressions = new_findings(findings, load_baseline(baseline_path), rules)
+        if has_findings(regressions):
+            print("\nFINDINGS NOT IN THE BASELINE")
+            print_report(regressions, limit)
+            sys.exit(1)
+        print(f"\nNo findings beyond the baseline ({baseline_path})")
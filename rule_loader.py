@@ -0,0 +1,285 @@
+# Loading, validating and hot-reloading refund rules from external JSON/YAML files
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+
+from config import RULES_FILE, RULES_POLL_INTERVAL, OUTCOME_TABLE, USE_QUESTION_PLANNER
+from decision_nodes import DECISION_NODES
+from decision_brute_force import DECISION_RULES, get_decision_outcomes
+from decision_index import RuleIndex
+from outcome_table import load_outcome_table, outcome_table_path
+from question_planner import QuestionPlanner
+from rule_analyzer import find_unknown_values
+
+REQUIRED_KEYS = ["id", "priority", "conditions", "decision", "reason", "confidence"]
+
+def rules_checksum(rules):
+    """SHA-256 over the rules' canonical JSON; equal rules mean an equal policy"""
+    return hashlib.sha256(json.dumps(rules, sort_keys=True).encode("utf-8")).hexdigest()
+
+class RuleValidationError(ValueError):
+    """Raised when a rules file does not describe a usable rule set"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__("; ".join(errors))
+
+class RuleSet:
+    """
+    One immutable, compiled version of the refund policy. Conversations hold
+    on to the RuleSet they started with, so a reload never changes the
+    rules under an in-flight conversation.
+    """
+
+    def __init__(self, rules, source="built-in", version=1):
+        start = time.perf_counter()
+        self.rules = rules
+        self.index = RuleIndex(rules)
+        self.compile_ms = (time.perf_counter() - start) * 1000
+
+        self.source = source
+        self.version = version
+        self.checksum = rules_checksum(rules)
+        self.warnings = [
+            f"{rule_id}: {field}='{value}' is not a DECISION_NODES value"
+            for rule_id, field, value in find_unknown_values(rules) if value is not None
+        ]
+        if OUTCOME_TABLE:
+            self.attach_outcome_table()
+
+        # Plan up front, on whichever thread builds or reloads the rules,
+        # instead of inside the first conversation that asks a question
+        self._planner = None
+        self.plan_ms = 0.0
+        if USE_QUESTION_PLANNER:
+            start = time.perf_counter()
+            self._planner = QuestionPlanner(rule_index=self.index)
+            self._planner.precompute()
+            self.plan_ms = (time.perf_counter() - start) * 1000
+
+    def attach_outcome_table(self):
+        """
+        Answer index lookups from this version's precomputed outcome table.
+        Rules the table cannot represent keep plain index lookups.
+        """
+        path = outcome_table_path(self.index)
+        try:
+            self.index.outcome_table = load_outcome_table(path, self.index)
+        except (OSError, ValueError) as e:
+            self.warnings.append(f"outcome table disabled: {e}")
+
+    def get_planner(self):
+        """Question planner for this rule version (precomputed when enabled)"""
+        if self._planner is None:
+            self._planner = QuestionPlanner(rule_index=self.index)
+        return self._planner
+
+def load_rules_file(path):
+    """
+    Read rules from a .json, .yaml or .yml file holding either a list of
+    rules or {"rules": [...]}
+    """
+    with open(path, "r") as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml  # only needed for YAML rule files
+            except ImportError:
+                raise RuleValidationError([f"{path}: YAML rule files need the pyyaml package "
+                                           f"(pip install pyyaml), or use JSON"])
+            try:
+                data = yaml.safe_load(f)
+            except yaml.YAMLError as e:
+                raise RuleValidationError([f"{path}: {e}"])
+        else:
+            data = json.load(f)
+
+    if isinstance(data, dict):
+        data = data.get("rules")
+    if not isinstance(data, list):
+        raise RuleValidationError([f"{path} must contain a list of rules"])
+    return data
+
+def validate_rules(rules):
+    """
+    Check rule structure against DECISION_NODES; raises RuleValidationError.
+    Condition values outside a node's values are only warnings (see RuleSet),
+    matching what rule_analyzer reports.
+    """
+    errors = []
+    seen_ids = set()
+    decisions = [d for d in get_decision_outcomes() if d != "NEED_INFO"]
+
+    for position, rule in enumerate(rules):
+        if not isinstance(rule, dict):
+            errors.append(f"rule #{position} is not an object")
+            continue
+        label = rule.get("id", f"rule #{position}")
+
+        missing = [key for key in REQUIRED_KEYS if key not in rule]
+        if missing:
+            errors.append(f"{label}: missing {', '.join(missing)}")
+            continue
+
+        if rule["id"] in seen_ids:
+            errors.append(f"{label}: duplicate id")
+        seen_ids.add(rule["id"])
+
+        if not isinstance(rule["priority"], (int, float)):
+            errors.append(f"{label}: priority must be a number")
+        if rule["decision"] not in decisions:
+            errors.append(f"{label}: unknown decision '{rule['decision']}'")
+        if not isinstance(rule["confidence"], (int, float)) or not 0 <= rule["confidence"] <= 1:
+            errors.append(f"{label}: confidence must be between 0 and 1")
+
+        if not isinstance(rule["conditions"], dict) or not rule["conditions"]:
+            errors.append(f"{label}: conditions must be a non-empty object")
+            continue
+        for field, required_value in rule["conditions"].items():
+            if field not in DECISION_NODES:
+                errors.append(f"{label}: unknown field '{field}'")
+            values = required_value if isinstance(required_value, list) else [required_value]
+            if not values or not all(isinstance(v, str) for v in values):
+                errors.append(f"{label}: {field} must be a value or a non-empty list of values")
+
+    if errors:
+        raise RuleValidationError(errors)
+
+class RuleRegistry:
+    """
+    Holds the active RuleSet and swaps in a newly compiled one when the
+    rules file changes. Readers just take current(); the swap is a single
+    reference assignment, and reloads run on a background watcher thread.
+    Reload messages go to log.
+    """
+
+    def __init__(self, path=None, log=print):
+        self.path = path
+        self.log = log
+        self.active = None
+        self.last_error = None
+        self._file_stamp = None
+        self._reload_lock = threading.Lock()
+        self._reloads_started = 0
+        self._reload_swapped = 0
+        self._watcher = None
+        self._stop = threading.Event()
+
+        if path:
+            self.reload()
+        # Built-in rules only when there is no usable file, so startup
+        # compiles and plans a single RuleSet
+        if self.active is None:
+            self.active = RuleSet(DECISION_RULES)
+
+    def current(self):
+        """The RuleSet new conversations should use"""
+        return self.active
+
+    def reload(self):
+        """
+        Load, validate and compile the rules file, then swap it in.
+        Returns True if a new version became active; on failure the
+        previous version stays active and last_error is set.
+        Compiling and planning run outside the lock, which only covers
+        the swap; when reloads overlap, the one started last wins.
+        """
+        with self._reload_lock:
+            self._reloads_started += 1
+            ticket = self._reloads_started
+
+        try:
+            # Remember the stamp even on failure so a broken file is
+            # reported once, not on every poll
+            self._file_stamp = self._stat()
+            rules = load_rules_file(self.path)
+            validate_rules(rules)
+            active = self.active
+            if active is not None and rules_checksum(rules) == active.checksum:
+                return False
+            rule_set = RuleSet(rules, source=self.path)
+        except (OSError, ValueError) as e:
+            with self._reload_lock:
+                if ticket > self._reload_swapped:
+                    self.last_error = str(e)
+            self.log(f"Rules reload failed ({self.path}): {e}")
+            return False
+
+        with self._reload_lock:
+            if ticket < self._reload_swapped:
+                return False  # a later reload already swapped in newer rules
+            if self.active is not None and rule_set.checksum == self.active.checksum:
+                return False
+            rule_set.version = self.active.version + 1 if self.active is not None else 1
+            self.active = rule_set
+            self.last_error = None
+            self._reload_swapped = ticket
+
+        self.log(f"Loaded rules v{rule_set.version} from {self.path}: "
+                 f"{len(rules)} rules compiled in {rule_set.compile_ms:.2f} ms, "
+                 f"planned in {rule_set.plan_ms:.0f} ms")
+        for warning in rule_set.warnings:
+            self.log(f"  Warning: {warning}")
+        return True
+
+    def _stat(self):
+        """File identity used to notice edits and atomic replacements"""
+        info = os.stat(self.path)
+        return (info.st_mtime_ns, info.st_size, info.st_ino)
+
+    def start_watching(self, interval=RULES_POLL_INTERVAL):
+        """Poll the rules file on a daemon thread and reload on change"""
+        if not self.path or self._watcher is not None:
+            return
+        self._watcher = threading.Thread(target=self._watch, args=(interval,), daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self):
+        self._stop.set()
+
+    def _watch(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                changed = self._stat() != self._file_stamp
+            except OSError:
+                continue
+            if changed:
+                self.reload()
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_rule_registry():
+    """Process-wide registry for RULES_FILE (built-in rules when unset)"""
+    global _registry
+    # Building a RuleSet plans every question, so threads must not race it
+    with _registry_lock:
+        if _registry is None:
+            _registry = RuleRegistry(RULES_FILE)
+    return _registry
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+
+    if command == "export" and len(sys.argv) > 2:
+        with open(sys.argv[2], "w") as f:
+            json.dump({"rules": DECISION_RULES}, f, indent=2)
+        print(f"Wrote {len(DECISION_RULES)} rules to {sys.argv[2]}")
+    elif command == "check" and len(sys.argv) > 2:
+        try:
+            rules = load_rules_file(sys.argv[2])
+            validate_rules(rules)
+        except RuleValidationError as e:
+            print(f"Invalid rules file {sys.argv[2]}:")
+            for error in e.errors:
+                print(f"  • {error}")
+            sys.exit(1)
+        rule_set = RuleSet(rules, source=sys.argv[2])
+        print(f"{len(rules)} rules compiled in {rule_set.compile_ms:.2f} ms")
+        for warning in rule_set.warnings:
+            print(f"  Warning: {warning}")
+    else:
+        print("Usage: python rule_loader.py [export|check] <rules.json|rules.yaml>")
+        sys.exit(2)
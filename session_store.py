@@ -0,0 +1,570 @@
+# Versioned binary snapshots of a conversation and pluggable stores for them (memory LRU, SQLite, files)
+import json
+import os
+import re
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from conversation_manager import ConversationManager, quiet_log
+from decision_nodes import DECISION_NODES
+from fact_store import make_fact
+from llm_metering import SessionMeter
+from config import SESSION_STORE, SESSION_STORE_PATH, SESSION_STORE_MEMORY_ENTRIES, SESSION_STORE_BUSY_TIMEOUT
+
+SNAPSHOT_MAGIC = b"RS"
+SNAPSHOT_VERSION = 2
+
+# Names written as small table indexes; anything else is written out in full
+STATES = ["INITIAL", "IN_PROGRESS", "COMPLETE"]
+FIELD_NAMES = list(DECISION_NODES)
+SOURCE_NAMES = ["user_input", "account_data", "inferred"]
+SITE_NAMES = ["extract_info", "generate_smart_question", "prefetch_question"]
+METER_COUNTS = ["calls", "errors", "estimated", "prompt_tokens", "cached_tokens", "completion_tokens"]
+METER_AMOUNTS = ["cost_usd", "seconds"]
+
+# Table indexes only mean the same thing to a reader with the same tables;
+# a snapshot written against different DECISION_NODES is refused
+SCHEMA_FINGERPRINT = zlib.crc32(json.dumps(
+    [STATES, [(field, DECISION_NODES[field]["values"]) for field in FIELD_NAMES], SOURCE_NAMES, SITE_NAMES],
+    default=str
+).encode("utf-8"))
+
+FLAG_ACCOUNT = 1
+FLAG_METER_FINISHED = 2
+
+# Value codes below VALUE_KNOWN are types; VALUE_KNOWN + i is the field's i-th DECISION_NODES value
+VALUE_STR, VALUE_INT, VALUE_FLOAT, VALUE_TRUE, VALUE_FALSE, VALUE_NONE, VALUE_JSON = range(7)
+VALUE_KNOWN = 7
+
+class SessionSnapshotError(ValueError):
+    """Snapshot bytes that are corrupt, truncated or from an incompatible format or schema"""
+
+class _Writer:
+    """Varints, length-prefixed UTF-8 and table symbols into one buffer"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def uint(self, n):
+        while n >= 0x80:
+            self.buffer.append(n & 0x7F | 0x80)
+            n >>= 7
+        self.buffer.append(n)
+
+    def blob(self, data):
+        self.uint(len(data))
+        self.buffer += data
+
+    def text(self, text):
+        self.blob(text.encode("utf-8"))
+
+    def double(self, x):
+        self.buffer += struct.pack("<d", x)
+
+    def symbol(self, name, table):
+        """0 = None, 1 = a string follows, 2 + i = table[i]"""
+        if name is None:
+            self.uint(0)
+        elif name in table:
+            self.uint(2 + table.index(name))
+        else:
+            self.uint(1)
+            self.text(str(name))
+
+    def value(self, field, value):
+        known = DECISION_NODES[field]["values"] if field in DECISION_NODES else []
+        if isinstance(value, str) and value in known:
+            self.uint(VALUE_KNOWN + known.index(value))
+        elif isinstance(value, bool) or value is None:
+            self.uint({True: VALUE_TRUE, False: VALUE_FALSE, None: VALUE_NONE}[value])
+        elif isinstance(value, str):
+            self.uint(VALUE_STR)
+            self.text(value)
+        elif isinstance(value, int):
+            self.uint(VALUE_INT)
+            self.uint(value * 2 if value >= 0 else -value * 2 - 1)
+        elif isinstance(value, float):
+            self.uint(VALUE_FLOAT)
+            self.double(value)
+        else:
+            self.uint(VALUE_JSON)
+            self.text(json.dumps(value, default=str))
+
+    def confidence(self, confidence):
+        """Whole thousandths (every confidence this code assigns) in a varint, anything else as a double"""
+        thousandths = round(confidence * 1000)
+        if 0 <= thousandths and thousandths / 1000 == confidence:
+            self.uint(thousandths * 2)
+        else:
+            self.uint(1)
+            self.double(confidence)
+
+    def totals(self, totals):
+        for key in METER_COUNTS:
+            self.uint(totals[key])
+        for key in METER_AMOUNTS:
+            self.double(totals[key])
+
+class _Reader:
+    def __init__(self, data):
+        self.data = data
+        self.offset = 0
+
+    def take(self, length):
+        end = self.offset + length
+        if end > len(self.data):
+            raise SessionSnapshotError("snapshot is truncated")
+        chunk = self.data[self.offset:end]
+        self.offset = end
+        return chunk
+
+    def uint(self):
+        n = 0
+        shift = 0
+        while True:
+            byte = self.take(1)[0]
+            n |= (byte & 0x7F) << shift
+            if byte < 0x80:
+                return n
+            shift += 7
+
+    def blob(self):
+        return self.take(self.uint())
+
+    def text(self):
+        return str(self.blob(), "utf-8")
+
+    def double(self):
+        return struct.unpack("<d", self.take(8))[0]
+
+    def symbol(self, table):
+        code = self.uint()
+        if code == 0:
+            return None
+        if code == 1:
+            return self.text()
+        return table[code - 2]
+
+    def value(self, field):
+        code = self.uint()
+        if code >= VALUE_KNOWN:
+            return DECISION_NODES[field]["values"][code - VALUE_KNOWN]
+        if code == VALUE_STR:
+            return self.text()
+        if code == VALUE_INT:
+            n = self.uint()
+            return n // 2 if n % 2 == 0 else -(n + 1) // 2
+        if code == VALUE_FLOAT:
+            return self.double()
+        if code == VALUE_JSON:
+            return json.loads(self.text())
+        return {VALUE_TRUE: True, VALUE_FALSE: False, VALUE_NONE: None}[code]
+
+    def confidence(self):
+        code = self.uint()
+        return self.double() if code == 1 else code // 2 / 1000
+
+    def totals(self):
+        totals = {key: self.uint() for key in METER_COUNTS}
+        totals.update({key: self.double() for key in METER_AMOUNTS})
+        return totals
+
+def snapshot(conversation):
+    """
+    The state a ConversationManager needs to carry on in another process,
+    as compact bytes: conversation state and the field being asked, the
+    pinned rule version, account and extracted facts with their free-text
+    reasoning, the transcript and the LLM usage meter. Prefetches in flight and caches are not kept;
+    the rule agenda is rebuilt from the facts on restore.
+    """
+    extractor = conversation.extractor
+    meter = conversation.meter
+    writer = _Writer()
+    writer.buffer += SNAPSHOT_MAGIC + bytes([SNAPSHOT_VERSION]) + struct.pack("<I", SCHEMA_FINGERPRINT)
+
+    flags = (FLAG_ACCOUNT if extractor.account_data else 0) | (FLAG_METER_FINISHED if meter.finished else 0)
+    writer.uint(flags)
+    writer.symbol(conversation.current_state, STATES)
+    writer.symbol(conversation.current_field_needed, FIELD_NAMES)
+    writer.uint(conversation.rule_set.version)
+    writer.buffer += bytes.fromhex(conversation.rule_set.checksum[:16])
+
+    summary = meter.summary()
+    writer.text(meter.session_id)
+    writer.uint(summary["turns_taken"])
+    writer.totals(summary["totals"])
+    writer.uint(len(summary["turns"]))
+    for turn, totals in summary["turns"].items():
+        writer.uint(turn)
+        writer.totals(totals)
+    writer.uint(len(summary["sites"]))
+    for site, totals in summary["sites"].items():
+        writer.symbol(site, SITE_NAMES)
+        writer.totals(totals)
+
+    if flags & FLAG_ACCOUNT:
+        writer.text(json.dumps(extractor.account_data, separators=(",", ":")))
+
+    extracted = extractor.extracted_data
+    reasons = extractor.facts.reasons or {}
+    writer.uint(len(extracted))
+    for field, fact in extracted.items():
+        writer.symbol(field, FIELD_NAMES)
+        writer.value(field, fact.value)
+        writer.confidence(fact.confidence)
+        writer.symbol(fact.source, SOURCE_NAMES)
+        writer.uint(fact.reason_id)
+        writer.symbol(fact.detail, [])
+        writer.symbol(reasons.get(field), [])
+
+    writer.uint(len(conversation.transcript))
+    for turn in conversation.transcript:
+        writer.text(turn["message"])
+        writer.symbol(turn["field_asked"], FIELD_NAMES)
+        writer.uint(len(turn["extractions"]))
+        reasoning = turn.get("reasoning", {})
+        for field, value in turn["extractions"].items():
+            writer.symbol(field, FIELD_NAMES)
+            writer.value(field, value)
+            writer.symbol(reasoning.get(field), [])
+
+    history = conversation.conversation_history
+    writer.text(json.dumps(history, default=str) if history else "")
+
+    writer.buffer += struct.pack("<I", zlib.crc32(writer.buffer))
+    return bytes(writer.buffer)
+
+def restore(data, account_file="account_data.json", log=print):
+    """
+    A ConversationManager carrying on from snapshot bytes. Account data in
+    the snapshot replaces what account_file holds. If the rules changed
+    since the snapshot, the conversation continues on the current version.
+    log is the restored conversation's log sink.
+    """
+    if len(data) < 11 or data[:2] != SNAPSHOT_MAGIC:
+        raise SessionSnapshotError("not a session snapshot")
+    if data[2] != SNAPSHOT_VERSION:
+        raise SessionSnapshotError(f"snapshot format v{data[2]}, this reader handles v{SNAPSHOT_VERSION}")
+    if struct.unpack("<I", data[-4:])[0] != zlib.crc32(data[:-4]):
+        raise SessionSnapshotError("snapshot checksum mismatch")
+    if struct.unpack("<I", data[3:7])[0] != SCHEMA_FINGERPRINT:
+        raise SessionSnapshotError("snapshot was written for different decision fields")
+
+    reader = _Reader(memoryview(data)[7:-4])
+    try:
+        flags = reader.uint()
+        state = reader.symbol(STATES)
+        field_needed = reader.symbol(FIELD_NAMES)
+        rules_version = reader.uint()
+        rules_checksum = bytes(reader.take(8)).hex()
+
+        meter = SessionMeter(reader.text())
+        meter.turn = reader.uint()
+        meter.totals = reader.totals()
+        meter.turns = {}
+        for _ in range(reader.uint()):
+            turn = reader.uint()
+            meter.turns[turn] = reader.totals()
+        meter.sites = {}
+        for _ in range(reader.uint()):
+            site = reader.symbol(SITE_NAMES)
+            meter.sites[site] = reader.totals()
+        meter.finished = bool(flags & FLAG_METER_FINISHED)
+
+        account = json.loads(reader.text()) if flags & FLAG_ACCOUNT else None
+
+        extracted = {}
+        reasons = {}
+        for _ in range(reader.uint()):
+            field = reader.symbol(FIELD_NAMES)
+            value = reader.value(field)
+            confidence = reader.confidence()
+            source = reader.symbol(SOURCE_NAMES)
+            reason = reader.uint()
+            extracted[field] = make_fact(field, value, confidence, source, reason, reader.symbol([]))
+            text = reader.symbol([])
+            if text is not None:
+                reasons[field] = text
+
+        transcript = []
+        for _ in range(reader.uint()):
+            message = reader.text()
+            field_asked = reader.symbol(FIELD_NAMES)
+            extractions = {}
+            reasoning = {}
+            for _ in range(reader.uint()):
+                field = reader.symbol(FIELD_NAMES)
+                extractions[field] = reader.value(field)
+                text = reader.symbol([])
+                if text is not None:
+                    reasoning[field] = text
+            transcript.append({"message": message, "field_asked": field_asked,
+                               "extractions": extractions, "reasoning": reasoning})
+
+        history = reader.text()
+    except (IndexError, KeyError, UnicodeDecodeError, ValueError) as e:
+        if isinstance(e, SessionSnapshotError):
+            raise
+        raise SessionSnapshotError(f"snapshot is corrupt: {e}")
+
+    conversation = ConversationManager(account_file, log=log)
+    if not conversation.rule_set.checksum.startswith(rules_checksum):
+        log(f"Rules changed since this conversation was saved (v{rules_version}); "
+              f"continuing on v{conversation.rule_set.version}")
+    if account is not None:
+        conversation.extractor.account_data = account
+    conversation.extractor.facts.set_extracted(extracted, reasons)
+    conversation.current_state = state
+    conversation.current_field_needed = field_needed
+    conversation.transcript = transcript
+    conversation.conversation_history = json.loads(history) if history else []
+    conversation.meter = meter
+    return conversation
+
+class SessionStore(ABC):
+    """
+    Snapshots by session id. Any worker can load(), run a turn and save()
+    back; stores are last-write-wins, so a session's turns should go
+    through one at a time. Backends implement get/put/delete on bytes.
+    """
+
+    def load(self, session_id, account_file="account_data.json", log=print):
+        """The stored conversation, or None"""
+        data = self.get(session_id)
+        return None if data is None else restore(data, account_file, log)
+
+    def save(self, session_id, conversation):
+        """Snapshot the conversation; returns the snapshot size in bytes"""
+        data = snapshot(conversation)
+        self.put(session_id, data)
+        return len(data)
+
+    @abstractmethod
+    def get(self, session_id):
+        """Snapshot bytes, or None"""
+
+    @abstractmethod
+    def put(self, session_id, data):
+        """Store snapshot bytes, replacing any earlier ones"""
+
+    @abstractmethod
+    def delete(self, session_id):
+        """Forget the session; a missing id is not an error"""
+
+    def close(self):
+        pass
+
+class MemorySessionStore(SessionStore):
+    """Process-local LRU of snapshots (tests, single workers); the oldest drop out past max_entries"""
+
+    def __init__(self, max_entries=SESSION_STORE_MEMORY_ENTRIES):
+        self.max_entries = max_entries
+        self.snapshots = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, session_id):
+        with self.lock:
+            data = self.snapshots.get(session_id)
+            if data is not None:
+                self.snapshots.move_to_end(session_id)
+            return data
+
+    def put(self, session_id, data):
+        with self.lock:
+            self.snapshots[session_id] = data
+            self.snapshots.move_to_end(session_id)
+            while len(self.snapshots) > self.max_entries:
+                self.snapshots.popitem(last=False)
+
+    def delete(self, session_id):
+        with self.lock:
+            self.snapshots.pop(session_id, None)
+
+class SQLiteSessionStore(SessionStore):
+    """
+    One SQLite table shared by every worker on a host (WAL mode, so
+    readers don't wait on the writer). expire() drops sessions not saved
+    for a while. A write that waits busy_timeout for the lock raises
+    sqlite3.OperationalError ("database is locked").
+    """
+
+    def __init__(self, path, busy_timeout=SESSION_STORE_BUSY_TIMEOUT):
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=busy_timeout)
+        self.lock = threading.Lock()
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "id TEXT PRIMARY KEY, snapshot BLOB NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions (updated_at)")
+        self.db.commit()
+
+    def get(self, session_id):
+        with self.lock:
+            row = self.db.execute("SELECT snapshot FROM sessions WHERE id = ?", (session_id,)).fetchone()
+        return bytes(row[0]) if row is not None else None
+
+    def put(self, session_id, data):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO sessions (id, snapshot, updated_at) VALUES (?, ?, ?)",
+                (session_id, data, time.time())
+            )
+            self.db.commit()
+
+    def delete(self, session_id):
+        with self.lock:
+            self.db.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+            self.db.commit()
+
+    def expire(self, max_age):
+        """Drop sessions last saved more than max_age seconds ago; returns how many"""
+        with self.lock:
+            cursor = self.db.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - max_age,))
+            self.db.commit()
+            return cursor.rowcount
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+class FileSessionStore(SessionStore):
+    """
+    One file per session under `directory` (a shared volume works across
+    hosts). Files are written beside and renamed into place, so a reader
+    never sees half a snapshot.
+    """
+    SAFE_ID = re.compile(r"[A-Za-z0-9_-]{1,128}")
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, session_id):
+        if not self.SAFE_ID.fullmatch(session_id):
+            raise ValueError(f"session id {session_id!r} is not usable as a file name")
+        return os.path.join(self.directory, session_id + ".session")
+
+    def get(self, session_id):
+        try:
+            with open(self.path(session_id), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, session_id, data):
+        path = self.path(session_id)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def delete(self, session_id):
+        try:
+            os.remove(self.path(session_id))
+        except FileNotFoundError:
+            pass
+
+def create_session_store(name=SESSION_STORE, path=SESSION_STORE_PATH):
+    """Store for a config name: memory, sqlite (path = database file) or files (path = directory); None for ''"""
+    if not name:
+        return None
+    if name == "memory":
+        return MemorySessionStore()
+    if name == "sqlite":
+        return SQLiteSessionStore(path or "sessions.sqlite3")
+    if name == "files":
+        return FileSessionStore(path or "sessions")
+    raise ValueError(f"Unknown SESSION_STORE {name!r} (expected memory, sqlite or files)")
+
+def _state_json(conversation):
+    """The snapshot's contents as plain JSON, for size comparison"""
+    return json.dumps({
+        "state": conversation.current_state,
+        "field_needed": conversation.current_field_needed,
+        "rules": [conversation.rule_set.version, conversation.rule_set.checksum],
+        "meter": conversation.meter.summary(),
+        "account": conversation.extractor.account_data,
+        "extracted": {field: dict(fact.items()) for field, fact in conversation.extractor.extracted_data.items()},
+        "transcript": conversation.transcript,
+        "history": conversation.conversation_history
+    }, default=str).encode("utf-8")
+
+def benchmark(sessions=500, seed=1):
+    """
+    Snapshot size, snapshot/restore time and save/load latency per store,
+    over conversations scripted on the stub backend and stopped at random
+    points. Each round-trip is checked against the original state.
+    """
+    import random
+    import tempfile
+    from llm_backends import StubBackend, set_llm_backend
+    from conversation_service import BENCH_REQUESTS, _bench_answer
+
+    set_llm_backend(StubBackend())
+    rng = random.Random(seed)
+    conversations = []
+    for _ in range(sessions):
+        conversation = ConversationManager(log=quiet_log, prefetch=False, stream_questions=False)
+        result = conversation.start_conversation(rng.choice(BENCH_REQUESTS))
+        conversation.current_state = "IN_PROGRESS"
+        for _ in range(rng.randint(0, 6)):
+            if result["status"] != "NEED_INPUT":
+                break
+            result = conversation.process_user_response(_bench_answer(rng, result["field_needed"]))
+        if result["status"] == "COMPLETE":
+            conversation.current_state = "COMPLETE"
+        conversations.append(conversation)
+
+    def percentile(values, q):
+        ordered = sorted(values)
+        return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+    def timed(function, items):
+        times = []
+        results = []
+        for item in items:
+            started = time.perf_counter()
+            results.append(function(item))
+            times.append((time.perf_counter() - started) * 1e6)
+        return results, times
+
+    snapshots, snapshot_times = timed(snapshot, conversations)
+    restored, restore_times = timed(lambda data: restore(data, log=quiet_log), snapshots)
+    mismatches = sum(_state_json(a) != _state_json(b) for a, b in zip(conversations, restored))
+    sizes = [len(data) for data in snapshots]
+    json_sizes = [len(_state_json(conversation)) for conversation in conversations]
+
+    print(f"Session snapshots: {sessions} conversations, {mismatches} round-trip mismatches")
+    print(f"  size: mean {sum(sizes) / len(sizes):.0f} B, p50 {percentile(sizes, 0.5)} B, max {max(sizes)} B "
+          f"(same state as JSON: mean {sum(json_sizes) / len(json_sizes):.0f} B)")
+    print(f"  snapshot: p50 {percentile(snapshot_times, 0.5):.0f}us, p99 {percentile(snapshot_times, 0.99):.0f}us")
+    print(f"  restore:  p50 {percentile(restore_times, 0.5):.0f}us, p99 {percentile(restore_times, 0.99):.0f}us "
+          f"(includes building the ConversationManager)")
+
+    with tempfile.TemporaryDirectory() as directory:
+        stores = [
+            ("memory", MemorySessionStore(max_entries=sessions)),
+            ("sqlite", SQLiteSessionStore(os.path.join(directory, "sessions.sqlite3"))),
+            ("files", FileSessionStore(os.path.join(directory, "sessions")))
+        ]
+        ids = [f"bench-{i}" for i in range(sessions)]
+        for name, store in stores:
+            _, put_times = timed(lambda i: store.put(ids[i], snapshots[i]), range(sessions))
+            loaded, get_times = timed(store.get, ids)
+            intact = sum(data == original for data, original in zip(loaded, snapshots))
+            print(f"  {name:<7} put p50 {percentile(put_times, 0.5):.0f}us p99 {percentile(put_times, 0.99):.0f}us, "
+                  f"get p50 {percentile(get_times, 0.5):.0f}us p99 {percentile(get_times, 0.99):.0f}us "
+                  f"({intact}/{sessions} intact)")
+            store.close()
+
+if __name__ == "__main__":
+    # python session_store.py [SESSIONS] -> snapshot and store benchmark
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,226 @@
+# Near-duplicate extraction cache: MinHash signatures over character n-grams with LSH buckets
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+from config import (
+    SIMILARITY_CACHE_ENABLED, SIMILARITY_CACHE_THRESHOLD, SIMILARITY_CACHE_MAX_ENTRIES
+)
+from keyword_matcher import KEYWORD_MATCHER, NEGATION_WORDS
+
+# Filler words that only make paraphrases look different
+STOPWORDS = {"a", "an", "the", "my", "i", "it", "is", "was", "its", "this", "that",
+             "me", "to", "and", "so", "just", "im", "i'm", "has", "have", "had"}
+
+# Entries kept per LSH bucket; a full bucket already holds enough near
+# duplicates to answer lookups, and the cap bounds the work per lookup
+BUCKET_LIMIT = 32
+
+NUMBER_PATTERN = re.compile(r"\d+(?:\.\d+)?")
+NUMBER_WORDS = {"one", "two", "three", "four", "five", "six", "seven", "eight", "nine", "ten",
+                "eleven", "twelve", "fifteen", "twenty", "thirty", "forty", "fifty", "sixty",
+                "ninety", "hundred", "a couple", "several", "few"}
+
+# Largest prime below 2**32: a * x + b stays inside uint64 for 32-bit a, x, b
+HASH_PRIME = 4294967291
+
+class SimilarityCache:
+    """
+    Returns stored extractions for messages similar to one seen before.
+    Each message gets a MinHash signature over character n-grams; LSH
+    bands index signatures so a lookup only scores a few candidates.
+    Candidates must also share the same keyword-vocabulary phrases,
+    negation words and numbers: n-gram overlap alone scores "the screen
+    is not cracked" at 0.8 against "the screen is cracked", and "20 weeks
+    ago" close to "2 weeks ago".
+    """
+
+    def __init__(self, threshold=SIMILARITY_CACHE_THRESHOLD, max_entries=SIMILARITY_CACHE_MAX_ENTRIES,
+                 num_hashes=32, bands=8, ngram=3, seed=1):
+        if num_hashes % bands:
+            raise ValueError("num_hashes must be a multiple of bands")
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ngram = ngram
+        self.bands = bands
+        self.rows = num_hashes // bands
+
+        rng = random.Random(seed)
+        self.hash_a = np.array([rng.randrange(1, HASH_PRIME) for _ in range(num_hashes)], dtype=np.uint64)
+        self.hash_b = np.array([rng.randrange(0, HASH_PRIME) for _ in range(num_hashes)], dtype=np.uint64)
+
+        # Signatures are kept as raw uint32 bytes and buckets keyed by an int
+        # hash of (namespace, band, band bytes) to keep per-entry memory small
+        self.entries = OrderedDict()   # entry id -> (namespace, signature bytes, extractions)
+        self.buckets = {}              # band key -> list of entry ids
+        self.next_id = 0
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "inserts": 0, "evictions": 0}
+
+    def signature(self, text):
+        """MinHash signature (uint32 array) of the message's character n-grams"""
+        words = [w for w in re.findall(r"[a-z0-9']+", text.lower()) if w not in STOPWORDS]
+        padded = " " + " ".join(words) + " "
+        shingles = np.array(
+            list({zlib.crc32(padded[i:i + self.ngram].encode("utf-8"))
+                  for i in range(max(1, len(padded) - self.ngram + 1))}),
+            dtype=np.uint64
+        )
+        hashed = (np.outer(self.hash_a, shingles) + self.hash_b[:, None]) % HASH_PRIME
+        return hashed.min(axis=1).astype(np.uint32)
+
+    def _band_keys(self, namespace, signature_bytes):
+        width = self.rows * 4
+        return [
+            hash((namespace, band, signature_bytes[band * width:(band + 1) * width]))
+            for band in range(self.bands)
+        ]
+
+    def _namespace(self, text, namespace):
+        """
+        Scope by caller namespace plus the parts of the text that must
+        match exactly: vocabulary phrases, negations and numbers
+        """
+        lowered = text.lower()
+        words = re.findall(r"[a-z0-9']+", lowered)
+        negations = frozenset(word for word in words if word in NEGATION_WORDS or word.endswith("n't"))
+        numbers = frozenset(NUMBER_PATTERN.findall(lowered)) | frozenset(
+            word for word in NUMBER_WORDS if re.search(rf"\b{word}\b", lowered))
+        return (namespace, KEYWORD_MATCHER.matched_phrases(text), negations, numbers)
+
+    def lookup(self, text, namespace=None):
+        """
+        (extractions, similarity) for the most similar stored message at
+        or above the threshold, or (None, best similarity seen)
+        """
+        signature = self.signature(text)
+        scope = self._namespace(text, namespace)
+        keys = self._band_keys(scope, signature.tobytes())
+
+        with self.lock:
+            candidates = set()
+            for key in keys:
+                candidates.update(self.buckets.get(key, ()))
+
+            best_id, best_score = None, 0.0
+            for entry_id in candidates:
+                stored_scope, stored, _ = self.entries[entry_id]
+                if stored_scope != scope:
+                    continue  # band hash collision across namespaces
+                score = np.count_nonzero(np.frombuffer(stored, dtype=np.uint32) == signature) / len(signature)
+                if score > best_score:
+                    best_id, best_score = entry_id, score
+
+            if best_id is not None and best_score >= self.threshold:
+                self.entries.move_to_end(best_id)
+                self.stats["hits"] += 1
+                return self.entries[best_id][2], best_score
+
+            self.stats["misses"] += 1
+            return None, best_score
+
+    def insert(self, text, extractions, namespace=None):
+        """Index a message and the extractions it produced"""
+        signature_bytes = self.signature(text).tobytes()
+        scope = self._namespace(text, namespace)
+
+        with self.lock:
+            entry_id = self.next_id
+            self.next_id += 1
+            self.entries[entry_id] = (scope, signature_bytes, extractions)
+            for key in self._band_keys(scope, signature_bytes):
+                bucket = self.buckets.setdefault(key, [])
+                if len(bucket) < BUCKET_LIMIT:
+                    bucket.append(entry_id)
+            self.stats["inserts"] += 1
+
+            while len(self.entries) > self.max_entries:
+                self._evict_oldest()
+
+    def _evict_oldest(self):
+        entry_id, (scope, signature_bytes, _) = self.entries.popitem(last=False)
+        for key in self._band_keys(scope, signature_bytes):
+            bucket = self.buckets.get(key)
+            if bucket is not None and entry_id in bucket:
+                bucket.remove(entry_id)
+                if not bucket:
+                    del self.buckets[key]
+        self.stats["evictions"] += 1
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self.entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
+
+_cache = None
+
+def get_similarity_cache():
+    """Process-wide similarity cache, or None when disabled in config"""
+    global _cache
+    if _cache is None and SIMILARITY_CACHE_ENABLED:
+        _cache = SimilarityCache()
+    return _cache
+
+# (stored message, new message, should the new one reuse the stored extraction)
+CHECK_PAIRS = [
+    ("the screen is cracked", "the screen is not cracked", False),
+    ("I bought it 2 weeks ago", "I bought it 20 weeks ago", False),
+    ("the screen is cracked", "the screen is fine", False),
+    ("it didn't arrive", "it did arrive", False),
+    ("my laptop screen is cracked please help", "the laptop screen is cracked, please help", True),
+    ("I bought it 2 weeks ago", "i bought it 2 weeks ago!", True),
+]
+
+def run_checks():
+    """Reuse decisions for CHECK_PAIRS; returns the pairs that went wrong"""
+    failures = []
+    for stored, message, expected in CHECK_PAIRS:
+        cache = SimilarityCache()
+        cache.insert(stored, {"checked": True})
+        reused, score = cache.lookup(message)
+        ok = (reused is not None) == expected
+        print(f"  {'ok  ' if ok else 'FAIL'} {message!r} {'reuses' if expected else 'does not reuse'} "
+              f"{stored!r} (score {score:.2f})")
+        if not ok:
+            failures.append((stored, message))
+    return failures
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "check":
+        sys.exit(1 if run_checks() else 0)
+
+    # Lookup latency at scale: python similarity_cache.py [entries]
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    rng = random.Random(7)
+    items = ["laptop", "phone", "jacket", "headphones", "tablet", "shoes", "blender", "camera"]
+    problems = ["screen is cracked", "arrived broken", "stopped working", "is the wrong size",
+                "never arrived", "came damaged", "has a faulty battery", "is missing parts"]
+    extras = ["order", "yesterday", "last month", "please help", "again", "from your site",
+              "with paypal", "as a gift", "for my son", "twice"]
+
+    def message():
+        return (f"my {rng.choice(items)} {rng.choice(problems)} {rng.choice(extras)} "
+                f"{rng.choice(extras)} {''.join(rng.choice('bcdfghjklm') for _ in range(6))}")
+
+    cache = SimilarityCache(max_entries=count)
+    start = time.perf_counter()
+    for _ in range(count):
+        cache.insert(message(), {"item_condition": {"value": "damaged", "confidence": 0.9}})
+    print(f"Inserted {count} entries in {time.perf_counter() - start:.1f}s")
+
+    queries = [message() for _ in range(2000)]
+    start = time.perf_counter()
+    for query in queries:
+        cache.lookup(query)
+    elapsed = time.perf_counter() - start
+    print(f"Lookup: {elapsed / len(queries) * 1000:.3f} ms average over {len(queries)} queries")
+    print(cache.get_stats())
@@ -0,0 +1,59 @@
+# Batch adjudication must agree with make_refund_decision row by row
+import json
+
+import numpy as np
+import pytest
+
+from batch_decisions import make_refund_decisions, make_refund_decisions_jsonl, decode_results
+from benchmark_decisions import iter_all_combinations, to_columns
+from decision_brute_force import make_refund_decision, get_critical_fields
+
+# Every 7th combination keeps the run short and still covers every value
+CASES = list(iter_all_combinations())[::7]
+
+def expected_rows(cases):
+    for data in cases:
+        result = make_refund_decision(data)
+        yield {"decision": result["decision"], "rule_id": result.get("rule_id"),
+               "field_needed": result.get("field_needed")}
+
+def test_string_columns_match_scalar_decisions():
+    rows = list(decode_results(make_refund_decisions(to_columns(CASES))))
+    assert rows == list(expected_rows(CASES))
+
+def test_numpy_string_arrays_match_scalar_decisions():
+    # Cases with every field present, so each column is a plain string array
+    cases = [data for data in CASES if len(data) == len(get_critical_fields())]
+    columns = {field: np.array(column) for field, column in to_columns(cases).items()}
+    rows = list(decode_results(make_refund_decisions(columns)))
+    assert rows == list(expected_rows(cases))
+
+def test_fact_dict_columns_and_unknown_values():
+    cases = CASES[:500]
+    columns = {
+        field: [case.get(field) for case in cases]  # {"value", "confidence"} dicts or None
+        for field in get_critical_fields()
+    }
+    columns["payment_method"] = ["cheque", ["not", "hashable"]] + columns["payment_method"][2:]
+    for i, value in enumerate(columns["payment_method"][:2]):
+        cases[i] = {**cases[i], "payment_method": {"value": value, "confidence": 1.0}}
+
+    rows = list(decode_results(make_refund_decisions(columns)))
+    assert rows == list(expected_rows(cases))
+
+def test_jsonl_matches_scalar_decisions(tmp_path):
+    path = tmp_path / "cases.jsonl"
+    with open(path, "w") as f:
+        for data in CASES:
+            f.write(json.dumps({field: fact["value"] for field, fact in data.items()}) + "\n")
+
+    rows = []
+    for first_row, results in make_refund_decisions_jsonl(str(path), chunk_size=1000):
+        assert first_row == len(rows)
+        rows.extend(decode_results(results))
+    assert rows == list(expected_rows(CASES))
+
+def test_integer_codes_must_fit_the_codebook():
+    field = get_critical_fields()[0]
+    with pytest.raises(ValueError):
+        make_refund_decisions({field: np.array([200], dtype=np.int64)})
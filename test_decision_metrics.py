@@ -0,0 +1,27 @@
+# NEED_INFO metrics count the field the conversation actually asks for
+import pytest
+
+import decision_metrics
+from benchmark_decisions import iter_all_combinations
+from decision_brute_force import make_refund_decision, traverse_decision_tree
+from rule_loader import get_rule_registry
+
+@pytest.fixture
+def metrics():
+    yield decision_metrics.enable()
+    decision_metrics.disable()
+
+def test_need_info_counts_the_planned_field(metrics):
+    planner = get_rule_registry().current().get_planner()
+    for data in iter_all_combinations():
+        traversal = traverse_decision_tree(data, planner)
+        if traversal["status"] == "NEED_MORE_INFO":
+            static_field = make_refund_decision(data)["field_needed"]
+            if traversal["stopping_field"] != static_field:
+                break
+    else:
+        pytest.skip("the planner never overrides the static field")
+
+    metrics.reset()
+    traversal = traverse_decision_tree(data, planner)
+    assert metrics.snapshot()["need_info"] == {traversal["stopping_field"]: 1}
@@ -0,0 +1,20 @@
+# Every decision path must agree with the brute-force rule scan on every combination
+import pytest
+
+from benchmark_decisions import (
+    check_equivalence, check_batch_equivalence, check_table_equivalence, check_agenda_equivalence
+)
+from outcome_table import load_outcome_table
+
+def test_rule_index_matches_brute_force():
+    assert check_equivalence() == []
+
+def test_batch_matches_rule_index():
+    assert check_batch_equivalence() == []
+
+def test_outcome_table_matches_rule_index(tmp_path):
+    table = load_outcome_table(str(tmp_path / "outcome_table.bin"))
+    assert check_table_equivalence(table) == []
+
+def test_agenda_matches_rule_index():
+    assert check_agenda_equivalence() == []
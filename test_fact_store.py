@@ -0,0 +1,41 @@
+# Free-text reasoning lives beside the interned facts and must survive summaries and snapshots
+import pytest
+
+from conversation_manager import ConversationManager, quiet_log
+from fact_store import FactStore
+from llm_backends import StubBackend, set_llm_backend
+from session_store import snapshot, restore
+
+REASONING = "Customer said the laptop arrived with a cracked screen"
+
+@pytest.fixture
+def conversation():
+    set_llm_backend(StubBackend())
+    yield ConversationManager(log=quiet_log)
+    set_llm_backend(None)
+
+def test_reasoning_is_kept_beside_the_shared_fact():
+    store = FactStore()
+    store.merge({"item_condition": {"value": "damaged", "confidence": 0.9, "reasoning": REASONING}})
+    other = FactStore()
+    other.merge({"item_condition": {"value": "damaged", "confidence": 0.9, "reasoning": "something else"}})
+
+    assert store.view["item_condition"] is other.view["item_condition"]
+    assert store.reasoning("item_condition") == REASONING
+    assert store.explain()["item_condition"]["reasoning"] == REASONING
+
+    store.extracted.pop("item_condition")
+    assert store.reasons == {}
+
+def test_summary_transcript_and_snapshot_keep_reasoning(conversation):
+    extracted = {"item_condition": {"value": "damaged", "confidence": 0.9, "reasoning": REASONING}}
+    conversation.extractor.facts.merge(extracted)
+    conversation.record_turn("the screen is cracked", None, extracted)
+
+    summary = conversation.get_conversation_summary()
+    assert summary["available_data"]["item_condition"]["reasoning"] == REASONING
+    assert conversation.transcript[-1]["reasoning"] == {"item_condition": REASONING}
+
+    restored = restore(snapshot(conversation), log=quiet_log)
+    assert restored.extractor.facts.reasoning("item_condition") == REASONING
+    assert restored.transcript == conversation.transcript
@@ -0,0 +1,56 @@
+# The keyword fast path: what it settles without the LLM, and what it must not
+from config import FAST_PATH_CONFIDENCE
+from extractor import InformationExtractor
+from keyword_matcher import KEYWORD_MATCHER, UNASKED_MAPPING_CONFIDENCE
+from llm_backends import LLMBackend, set_llm_backend
+
+class NoLLM(LLMBackend):
+    """Fails the test if the extractor reaches for the LLM"""
+    name = "none"
+
+    def __init__(self):
+        self.calls = 0
+
+    def chat(self, request, timeout=None):
+        self.calls += 1
+        raise AssertionError("the LLM was called")
+
+    async def chat_async(self, request, timeout=None):
+        return self.chat(request, timeout)
+
+    def stream(self, request, stall_timeout=None):
+        return iter([self.chat(request)])
+
+def test_plain_message_resolves_without_the_llm():
+    backend = NoLLM()
+    set_llm_backend(backend)
+    try:
+        extractor = InformationExtractor(log=lambda *args: None)
+        result = extractor.extract_info("broken laptop bought last week with my credit card", use_cache=False)
+    finally:
+        set_llm_backend(None)
+
+    assert backend.calls == 0
+    assert {field: data["value"] for field, data in result.items()} == {
+        "item_condition": "damaged",
+        "item_category": "physical",
+        "return_window": "within",
+        "payment_method": "credit_card"
+    }
+    assert all(data["confidence"] >= FAST_PATH_CONFIDENCE for data in result.values())
+
+def test_ambiguous_keywords_only_settle_the_asked_field():
+    unasked, _ = KEYWORD_MATCHER.extract("the seller sent an old one")
+    assert unasked["seller_type"]["confidence"] == UNASKED_MAPPING_CONFIDENCE
+    assert unasked["return_window"]["confidence"] == UNASKED_MAPPING_CONFIDENCE
+
+    asked, _ = KEYWORD_MATCHER.extract("the seller sent an old one", field_asked="return_window")
+    assert asked["return_window"] == {"value": "expired", "confidence": 0.85,
+                                      "reasoning": "Matched 'old' (ambiguous mapping)"}
+
+def test_of_course_is_not_an_online_course():
+    extractions, mentioned = KEYWORD_MATCHER.extract("of course I want a refund")
+    assert extractions == {} and mentioned == set()
+
+    extractions, _ = KEYWORD_MATCHER.extract("I want a refund for the course")
+    assert extractions["item_category"]["value"] == "digital"
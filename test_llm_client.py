@@ -0,0 +1,100 @@
+# The async LLM client against the fake OpenAI-compatible server
+import asyncio
+import json
+import time
+
+import openai
+import pytest
+
+import llm_backends
+import llm_client
+from extractor import InformationExtractor
+from fake_openai_server import FakeOpenAIServer
+from llm_backends import OpenAIBackend, set_llm_backend
+
+# Nothing here for the keyword fast path, so every call reaches the server
+MESSAGE = "I want my money back for this order"
+REQUEST = {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": "How did you pay?"}]}
+
+def reply(request):
+    return json.dumps({"extractions": {
+        "payment_method": {"value": "credit_card", "confidence": 0.9, "reasoning": "fake server"}
+    }})
+
+@pytest.fixture
+def server(request, monkeypatch):
+    """A started FakeOpenAIServer (parametrize with its script) behind the OpenAI backend"""
+    fake = FakeOpenAIServer(script=getattr(request, "param", None), reply=reply).start()
+    monkeypatch.setattr(llm_client, "OPENAI_BASE_URL", fake.base_url)
+    monkeypatch.setattr(llm_client, "OPENAI_API_KEY", "fake-key")
+    monkeypatch.setattr(llm_backends, "OPENAI_BASE_URL", fake.base_url)
+    monkeypatch.setattr(llm_backends, "OPENAI_API_KEY", "fake-key")
+    # Keep the backoff short; the jitter's shape is not what is under test
+    monkeypatch.setattr(llm_client, "LLM_BACKOFF_BASE", 0.01)
+    set_llm_backend(OpenAIBackend())
+    yield fake
+    set_llm_backend(None)
+    fake.stop()
+
+def run(coroutine_factory):
+    """Run a coroutine on a fresh loop, closing the shared client before the loop goes"""
+    async def scenario():
+        try:
+            return await coroutine_factory()
+        finally:
+            await llm_client.close_async_client()
+    return asyncio.run(scenario())
+
+@pytest.mark.parametrize("server", [[429, 503, 500]], indirect=True)
+def test_429_and_5xx_are_retried_until_success(server):
+    extractor = InformationExtractor(log=lambda *args: None)
+    result = run(lambda: extractor.extract_info_async(MESSAGE, use_cache=False))
+    assert result["payment_method"]["value"] == "credit_card"
+    assert len(server.requests) == 4
+
+@pytest.mark.parametrize("server", [[500, 500, 500]], indirect=True)
+def test_retries_stop_at_max_retries(server):
+    with pytest.raises(openai.InternalServerError):
+        run(lambda: llm_client.chat_completion_async(max_retries=2, **REQUEST))
+    assert len(server.requests) == 3
+
+@pytest.mark.parametrize("server", [[400]], indirect=True)
+def test_client_errors_are_not_retried(server):
+    with pytest.raises(openai.BadRequestError):
+        run(lambda: llm_client.chat_completion_async(**REQUEST))
+    assert len(server.requests) == 1
+
+@pytest.mark.parametrize("server", [[2.0, 2.0]], indirect=True)
+def test_per_call_timeout(server):
+    started = time.perf_counter()
+    with pytest.raises(openai.APITimeoutError):
+        run(lambda: llm_client.chat_completion_async(timeout=0.2, max_retries=1, **REQUEST))
+    assert len(server.requests) == 2
+    assert time.perf_counter() - started < 1.5
+
+@pytest.mark.parametrize("server", [[5.0]], indirect=True)
+def test_cancelling_extract_info_async_aborts_the_request(server):
+    extractor = InformationExtractor(log=lambda *args: None)
+
+    async def cancel_midway():
+        task = asyncio.create_task(extractor.extract_info_async(MESSAGE, use_cache=False))
+        await asyncio.sleep(0.2)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    started = time.perf_counter()
+    run(cancel_midway)
+    assert len(server.requests) == 1
+    assert time.perf_counter() - started < 2.0
+
+def test_calls_share_one_client_and_connection(server):
+    async def three_calls():
+        client = llm_client.get_async_client()
+        for _ in range(3):
+            await llm_client.chat_completion_async(**REQUEST)
+        return client is llm_client.get_async_client()
+
+    assert run(three_calls)
+    assert len(server.requests) == 3
+    assert len(set(server.peers)) == 1
@@ -0,0 +1,29 @@
+# Runs the rule analyzer gate on the shipped DECISION_RULES
+import os
+import subprocess
+import sys
+
+from decision_brute_force import DECISION_RULES
+from rule_analyzer import analyze_rules, has_findings, load_baseline, new_findings
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+def test_shipped_rules_pass_check():
+    result = subprocess.run([sys.executable, "rule_analyzer.py", "--check"],
+                            cwd=HERE, capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout[-2000:]
+
+def test_unknown_value_is_a_new_finding():
+    rule = {"id": "cheque_refund", "priority": 99, "conditions": {"payment_method": "cheque"},
+            "decision": "DENY_REFUND", "reason": "test", "confidence": 1.0}
+    rules = DECISION_RULES + [rule]
+
+    regressions = new_findings(analyze_rules(rules), load_baseline(), rules)
+    assert regressions["unknown_values"] == [("cheque_refund", "payment_method", "cheque")]
+
+def test_removed_rule_dead_ends_are_new_findings():
+    rules = [rule for rule in DECISION_RULES if rule["id"] != "fraud_denial"]
+
+    regressions = new_findings(analyze_rules(rules), load_baseline(), rules)
+    assert has_findings(regressions)
+    assert regressions["dead_end_count"] > 0
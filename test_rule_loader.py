@@ -0,0 +1,41 @@
+# Hot reloads: messages go to the registry's log, and compiling never holds the swap lock
+import json
+
+import rule_loader
+from decision_brute_force import DECISION_RULES
+from rule_loader import RuleRegistry
+
+def write_rules(path, rules):
+    with open(path, "w") as f:
+        json.dump({"rules": rules}, f)
+
+def test_reload_builds_outside_the_lock_and_logs(tmp_path, monkeypatch):
+    monkeypatch.setattr(rule_loader, "USE_QUESTION_PLANNER", False)
+    path = tmp_path / "rules.json"
+    write_rules(path, DECISION_RULES)
+    messages = []
+    registry = RuleRegistry(str(path), log=messages.append)
+    assert registry.current().version == 1
+    assert messages[0].startswith("Loaded rules v1")
+
+    built_unlocked = []
+
+    class WatchedRuleSet(rule_loader.RuleSet):
+        def __init__(self, *args, **kwargs):
+            built_unlocked.append(not registry._reload_lock.locked())
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(rule_loader, "RuleSet", WatchedRuleSet)
+    write_rules(path, DECISION_RULES[1:])
+    assert registry.reload()
+    assert built_unlocked == [True]
+    assert registry.current().version == 2 and len(registry.current().rules) == len(DECISION_RULES) - 1
+
+    # Unchanged rules are not rebuilt at all
+    assert not registry.reload()
+    assert built_unlocked == [True]
+
+    path.write_text("{not json")
+    assert not registry.reload()
+    assert registry.current().version == 2
+    assert messages[-1].startswith("Rules reload failed")